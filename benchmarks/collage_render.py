@@ -0,0 +1,104 @@
+"""
+Micro-benchmark for collage rendering.
+
+Compares the original rendering path (full-size decode, default resize, font
+reloaded per tile, default JPEG settings) with utils.image_collage.render_collage
+and reports CPU time and output size per collage.
+
+Usage:
+    python -m benchmarks.collage_render [--rounds 20] [--source-size 1600] [--format JPEG] [--quality 80]
+"""
+import argparse
+import os
+import random
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.image_collage import FONT_PATH, render_collage
+
+
+def make_source_images(count, source_size, seed=0):
+    """
+    Builds synthetic product photos: smooth gradients with noisy shapes, saved as JPEG.
+    """
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        image = Image.linear_gradient("L").resize((source_size, source_size)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for _ in range(40):
+            x, y = rng.randrange(source_size), rng.randrange(source_size)
+            r = rng.randrange(source_size // 20, source_size // 5)
+            draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(rng.randrange(256) for _ in range(3)))
+        image = Image.blend(image, Image.effect_noise((source_size, source_size), 40).convert("RGB"), 0.2)
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=92)
+        images.append(output.getvalue())
+    return images
+
+
+def legacy_render(images, size=(500, 500)):
+    processed_images = []
+    for idx, img_bytes in enumerate(images, start=1):
+        image = Image.open(BytesIO(img_bytes)).convert("RGB")
+        image = image.resize(size)
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.truetype(FONT_PATH, 45)
+        text = str(idx)
+        bbox = draw.textbbox((0, 0), text, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_height = bbox[3] - bbox[1]
+        box_width = text_width + 10
+        box_height = text_height + 10
+        box_x = (image.width - box_width) // 2
+        box_y = size[1] // 10 - 20
+        draw.rounded_rectangle([box_x, box_y, box_x + box_width, box_y + box_height], radius=15, fill=(0, 200, 0))
+        draw.text((box_x + (box_width - text_width) // 2, box_y + (box_height - text_height) // 2 - 10),
+                  text, font=font, fill="white")
+        processed_images.append(image)
+
+    collage = Image.new("RGB", (size[0] * 2, size[1] * 2))
+    for i, img in enumerate(processed_images):
+        collage.paste(img, ((i % 2) * size[0], (i // 2) * size[1]))
+    output = BytesIO()
+    collage.save(output, format="JPEG")
+    return output.getvalue()
+
+
+def measure(render, images, rounds):
+    render(images)  # warm-up: font cache, codec initialisation
+    start = time.process_time()
+    for _ in range(rounds):
+        data = render(images)
+    return (time.process_time() - start) / rounds, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--source-size", type=int, default=1600)
+    parser.add_argument("--format", default=os.getenv("COLLAGE_FORMAT", "JPEG"))
+    parser.add_argument("--quality", type=int, default=int(os.getenv("COLLAGE_QUALITY", "75")))
+    parser.add_argument("--no-progressive", action="store_true")
+    args = parser.parse_args()
+
+    images = make_source_images(4, args.source_size)
+    legacy_cpu, legacy_bytes = measure(legacy_render, images, args.rounds)
+    fast_cpu, fast_bytes = measure(
+        lambda imgs: render_collage(imgs, output_format=args.format, quality=args.quality,
+                                    progressive=not args.no_progressive),
+        images, args.rounds
+    )
+
+    print(f"source images: 4 x {args.source_size}px JPEG, {args.rounds} rounds")
+    print(f"{'path':<10}{'cpu ms/collage':>16}{'bytes':>12}")
+    print(f"{'legacy':<10}{legacy_cpu * 1000:>16.1f}{legacy_bytes:>12}")
+    print(f"{'fast':<10}{fast_cpu * 1000:>16.1f}{fast_bytes:>12}")
+    print(f"saved: {(legacy_cpu - fast_cpu) * 1000:.1f} ms CPU "
+          f"({(1 - fast_cpu / legacy_cpu) * 100:.0f}%), {legacy_bytes - fast_bytes} bytes per collage")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for offloading CPU-bound work (search parsing, collage rendering).
+
+Runs parse + render jobs through utils.cpu_executor.CpuExecutor in each mode
+(inline, thread, process) at several concurrencies, while a ticker measures
+event-loop lag: how late a 10 ms sleep wakes up. Lag is what every other chat
+waits on while a job holds the loop; throughput is jobs per second.
+
+Usage:
+    python -m benchmarks.cpu_offload [--jobs 32] [--concurrency 1,2,4,8,16] [--modes inline,thread,process]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.collage_render import make_source_images
+from benchmarks.search_parser import make_synthetic_page
+from utils.cpu_executor import CpuExecutor
+from utils.image_collage import render_collage
+from utils.search_parser import extract_products
+
+TICK = 0.01
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run_mode(kind, html, images, jobs, concurrency, workers):
+    executor = CpuExecutor(kind, max_workers=workers)
+    await executor.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def job():
+        async with semaphore:
+            records = await executor.run(extract_products, html)
+            await executor.run(render_collage, images)
+            return len(records)
+
+    lags, stop = [], asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*[job() for _ in range(jobs)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    executor.shutdown()
+    return jobs / elapsed, lags
+
+
+async def main_async(args):
+    html = make_synthetic_page()
+    images = make_source_images(4, args.source_size)
+    print(f"{args.jobs} jobs (parse {len(html) // 1024} KB page + render 4 x {args.source_size}px collage), "
+          f"{args.workers or 'default'} workers")
+    print(f"{'mode':<10}{'conc.':>6}{'jobs/s':>9}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for kind in args.modes.split(","):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            throughput, lags = await run_mode(kind, html, images, args.jobs, concurrency, args.workers)
+            print(f"{kind:<10}{concurrency:>6}{throughput:>9.1f}{percentile(lags, 0.5) * 1000:>12.1f}"
+                  f"{percentile(lags, 0.99) * 1000:>12.1f}{max(lags, default=0) * 1000:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=32)
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--modes", default="inline,thread,process")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--source-size", type=int, default=800)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+End-to-end load benchmark for handle_hebrew_search against local fake upstreams.
+
+Starts a fake IOP gateway, wholesale search page, image CDN and Gemini stub
+(tools/fake_upstreams.py) and wires them into the real handler through
+utils/upstreams.py, like bot.py: the upstream schedulers and the resilient IOP
+client are configured from the same environment variables (SCRAPE_RATE,
+IOP_DEADLINE, ...). Caches, single flight and the other optional stages are
+switched on by flags. Synthetic Telegram updates are driven through it at a
+fixed arrival rate (open loop). Reports p50/p95/p99 latency, searches per
+second and the searches that raised; --output writes the report as JSON and
+--compare diffs it against an earlier one, e.g. from another commit.
+
+Usage:
+    python -m benchmarks.load --rate 20 --duration 30 --queries 50 --output after.json --compare before.json
+    SCRAPE_RATE=20 SCRAPE_CONCURRENCY=8 python -m benchmarks.load --caches --single-flight
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from iop import AsyncIopClient
+from tools.fake_upstreams import FakeGeminiModel, FakeImageCdn, FakeIopGateway, FakeWholesale
+from utils.cache import CollageCache, StaleWhileRevalidateCache, TieredCache
+from utils.hebrew_search_handler import handle_hebrew_search
+from utils.cpu_executor import KINDS as CPU_EXECUTOR_KINDS, CpuExecutor
+from utils.image_collage import close_image_session, fetch_and_create_collage
+from utils.promotion_links import generate_promotion_links
+from utils.query_optimizer import translate_and_optimize_query
+from utils.scraper import AliExpressScraper
+from utils.scheduler import ChatThrottle, ScheduledProxy
+from utils.pagination import CandidateStore
+from utils.phrase_table import PhraseTable, QueryLog
+from utils.single_flight import SingleFlight
+from utils.title_improver import improve_titles_with_gemini
+from utils.upstreams import build_iop_client, build_product_query, build_schedulers, cached_search
+
+APP_SECRET = "benchmark-secret"
+TRIGGERS = ["תחפש לי", "תמצא לי", "תשלוף לי"]
+MORE_TRIGGER = "עוד"
+QUERY_WORDS = ["אוזניות", "בלוטוס", "כיסוי", "לאייפון", "מטען", "מהיר", "שעון", "חכם", "תיק", "גב",
+               "מנורת", "לילה", "כבל", "רמקול", "נייד", "עמיד", "למים", "מקלדת", "אלחוטית", "לילדים"]
+
+
+class _Chat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeMessage:
+    """
+    Stand-in for telegram.Message that records when the bot answered.
+    """
+
+    def __init__(self, text, message_id, record):
+        self.text = text
+        self.message_id = message_id
+        self._record = record
+
+    async def reply_text(self, text, **kwargs):
+        self._record("text", text)
+
+    async def reply_photo(self, photo, caption=None, **kwargs):
+        self._record("photo", caption)
+        file_id = photo if isinstance(photo, str) else f"fake-photo-{self.message_id}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+    async def delete(self):
+        pass
+
+    async def edit_text(self, text, **kwargs):
+        self._record("edit", text)
+
+
+class FakeUpdate:
+    def __init__(self, text, chat_id, message_id, record):
+        self.message = FakeMessage(text, message_id, record)
+        self.effective_message = self.message
+        self.effective_chat = _Chat(chat_id)
+        self.callback_query = None
+
+
+class FakeBot:
+    def __init__(self, record=None):
+        self._record = record or (lambda *args: None)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return FakeMessage(text, 0, self._record)
+
+
+class FakeContext:
+    def __init__(self, record=None):
+        self.bot = FakeBot(record)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(QUERY_WORDS, rng.randint(1, 3))) for _ in range(count)]
+
+
+async def run_benchmark(args):
+    cdn = await FakeImageCdn(latency=args.cdn_latency).start()
+    pages = [open(path, "rb").read() for path in args.fixtures]
+    wholesale = await FakeWholesale(cdn.base_url, pages=pages, latency=args.scrape_latency).start()
+    gateway = await FakeIopGateway(APP_SECRET, image_base=cdn.base_url, latency=args.iop_latency).start()
+    gemini = FakeGeminiModel(latency=args.gemini_latency)
+
+    # The same schedulers and resilient IOP client as bot.py, configured from the same
+    # environment variables (GEMINI_RATE, SCRAPE_RATE, IOP_DEADLINE, ...)
+    gemini_scheduler, scrape_scheduler, iop_scheduler = build_schedulers()
+    schedulers = [gemini_scheduler, scrape_scheduler, iop_scheduler]
+    model = ScheduledProxy(gemini, gemini_scheduler, ["generate_content_async"])
+    client = build_iop_client(AsyncIopClient(gateway.url, "benchmark-key", APP_SECRET), iop_scheduler)
+    cpu_executor = CpuExecutor(args.cpu_executor)
+    await cpu_executor.start()
+    scraper = AliExpressScraper(cookies_path=os.devnull, search_url=wholesale.url, executor=cpu_executor)
+    collage_renderer = functools.partial(fetch_and_create_collage, executor=cpu_executor)
+
+    get_products = scrape_products = scrape_scheduler.wrap(scraper.search)
+    if args.search_backend == "api":
+        get_products = build_product_query(client, APP_SECRET, "default", fallback=scrape_products).search
+    link_generator = generate_promotion_links
+    phrase_table = PhraseTable.load(args.phrase_table) if args.phrase_table else None
+    query_log = QueryLog(args.query_log) if args.query_log else None
+    translator = functools.partial(translate_and_optimize_query, phrase_table=phrase_table, query_log=query_log)
+    caches = []
+    if args.caches:
+        search_cache = StaleWhileRevalidateCache(fresh_ttl=300, stale_ttl=3600)
+        link_cache = TieredCache("promotion_links", ttl=3600)
+        query_cache = TieredCache("queries", ttl=3600)
+        caches = [link_cache, query_cache]
+        get_products = cached_search(get_products, search_cache)
+        link_generator = functools.partial(generate_promotion_links, cache=link_cache)
+        translator = functools.partial(translator, cache=query_cache)
+
+    single_flight = SingleFlight() if args.single_flight else None
+    collage_cache = CollageCache() if args.collage_cache else None
+    edit_throttle = ChatThrottle() if args.progressive else None
+    candidate_store = CandidateStore(prefetch_titles=args.prefetch_titles) if args.more else None
+    latencies = []
+    first_content = []
+    more_latencies = []
+    outcomes = {}
+    queries = make_queries(args.queries, args.seed)
+    rng = random.Random(args.seed)
+
+    async def one_search(i):
+        start = time.perf_counter()
+        shown = []
+
+        def record(kind, text):
+            if not shown:
+                shown.append(kind)
+                first_content.append(time.perf_counter() - start)
+            if kind == "edit":
+                return
+            latencies.append(time.perf_counter() - start)
+            outcome = kind if kind == "photo" or (text or "").startswith("1.") else "other"
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        text = f"{rng.choice(TRIGGERS)} {rng.choice(queries)}"
+        wants_more = rng.random() < args.more
+
+        async def handle(text, record):
+            update = FakeUpdate(text, chat_id=1000 + i % args.chats, message_id=i, record=record)
+            await handle_hebrew_search(
+                update=update, context=FakeContext(record), model=model,
+                get_aliexpress_product_data=get_products,
+                generate_promotion_links=link_generator,
+                fetch_and_create_collage=collage_renderer,
+                improve_titles_with_gemini=improve_titles_with_gemini,
+                translate_and_optimize_query=translator,
+                client=client, app_secret=APP_SECRET, hebrew_triggers=TRIGGERS,
+                single_flight=single_flight, timeout=args.timeout, collage_cache=collage_cache,
+                progressive=args.progressive, edit_throttle=edit_throttle,
+                candidate_store=candidate_store, more_triggers=[MORE_TRIGGER]
+            )
+
+        await handle(text, record)
+        if wants_more:
+            # The user reads the results, then asks for the next page
+            await asyncio.sleep(args.more_delay)
+            asked = time.perf_counter()
+            await handle(MORE_TRIGGER, lambda kind, text: more_latencies.append(time.perf_counter() - asked))
+
+    tasks = []
+    started = time.perf_counter()
+    # The handler's per-search prints are dropped unless --verbose, so they don't skew timings
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        total = int(args.rate * args.duration)
+        for i in range(total):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one_search(i)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    # Searches that raised out of the handler; each kind is reported with its first message
+    errors = {}
+    for result in results:
+        if isinstance(result, BaseException):
+            name = type(result).__name__
+            count, message = errors.get(name, (0, str(result)))
+            errors[name] = (count + 1, message)
+
+    if candidate_store is not None:
+        candidate_store.close()
+    if query_log is not None:
+        query_log.close()
+    await client.close()
+    await scraper.close()
+    await close_image_session()
+    cpu_executor.shutdown()
+    for cache in caches:
+        cache.close()
+    for server in (cdn, wholesale, gateway):
+        await server.stop()
+
+    return {
+        "commit": git_commit(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "searches": len(tasks),
+        "completed": len(latencies),
+        "outcomes": outcomes,
+        "errors": {name: {"count": count, "example": message} for name, (count, message) in errors.items()},
+        "elapsed_seconds": round(elapsed, 3),
+        "searches_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else None,
+            "p50": round(percentile(latencies, 50), 4) if latencies else None,
+            "p95": round(percentile(latencies, 95), 4) if latencies else None,
+            "p99": round(percentile(latencies, 99), 4) if latencies else None,
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "first_content_seconds": {
+            "p50": round(percentile(first_content, 50), 4) if first_content else None,
+            "p95": round(percentile(first_content, 95), 4) if first_content else None,
+        },
+        "more_seconds": {
+            "count": len(more_latencies),
+            "p50": round(percentile(more_latencies, 50), 4) if more_latencies else None,
+            "p95": round(percentile(more_latencies, 95), 4) if more_latencies else None,
+        },
+        "upstream_requests": {
+            "gemini": gemini.calls, "scrape": wholesale.requests, "iop": gateway.requests, "cdn": cdn.requests,
+            "iop_signature_errors": gateway.signature_errors,
+        },
+        "schedulers": {scheduler.name: scheduler.stats() for scheduler in schedulers},
+        "iop_resilience": {
+            "retries": client.retries, "hedges": client.hedges, "hedge_wins": client.hedge_wins,
+            "breaker": client.breaker.state, "breaker_rejected": client.breaker.rejected,
+        },
+    }
+
+
+def print_report(report, baseline=None):
+    latency = report["latency_seconds"]
+    print(f"commit {report['commit']}: {report['completed']}/{report['searches']} searches "
+          f"in {report['elapsed_seconds']}s, outcomes {report['outcomes']}")
+    for name, error in report.get("errors", {}).items():
+        print(f"⚠️ {error['count']} searches raised {name}: {error['example']}")
+    print(f"upstream requests: {report['upstream_requests']}")
+    if "iop_resilience" in report:
+        print(f"iop resilience: {report['iop_resilience']}")
+    rows = [("searches/s", report["searches_per_second"], baseline and baseline["searches_per_second"])]
+    for key in ("p50", "p95", "p99", "max"):
+        rows.append((f"{key} (s)", latency[key], baseline and baseline["latency_seconds"][key]))
+    for key in ("p50", "p95"):
+        base = baseline and baseline.get("first_content_seconds", {}).get(key)
+        rows.append((f"first {key}", report["first_content_seconds"][key], base))
+    if report.get("more_seconds", {}).get("count"):
+        for key in ("p50", "p95"):
+            base = baseline and baseline.get("more_seconds", {}).get(key)
+            rows.append((f"more {key}", report["more_seconds"][key], base))
+    header = f"{'metric':<12}{'value':>10}" + (f"{'baseline':>12}{'change':>10}" if baseline else "")
+    print(header)
+    for name, value, base in rows:
+        line = f"{name:<12}{value if value is not None else '-':>10}"
+        if baseline:
+            change = f"{(value - base) / base * 100:+.1f}%" if value is not None and base else "-"
+            line += f"{base if base is not None else '-':>12}{change:>10}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10, help="searches per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of arrivals")
+    parser.add_argument("--queries", type=int, default=30, help="distinct queries in the mix")
+    parser.add_argument("--chats", type=int, default=20, help="distinct chats sending them")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--caches", action="store_true", help="enable query, search and link caches")
+    parser.add_argument("--single-flight", action="store_true", help="coalesce identical in-flight searches")
+    parser.add_argument("--search-backend", choices=["scrape", "api"], default="scrape",
+                        help="scrape the search page or use the product query API")
+    parser.add_argument("--progressive", action="store_true", help="show linked products before the collage")
+    parser.add_argument("--collage-cache", action="store_true", help="reuse rendered collages and their file_ids")
+    parser.add_argument("--cpu-executor", choices=CPU_EXECUTOR_KINDS, default="inline",
+                        help="where page parsing and collage rendering run")
+    parser.add_argument("--more", type=float, default=0,
+                        help="fraction of searches followed by a request for the next page")
+    parser.add_argument("--more-delay", type=float, default=1.5, help="seconds before asking for more")
+    parser.add_argument("--prefetch-titles", action="store_true", help="also prefetch the next page's titles")
+    parser.add_argument("--phrase-table", help="phrase table to translate common queries with")
+    parser.add_argument("--query-log", help="append the translated query pairs to this JSONL file")
+    parser.add_argument("--gemini-latency", type=float, nargs="+", default=[0.4, 0.9])
+    parser.add_argument("--scrape-latency", type=float, nargs="+", default=[0.5, 1.5])
+    parser.add_argument("--iop-latency", type=float, nargs="+", default=[0.1, 0.3])
+    parser.add_argument("--cdn-latency", type=float, nargs="+", default=[0.05, 0.2])
+    parser.add_argument("--fixtures", nargs="*", default=[], help="recorded wholesale HTML pages")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the handler's own output")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    for name in ("gemini_latency", "scrape_latency", "iop_latency", "cdn_latency"):
+        value = getattr(args, name)
+        setattr(args, name, value[0] if len(value) == 1 else tuple(value[:2]))
+
+    report = asyncio.run(run_benchmark(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark for wholesale search page parsing.
+
+Compares the original BeautifulSoup + DOTALL-regex path with
+utils.search_parser.extract_products on saved HTML pages, reporting parse time
+and peak Python memory (tracemalloc) per page. The legacy path needs
+beautifulsoup4, which the bot itself no longer depends on.
+
+Saved pages are read from benchmarks/fixtures/*.html (save one with your
+browser's "Save page as... > HTML only"); a trimmed search page is committed
+there and also backs tests/test_search_parser.py. With --synthetic a larger
+generated page with the same payload layout is measured as well.
+
+Usage:
+    python -m benchmarks.search_parser [--rounds 20] [--synthetic] [fixture.html ...]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+import tracemalloc
+import urllib.parse
+
+from utils.search_parser import extract_products
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def make_synthetic_page(items=60, filler_kb=400, image_base="//ae01.alicdn.com", id_offset=0):
+    content = []
+    for i in range(items):
+        item_id = str(1005006000000000 + id_offset + i)
+        pdp_cdi = urllib.parse.quote(json.dumps({"itemId": item_id, "pageIndex": 1}, separators=(",", ":")))
+        content.append({
+            "productId": item_id,
+            "image": {"imgUrl": f"{image_base}/kf/S{i:04d}.jpg", "imgWidth": 350, "imgHeight": 350},
+            "title": {"displayTitle": f"Wireless Bluetooth Earbuds Model {i} Noise Cancelling", "seoTitle": ""},
+            "prices": {"salePrice": {"currencyCode": "ILS", "minPrice": round(9.9 + i * 1.37, 2),
+                                     "formattedPrice": "₪%.2f" % (9.9 + i * 1.37)}},
+            "trace": {"pdpParams": {"pdp_cdi": pdp_cdi}, "utLogMap": {"x_object_id": item_id}},
+            "evaluation": {"starRating": 4.7},
+        })
+    payload = json.dumps({"data": {"root": {"fields": {"mods": {"itemList": {"content": content}}}}}},
+                         ensure_ascii=False, separators=(",", ":"))
+    filler = "<div class=\"x\">" + ("lorem ipsum dolor sit amet " * 40) + "</div>\n"
+    filler_html = filler * (filler_kb * 1024 // len(filler))
+    return (
+        "<!DOCTYPE html><html><head><script>window.foo = {\"a\":1};</script></head><body>"
+        f"{filler_html}<script>window._dida_config_._init_data_= {{ data: {payload} }}</script>"
+        f"{filler_html}</body></html>"
+    ).encode("utf-8")
+
+
+def legacy_parse(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html.decode("utf-8", errors="replace"), 'html.parser')
+    script_tag = soup.find('script', string=lambda t: t and 'itemList' in t and 'content' in t)
+    item_ids = []
+    results = []
+    if script_tag:
+        script_text = script_tag.string
+        for match in re.findall(r'"pdp_cdi":"([^"]+)"', script_text):
+            item_ids.extend(re.findall(r'"itemId":"(\d+)"', urllib.parse.unquote(match)))
+        pattern = re.compile(
+            r'"image"\s*:\s*\{[^}]*?"imgUrl"\s*:\s*"([^"]+)"[^}]*\}.*?'
+            r'"title"\s*:\s*\{[^}]*?"displayTitle"\s*:\s*"([^"]+)"[^}]*\}.*?'
+            r'"salePrice"\s*:\s*\{[^}]*?"minPrice"\s*:\s*([\d.]+)[^}]*\}.*?',
+            re.DOTALL
+        )
+        for i, (img_url, title, price) in enumerate(pattern.findall(script_text)):
+            if i < len(item_ids):
+                results.append((item_ids[i], title, img_url, price))
+    return results
+
+
+def measure(parse, html, rounds):
+    tracemalloc.start()
+    result = parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parse(html)
+    return (time.perf_counter() - start) / rounds, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--synthetic", action="store_true", help="also measure a generated 60-item page")
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    pages = [(os.path.basename(p), open(p, "rb").read()) for p in paths]
+    if args.synthetic or not pages:
+        pages.append(("synthetic", make_synthetic_page()))
+
+    print(f"{'page':<24}{'KB':>7}{'path':>9}{'ms/page':>10}{'peak KB':>10}{'items':>7}")
+    for name, html in pages:
+        parsers = [("targeted", extract_products)]
+        try:
+            import bs4  # noqa: F401
+            parsers.insert(0, ("legacy", legacy_parse))
+        except ImportError:
+            print("beautifulsoup4 is not installed; skipping the legacy path")
+        for label, parse in parsers:
+            seconds, peak, items = measure(parse, html, args.rounds)
+            print(f"{name[:23]:<24}{len(html) // 1024:>7}{label:>9}{seconds * 1000:>10.2f}{peak // 1024:>10}{items:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import os
+
+# Set STARTUP_PROFILE=1 to print how long each startup phase takes
+from utils.startup import LazyObject, StartupProfiler
+startup = StartupProfiler(enabled=os.getenv("STARTUP_PROFILE") == "1")
+
+import asyncio
+import functools
+import secrets
+
+from dotenv import load_dotenv
+
+from iop import AsyncIopClient, CircuitBreaker
+
+from utils.query_optimizer import translate_and_optimize_query
+from utils.title_improver import improve_titles_with_gemini
+from utils.promotion_links import generate_promotion_links
+from utils.hebrew_search_handler import handle_hebrew_search, handle_more_results
+from utils.pagination import MORE_CALLBACK_PREFIX, CandidateStore
+from utils.inline_search import InlineSearch
+from utils.phrase_table import PhraseTable, QueryLog
+from utils.image_collage import fetch_and_create_collage, close_image_session
+from utils.webhook_manager import ALLOWED_UPDATES, register_webhook
+from utils.webhook_server import WebhookServer
+from utils.scraper import AliExpressScraper
+from utils.scheduler import ScheduledProxy, ChatThrottle
+from utils.upstreams import (
+    build_iop_client, build_product_query, build_schedulers, cached_search, search_cache_key
+)
+from utils.single_flight import SingleFlight
+from utils.metrics import (
+    REGISTRY, SLOW_SEARCHES, cache_collector, scheduler_collector, start_metrics_server
+)
+from utils.cpu_executor import CpuExecutor
+from utils.cache import TieredCache, StaleWhileRevalidateCache, CollageCache
+
+startup.mark("imports")
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Environment variables
+ALIEXPRESS_APP_KEY = os.getenv("ALIEXPRESS_APP_KEY")
+ALIEXPRESS_APP_SECRET = os.getenv("ALIEXPRESS_APP_SECRET")
+ALIEXPRESS_URL = os.getenv("ALIEXPRESS_URL")
+ALIEXPRESS_TRACKING_ID = os.getenv("ALIEXPRESS_TRACKING_ID", "default")
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Webhook mode is used when WEBHOOK_URL is set, long polling otherwise
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+# Updates handled at once. Above 1, chats' searches overlap, so the upstream schedulers can queue them
+# fairly and identical searches can share one run (webhook mode is concurrent through WEBHOOK_WORKERS)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+# Lets the bot talk to a local fake Bot API (see tools/fake_telegram.py)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot")
+# Prometheus-style /metrics endpoint, disabled unless METRICS_PORT is set
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Admission control per upstream: rate (calls/s), concurrency and queue depth (see utils/upstreams.py)
+gemini_scheduler, scrape_scheduler, iop_scheduler = build_schedulers()
+
+startup.mark("schedulers")
+
+
+def build_gemini_model():
+    # google.generativeai takes most of a second to import, so it is loaded on first use
+    import google.generativeai as genai
+
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel("gemini-2.0-flash")
+
+
+gemini_model = LazyObject(build_gemini_model, "gemini model", profiler=startup)
+model = ScheduledProxy(gemini_model, gemini_scheduler, ["generate_content_async"])
+
+# Set up the client for AliExpress API (one pooled keep-alive session for every call)
+iop_client = AsyncIopClient(
+    ALIEXPRESS_URL, ALIEXPRESS_APP_KEY, ALIEXPRESS_APP_SECRET,
+    timeout=int(os.getenv("IOP_TIMEOUT", "15")),
+    limit_per_host=int(os.getenv("IOP_POOL_SIZE", "20"))
+)
+# Each call is admitted by the IOP scheduler once and then runs its retries and hedges in that slot.
+# While the gateway keeps failing the breaker opens and searches show only products with cached links.
+client = build_iop_client(iop_client, iop_scheduler)
+
+# One scraping session for every search; cookies.json is re-read only when it changes
+# Page parsing and collage rendering run here instead of on the event loop:
+# CPU_EXECUTOR=process (default), thread or inline
+cpu_executor = CpuExecutor(
+    kind=os.getenv("CPU_EXECUTOR", "process"),
+    max_workers=int(os.getenv("CPU_WORKERS", "0")) or None
+)
+
+scraper = AliExpressScraper(cookies_path=os.getenv("COOKIES_PATH", "cookies.json"), executor=cpu_executor)
+
+
+async def scrape_products(search_text: str):
+    return await scrape_scheduler.run(scraper.search, search_text)
+
+
+# SEARCH_BACKEND=api searches through aliexpress.affiliate.product.query (links included)
+# and falls back to scraping; the default "scrape" only scrapes the search page
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "scrape")
+product_query = build_product_query(client, ALIEXPRESS_APP_SECRET, ALIEXPRESS_TRACKING_ID, fallback=scrape_products)
+startup.mark("clients")
+
+# SQLite file backing the on-disk tier of the caches below
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache.sqlite3")
+
+# Affiliate links rarely change, so repeat items skip the IOP call entirely
+link_cache = TieredCache(
+    "promotion_links",
+    ttl=int(os.getenv("LINK_CACHE_TTL", str(24 * 60 * 60))),
+    max_entries=int(os.getenv("LINK_CACHE_SIZE", "5000")),
+    db_path=CACHE_DB_PATH
+)
+
+# Optimized search queries keyed by the normalized Hebrew query
+query_cache = TieredCache(
+    "queries",
+    ttl=int(os.getenv("QUERY_CACHE_TTL", str(7 * 24 * 60 * 60))),
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "2000")),
+    db_path=CACHE_DB_PATH if os.getenv("QUERY_CACHE_DISK", "1") == "1" else None
+)
+
+# Common short queries are translated locally instead of by Gemini. The table is rebuilt offline from
+# the query log with `python -m tools.build_phrase_table query_pairs.jsonl --output phrase_table.json`.
+# Every PHRASE_TABLE_REVALIDATE_EVERY-th hit of a phrase still goes to Gemini so a rebuild can correct
+# the entry, and a table older than PHRASE_TABLE_MAX_AGE seconds is ignored until it is rebuilt.
+phrase_table = PhraseTable.load(
+    os.getenv("PHRASE_TABLE_PATH", "phrase_table.json"),
+    max_words=int(os.getenv("PHRASE_TABLE_MAX_WORDS", "3")),
+    max_age=float(os.getenv("PHRASE_TABLE_MAX_AGE", str(30 * 24 * 60 * 60))),
+    revalidate_every=int(os.getenv("PHRASE_TABLE_REVALIDATE_EVERY", "20"))
+)
+# Opt-in: QUERY_LOG=1 logs translated query pairs, the input of the phrase table builder.
+# Lines are written by a background thread and the file is rotated to <path>.1 at QUERY_LOG_MAX_MB.
+query_log = None
+if os.getenv("QUERY_LOG", "0") == "1":
+    query_log = QueryLog(
+        os.getenv("QUERY_LOG_PATH", "query_pairs.jsonl"),
+        max_bytes=int(os.getenv("QUERY_LOG_MAX_MB", "50")) * 1024 * 1024
+    )
+query_translator = functools.partial(
+    translate_and_optimize_query, cache=query_cache, phrase_table=phrase_table, query_log=query_log
+)
+
+# Scraped search results: fresh for a few minutes, then served stale while a refresh runs
+search_cache = StaleWhileRevalidateCache(
+    fresh_ttl=int(os.getenv("SEARCH_CACHE_TTL", "300")),
+    stale_ttl=int(os.getenv("SEARCH_CACHE_STALE_TTL", "3600")),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "500"))
+)
+
+# Rendered collages and their Telegram file_ids: repeat result sets are sent without re-uploading
+collage_cache = CollageCache(
+    max_entries=int(os.getenv("COLLAGE_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("COLLAGE_CACHE_MB", "64")) * 1024 * 1024
+)
+
+# Each chat's results beyond the first page, served by "more results" without searching again
+candidate_store = CandidateStore(
+    ttl=int(os.getenv("MORE_RESULTS_TTL", "900")),
+    max_chats=int(os.getenv("MORE_RESULTS_CHATS", "1000")),
+    max_results=int(os.getenv("MORE_RESULTS_MAX", "20")),
+    prefetch_titles=os.getenv("MORE_RESULTS_PREFETCH_TITLES", "0") == "1"
+)
+
+startup.mark("caches")
+
+# Identical searches already in flight share one pipeline run
+search_flights = SingleFlight()
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "60"))
+
+REGISTRY.add_collector(cache_collector({
+    "promotion_links": link_cache,
+    "queries": query_cache,
+    "search_results": search_cache,
+    "collages": collage_cache,
+    "result_pages": candidate_store,
+}))
+REGISTRY.add_collector(scheduler_collector([gemini_scheduler, scrape_scheduler, iop_scheduler]))
+REGISTRY.add_collector(lambda: [
+    ("bot_iop_retries_total", "counter", "IOP calls retried after a retryable failure.", {}, client.retries),
+    ("bot_iop_hedges_total", "counter", "Hedged second IOP requests sent.", {}, client.hedges),
+    ("bot_iop_hedge_wins_total", "counter", "Hedged IOP requests that answered first.", {}, client.hedge_wins),
+    ("bot_iop_breaker_open", "gauge", "1 while the IOP circuit breaker is not closed.", {},
+     int(client.breaker.state != CircuitBreaker.CLOSED)),
+    ("bot_iop_breaker_rejected_total", "counter", "IOP calls rejected by the open circuit.", {},
+     client.breaker.rejected),
+])
+REGISTRY.add_collector(lambda: [
+    ("bot_product_query_searches_total", "counter", "Searches answered by the product query API.", {},
+     product_query.api_searches),
+    ("bot_product_query_fallbacks_total", "counter", "Product query searches that fell back to scraping.", {},
+     product_query.fallbacks),
+])
+REGISTRY.add_collector(lambda: [
+    ("bot_phrase_table_lookups_total", "counter", "Phrase table lookups, by result.", {"result": result},
+     phrase_table.stats()[result])
+    for result in ("hits", "misses", "skipped", "revalidations")
+] + [
+    ("bot_phrase_table_phrases", "gauge", "Phrases in the local translation table.", {}, len(phrase_table.phrases)),
+])
+REGISTRY.add_collector(lambda: [(
+    "bot_search_flights", "gauge", "Distinct search pipelines currently running.", {}, search_flights.in_flight()
+)])
+
+# Opt-in: log and keep searches slower than SLOW_SEARCH_SECONDS with their stage breakdown
+if os.getenv("SLOW_SEARCH_SECONDS"):
+    SLOW_SEARCHES.configure(
+        threshold=float(os.getenv("SLOW_SEARCH_SECONDS")),
+        sample_rate=float(os.getenv("SLOW_SEARCH_SAMPLE_RATE", "1.0"))
+    )
+
+# Collage encoding: JPEG (optionally progressive) or WEBP
+collage_renderer = functools.partial(
+    fetch_and_create_collage,
+    output_format=os.getenv("COLLAGE_FORMAT", "JPEG"),
+    quality=int(os.getenv("COLLAGE_QUALITY", "75")),
+    progressive=os.getenv("COLLAGE_PROGRESSIVE", "1") == "1",
+    executor=cpu_executor
+)
+
+# Progressive replies: the loading message shows the linked products before the collage is ready.
+# Edits in one chat are spaced EDIT_MIN_INTERVAL seconds apart to respect Telegram's limits.
+PROGRESSIVE_REPLIES = os.getenv("PROGRESSIVE_REPLIES", "1") == "1"
+edit_throttle = ChatThrottle(min_interval=float(os.getenv("EDIT_MIN_INTERVAL", "1.0")))
+
+# Triggers for Hebrew searches
+HEBREW_TRIGGERS = ["תחפש לי", "תמצא לי", "תשלוף לי"]
+
+# Messages asking for the next page of the latest search
+MORE_TRIGGERS = ["עוד", "עוד תוצאות", "תביא עוד"]
+
+# Results only ever show affiliate links. PLAIN_LINK_FALLBACK=1 instead shows plain (commission-free)
+# AliExpress links while the IOP circuit breaker is open, so searches keep working through an outage.
+link_generator = functools.partial(
+    generate_promotion_links, cache=link_cache, tracking_id=ALIEXPRESS_TRACKING_ID,
+    plain_links=os.getenv("PLAIN_LINK_FALLBACK", "0") == "1"
+)
+
+
+async def get_aliexpress_product_data(search_text: str):
+    if SEARCH_BACKEND == "api":
+        return await product_query.search(search_text)
+    return await scrape_products(search_text)
+
+
+cached_product_search = cached_search(get_aliexpress_product_data, search_cache)
+
+
+# Inline mode (@bot <query> in any chat) answers from the caches only and warms them on misses.
+# Inline mode must also be enabled for the bot with BotFather's /setinline.
+inline_search = InlineSearch(
+    model=model,
+    translate_and_optimize_query=query_translator,
+    get_aliexpress_product_data=cached_product_search,
+    generate_promotion_links=link_generator,
+    client=client,
+    app_secret=ALIEXPRESS_APP_SECRET,
+    query_cache=query_cache,
+    peek_products=lambda search_text: search_cache.peek(search_cache_key(search_text)),
+    link_cache=link_cache,
+    tracking_id=ALIEXPRESS_TRACKING_ID,
+    phrase_table=phrase_table,
+    debounce=float(os.getenv("INLINE_DEBOUNCE", "0.4")),
+    answer_budget=float(os.getenv("INLINE_ANSWER_BUDGET", "2.5")),
+    cache_time=int(os.getenv("INLINE_CACHE_TIME", "300")),
+    max_warmups=int(os.getenv("INLINE_MAX_WARMUPS", "4"))
+)
+
+REGISTRY.add_collector(lambda: [
+    ("bot_inline_queries_total", "counter", "Inline queries, by how they were answered.", {"result": result},
+     value)
+    for result, value in (("hit", inline_search.hits), ("miss", inline_search.misses),
+                          ("debounced", inline_search.debounced), ("warm_answer", inline_search.warm_answers))
+] + [
+    ("bot_inline_warmups_total", "counter", "Background warm-ups started for inline misses.", {},
+     inline_search.warmups),
+    ("bot_inline_warmups_skipped_total", "counter", "Inline misses not warmed up because of the limit.", {},
+     inline_search.warmups_skipped),
+])
+
+
+# Create a wrapper function to handle the Hebrew search
+async def hebrew_search_handler(update, context):
+    await handle_hebrew_search(
+        update=update,
+        context=context,
+        model=model,
+        get_aliexpress_product_data=cached_product_search,
+        generate_promotion_links=link_generator,
+        fetch_and_create_collage=collage_renderer,
+        improve_titles_with_gemini=improve_titles_with_gemini,
+        translate_and_optimize_query=query_translator,
+        client=client,
+        app_secret=ALIEXPRESS_APP_SECRET,
+        hebrew_triggers=HEBREW_TRIGGERS,
+        single_flight=search_flights,
+        timeout=SEARCH_TIMEOUT,
+        collage_cache=collage_cache,
+        progressive=PROGRESSIVE_REPLIES,
+        edit_throttle=edit_throttle,
+        candidate_store=candidate_store,
+        more_triggers=MORE_TRIGGERS
+    )
+
+
+# Handles presses of the "more results" button
+async def more_results_handler(update, context):
+    await handle_more_results(
+        update=update,
+        context=context,
+        candidate_store=candidate_store,
+        model=model,
+        generate_promotion_links=link_generator,
+        fetch_and_create_collage=collage_renderer,
+        improve_titles_with_gemini=improve_titles_with_gemini,
+        client=client,
+        app_secret=ALIEXPRESS_APP_SECRET,
+        collage_cache=collage_cache
+    )
+
+
+metrics_runner = None
+
+
+async def start_services(application):
+    global metrics_runner
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, int(METRICS_PORT))
+    # Load the Gemini SDK in the background so the first search doesn't pay for the import
+    asyncio.get_running_loop().run_in_executor(None, gemini_model.resolve)
+    await cpu_executor.start()
+    startup.mark("services")
+
+
+# post_init hook; only run_polling calls it, webhook mode starts the services itself
+async def start_polling(application):
+    await start_services(application)
+    startup.report()
+    print("🤖 Bot is alive!")
+
+
+async def close_clients(application):
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    # Prefetches and warm-ups still running would otherwise use the sessions closed below
+    candidate_store.close()
+    inline_search.close()
+    await client.close()
+    await scraper.close()
+    await close_image_session()
+    link_cache.close()
+    query_cache.close()
+    if query_log is not None:
+        query_log.close()
+    cpu_executor.shutdown()
+
+
+def build_application():
+    from telegram.ext import Application, CallbackQueryHandler, InlineQueryHandler, MessageHandler, filters
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_API_BASE_URL)
+        .concurrent_updates(UPDATE_CONCURRENCY)
+        .post_init(start_polling)
+        .post_shutdown(close_clients)
+        .build()
+    )
+    message_handler = MessageHandler(filters.TEXT & ~filters.COMMAND, hebrew_search_handler)
+    application.add_handler(message_handler)
+    application.add_handler(CallbackQueryHandler(more_results_handler, pattern=f"^{MORE_CALLBACK_PREFIX}"))
+    application.add_handler(InlineQueryHandler(inline_search.handle))
+    startup.mark("application")
+    return application
+
+
+async def run_webhook(application):
+    # Without a secret anyone who finds the URL could post forged updates, so a
+    # random one is used (and registered with Telegram) when none is configured
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    server = WebhookServer(
+        application,
+        secret_token=secret_token,
+        path=WEBHOOK_PATH,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        workers=WEBHOOK_WORKERS
+    )
+    await application.initialize()
+    try:
+        await start_services(application)
+        await server.start()
+        await register_webhook(application.bot, WEBHOOK_URL, secret_token)
+        startup.mark("webhook")
+        startup.report()
+        print("🤖 Bot is alive!")
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await application.shutdown()
+        await close_clients(application)
+
+
+def main():
+    application = build_application()
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(application))
+        return
+    # run_polling removes any webhook left over from webhook mode before polling
+    application.run_polling(allowed_updates=ALLOWED_UPDATES)
@@ -1 +1,2 @@
-from iop.base import *
\ No newline at end of file
+from iop.base import *
+from iop.resilience import CircuitBreaker, CircuitOpenError, ResilientIopClient
@@ -5,7 +5,9 @@ Created on 2018-03-21
 @author: xuteng.xt
 '''
 
-import requests
+import aiohttp
+import asyncio
+import atexit
 import time
 import hmac
 import hashlib
@@ -14,24 +16,41 @@ import mimetypes
 import itertools
 import random
 import logging
+import logging.handlers
+import queue
 import os
 from os.path import expanduser
 import socket
 import platform
 
-# dir = os.getenv('HOME')
-dir = expanduser("~")
-isExists = os.path.exists(dir + "/logs")
-if not isExists:
-    os.makedirs(dir + "/logs") 
 logger = logging.getLogger(__name__)
 logger.setLevel(level = logging.ERROR)
-handler = logging.FileHandler(dir + "/logs/iopsdk.log." + time.strftime("%Y-%m-%d", time.localtime()))
-handler.setLevel(logging.ERROR)
-# formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-formatter = logging.Formatter('%(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
+_log_listener = None
+
+def configureLogging(log_dir = None):
+    #===========================================================================
+    # Writes SDK error logs to <log_dir>/iopsdk.log.<date> (default IOP_LOG_DIR,
+    # then ~/logs). Callers only enqueue the record; a listener thread does the
+    # file I/O, so logging an error never blocks the event loop.
+    # Runs on the first logged error unless called earlier; does nothing if the
+    # application already attached its own handlers to this logger.
+    #===========================================================================
+    global _log_listener
+    if(_log_listener is not None or logger.handlers):
+        return
+    # dir = os.getenv('HOME')
+    dir = log_dir or os.getenv("IOP_LOG_DIR") or expanduser("~") + "/logs"
+    os.makedirs(dir, exist_ok=True)
+    handler = logging.FileHandler(dir + "/iopsdk.log." + time.strftime("%Y-%m-%d", time.localtime()), delay=True)
+    handler.setLevel(logging.ERROR)
+    # formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter('%(message)s')
+    handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    _log_listener = logging.handlers.QueueListener(records, handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
 
 P_SDK_VERSION = "iop-sdk-python-20220609"
 
@@ -93,9 +112,25 @@ def mixStr(pstr):
     else:
         return str(pstr)
 
+_host_info = None
+
+def hostInfo():
+    #===========================================================================
+    # (local ip, platform) resolved once per process: a DNS lookup on every
+    # logged error blocks the event loop when the SDK is used from asyncio.
+    #===========================================================================
+    global _host_info
+    if(_host_info is None):
+        try:
+            localIp = socket.gethostbyname(socket.gethostname())
+        except OSError:
+            localIp = "127.0.0.1"
+        _host_info = (localIp, platform.platform())
+    return _host_info
+
 def logApiError(appkey, sdkVersion, requestUrl, code, message):
-    localIp = socket.gethostbyname(socket.gethostname())
-    platformType = platform.platform()
+    configureLogging()
+    localIp, platformType = hostInfo()
     logger.error("%s^_^%s^_^%s^_^%s^_^%s^_^%s^_^%s^_^%s" % (
         appkey, sdkVersion,
         time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
@@ -150,6 +185,22 @@ class IopClient(object):
         self._timeout = timeout
     
     def execute(self, request,access_token = None):
+        import requests
+
+        api_url, sign_parameter, full_url = self._prepare(request, access_token)
+
+        try:
+            if(request._http_method == 'POST' or len(request._file_params) != 0) :
+                r = requests.post(api_url,sign_parameter,files=request._file_params, timeout=self._timeout, headers=request._header)
+            else:
+                r = requests.get(api_url,sign_parameter, timeout=self._timeout, headers=request._header)
+        except Exception as err:
+            logApiError(self._app_key, P_SDK_VERSION, full_url, "HTTP_ERROR", str(err))
+            raise err
+
+        return self._parse(r.json(), full_url)
+
+    def _prepare(self, request, access_token = None):
 
         sys_parameters = {
             P_APPKEY: self._app_key,
@@ -193,18 +244,11 @@ class IopClient(object):
             full_url += key + "=" + str(sign_parameter[key]) + "&";
         full_url = full_url[0:-1]
 
-        try:
-            if(request._http_method == 'POST' or len(request._file_params) != 0) :
-                r = requests.post(api_url,sign_parameter,files=request._file_params, timeout=self._timeout, headers=request._header)
-            else:
-                r = requests.get(api_url,sign_parameter, timeout=self._timeout, headers=request._header)
-        except Exception as err:
-            logApiError(self._app_key, P_SDK_VERSION, full_url, "HTTP_ERROR", str(err))
-            raise err
+        return api_url, sign_parameter, full_url
 
-        response = IopResponse()
+    def _parse(self, jsonobj, full_url):
 
-        jsonobj = r.json()
+        response = IopResponse()
 
         if P_CODE in jsonobj:
             response.code = jsonobj[P_CODE]
@@ -224,3 +268,70 @@ class IopClient(object):
         response.body = jsonobj
 
         return response
+
+class AsyncIopClient(IopClient):
+    #===========================================================================
+    # asyncio flavour of IopClient: same signing and response handling, but
+    # requests go through one long-lived aiohttp session so the connection
+    # pool (and its keep-alive sockets) is shared by every call.
+    #
+    # @param limit             max open connections in the pool
+    # @param limit_per_host    max open connections to the gateway host
+    # @param connect_timeout   seconds allowed for establishing a connection
+    # @param keepalive_timeout seconds an idle pooled connection is kept open
+    #===========================================================================
+
+    def __init__(self, server_url,app_key,app_secret,timeout=30,
+                 limit=100, limit_per_host=20, connect_timeout=5, keepalive_timeout=60):
+        super(AsyncIopClient, self).__init__(server_url, app_key, app_secret, timeout)
+        self._limit = limit
+        self._limit_per_host = limit_per_host
+        self._connect_timeout = connect_timeout
+        self._keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _get_session(self):
+        if(self._session is None or self._session.closed):
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout
+            )
+            timeout = aiohttp.ClientTimeout(total=self._timeout, connect=self._connect_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            # Resolve the host info logApiError needs off the event loop
+            if(_host_info is None):
+                asyncio.get_running_loop().run_in_executor(None, hostInfo)
+        return self._session
+
+    async def execute(self, request,access_token = None):
+
+        api_url, sign_parameter, full_url = self._prepare(request, access_token)
+        session = self._get_session()
+
+        try:
+            if(request._http_method == 'POST' or len(request._file_params) != 0) :
+                if(len(request._file_params) != 0):
+                    data = aiohttp.FormData()
+                    for key in sign_parameter:
+                        data.add_field(key, str(sign_parameter[key]))
+                    for key in request._file_params:
+                        data.add_field(key, request._file_params[key])
+                else:
+                    data = {key: str(sign_parameter[key]) for key in sign_parameter}
+                async with session.post(api_url, data=data, headers=request._header) as r:
+                    jsonobj = await r.json(content_type=None)
+            else:
+                params = {key: str(sign_parameter[key]) for key in sign_parameter}
+                async with session.get(api_url, params=params, headers=request._header) as r:
+                    jsonobj = await r.json(content_type=None)
+        except Exception as err:
+            logApiError(self._app_key, P_SDK_VERSION, full_url, "HTTP_ERROR", str(err))
+            raise err
+
+        return self._parse(jsonobj, full_url)
+
+    async def close(self):
+        if(self._session is not None and not self._session.closed):
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+'''
+Resilience layer for AsyncIopClient: per-call deadlines, jittered exponential
+retries, hedged requests and a circuit breaker.
+'''
+
+import asyncio
+import random
+import time
+from collections import deque
+
+import aiohttp
+
+# Gateway error codes that mean "try again later" rather than "this request is wrong"
+RETRYABLE_CODES = {
+    "ApiCallLimit",
+    "AppCallLimit",
+    "ServiceUnavailable",
+    "ServiceTimeout",
+    "SYSTEM_ERROR",
+    "isp.temporary-failed",
+    "isp.call-limited",
+    "isv.temporary-failed",
+}
+
+# Read-only APIs that are safe to send more than once
+IDEMPOTENT_APIS = {
+    "aliexpress.affiliate.link.generate",
+    "aliexpress.affiliate.product.query",
+    "aliexpress.affiliate.productdetail.get",
+    "aliexpress.affiliate.hotproduct.query",
+    "aliexpress.affiliate.category.get",
+}
+
+TRANSPORT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientError, OSError, ValueError)
+
+
+class CircuitOpenError(Exception):
+    '''
+    Raised instead of calling the gateway while the circuit breaker is open.
+    '''
+
+
+class CircuitBreaker(object):
+    #===========================================================================
+    # closed    -> calls go through; `failure_threshold` consecutive failures open it
+    # open      -> calls fail fast with CircuitOpenError for `reset_timeout` seconds
+    # half-open -> one trial call; success closes the circuit, failure re-opens it
+    #===========================================================================
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_in_flight = False
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release_trial(self):
+        # The trial call ended without a verdict on the gateway (cancelled, rejected
+        # by the scheduler, unexpected error): let the next call be the trial instead
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print("⚠️ IOP circuit breaker opened")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ResilientIopClient(object):
+    #===========================================================================
+    # Wraps an AsyncIopClient (or anything with the same `execute`).
+    #
+    # @param deadline         seconds a whole call may take, retries included
+    # @param max_retries      extra attempts after a retryable failure
+    # @param backoff_base     first backoff in seconds, doubled per attempt
+    # @param backoff_max      cap of a single backoff
+    # @param hedge            send a second copy of slow idempotent requests
+    # @param hedge_quantile   latency quantile after which the hedge is sent
+    # @param hedge_min_delay  lower bound of the hedge delay in seconds
+    # @param hedge_default_delay  hedge delay until enough latencies are known
+    # @param breaker          CircuitBreaker shared by every call
+    #===========================================================================
+
+    def __init__(self, client, deadline=8, max_retries=2, backoff_base=0.2, backoff_max=2,
+                 hedge=True, hedge_quantile=0.95, hedge_min_delay=0.05, hedge_default_delay=1.0,
+                 breaker=None):
+        self._client = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def hedge_delay(self):
+        if len(self._latencies) < 20:
+            return self.hedge_default_delay
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))
+        return max(self.hedge_min_delay, ordered[index])
+
+    async def execute(self, request, access_token = None, deadline = None):
+        if not self.breaker.allow():
+            raise CircuitOpenError("IOP gateway circuit is open")
+        # allow() only lets a call through while half-open if it is the trial
+        trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            return await self._execute(request, access_token, deadline)
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    async def _execute(self, request, access_token, deadline):
+        idempotent = request._api_pame in IDEMPOTENT_APIS
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                if(remaining <= 0):
+                    raise asyncio.TimeoutError("IOP call deadline exceeded")
+                response = await asyncio.wait_for(self._attempt(request, access_token, idempotent), remaining)
+            except TRANSPORT_ERRORS as err:
+                response, error = None, err
+            else:
+                if response.code not in RETRYABLE_CODES:
+                    self.breaker.record_success()
+                    return response
+                error = None
+
+            self.breaker.record_failure()
+            remaining = deadline_at - time.monotonic()
+            backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+            if(not idempotent or attempt >= self.max_retries or backoff >= remaining
+                    or self.breaker.state == CircuitBreaker.OPEN):
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(backoff)
+
+    async def _timed_execute(self, request, access_token):
+        start = time.monotonic()
+        response = await self._client.execute(request, access_token)
+        self._latencies.append(time.monotonic() - start)
+        return response
+
+    async def _attempt(self, request, access_token, idempotent):
+        first = asyncio.ensure_future(self._timed_execute(request, access_token))
+        if not (self.hedge and idempotent):
+            return await first
+
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if not done:
+                self.hedges += 1
+                second = asyncio.ensure_future(self._timed_execute(request, access_token))
+                tasks.add(second)
+            # First successful answer wins; an error only counts once every copy failed
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                if not tasks:
+                    raise next(iter(done)).exception()
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,110 @@
+import asyncio
+import importlib
+import os
+import socket
+
+import pytest
+from aiohttp import web
+
+from tools.fake_telegram import FakeTelegram, make_update
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def telegram_port():
+    return free_port()
+
+
+@pytest.fixture(scope="session")
+def bot(tmp_path_factory, telegram_port):
+    """
+    The bot module, imported against a fake Bot API and throwaway caches.
+    """
+    tmp = tmp_path_factory.mktemp("bot")
+    env = {
+        "BOT_TOKEN": "123:test",
+        "TELEGRAM_API_BASE_URL": f"http://127.0.0.1:{telegram_port}/bot",
+        "CACHE_DB_PATH": str(tmp / "cache.sqlite3"),
+        "PHRASE_TABLE_PATH": str(tmp / "phrase_table.json"),
+        "QUERY_LOG": "0",
+        "CPU_EXECUTOR": "inline",
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        module = importlib.import_module("bot")
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    yield module
+    module.link_cache.close()
+    module.query_cache.close()
+
+
+class TelegramHarness:
+    """
+    Runs an Application against FakeTelegram and feeds it text updates the way
+    long polling does, through its update queue.
+    """
+
+    def __init__(self, application, port):
+        self.application = application
+        self.port = port
+        self.fake = FakeTelegram(verbose=False)
+        self._update_ids = iter(range(1, 10_000))
+        self._runner = None
+
+    async def __aenter__(self):
+        self._runner = web.AppRunner(self.fake.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        await self.application.initialize()
+        await self.application.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.application.stop()
+        await self.application.shutdown()
+        await self._runner.cleanup()
+
+    async def send(self, text, chat_id):
+        from telegram import Update
+
+        data = make_update(next(self._update_ids), text, chat_id)
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+
+    def sent(self, method):
+        return [params for name, params in self.fake.calls if name == method]
+
+
+@pytest.fixture
+def telegram(bot, telegram_port):
+    """
+    Returns a function making a TelegramHarness around the bot's Application,
+    with the bot's handlers replaced by `handler`.
+    """
+    def harness(handler):
+        from telegram.ext import MessageHandler, filters
+
+        application = bot.build_application()
+        application.handlers.clear()
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handler))
+        return TelegramHarness(application, telegram_port)
+
+    return harness
+
+
+async def wait_for(predicate, timeout=5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached in time")
+        await asyncio.sleep(0.01)
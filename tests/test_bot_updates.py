@@ -0,0 +1,36 @@
+import asyncio
+
+from tests.conftest import wait_for
+from utils.scheduler import UpstreamScheduler, current_chat_id
+
+
+def test_application_handles_updates_concurrently(bot):
+    application = bot.build_application()
+    assert application.concurrent_updates == bot.UPDATE_CONCURRENCY > 1
+
+
+def test_scheduler_interleaves_chats_arriving_through_the_application(telegram):
+    scheduler = UpstreamScheduler("scrape", rate=1000, max_concurrency=1, max_queue=20)
+    order = []
+
+    async def handler(update, context):
+        chat_id = update.effective_chat.id
+        current_chat_id.set(chat_id)
+
+        async def scrape():
+            order.append((chat_id, update.message.text))
+            await asyncio.sleep(0.05)
+
+        await scheduler.run(scrape)
+
+    async def scenario():
+        async with telegram(handler) as harness:
+            # A burst from one chat, then one search from another
+            for n in range(4):
+                await harness.send(f"a{n}", chat_id=1)
+            await harness.send("b0", chat_id=2)
+            await wait_for(lambda: len(order) == 5)
+
+    asyncio.run(scenario())
+    # Both chats' calls were queued at once and chat 2 didn't wait for chat 1's burst
+    assert [text for _, text in order] == ["a0", "a1", "b0", "a2", "a3"]
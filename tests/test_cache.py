@@ -0,0 +1,212 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.cache import StaleWhileRevalidateCache, TieredCache
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def open_cache(db_path, **kwargs):
+    kwargs.setdefault("flush_interval", 60)
+    return TieredCache("test", ttl=60, db_path=db_path, **kwargs)
+
+
+def test_memory_tier_lru_and_ttl():
+    cache = TieredCache("test", ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    cache.set("short", 4, ttl=-1)
+    assert cache.get("short", "gone") == "gone"
+
+
+def test_set_is_queued_until_flush(db_path):
+    cache = open_cache(db_path)
+    cache.set("k", {"v": 1})
+    assert cache.stats()["pending_writes"] == 1
+
+    other = open_cache(db_path)
+    assert other.get("k") is None
+    other.close()
+
+    cache.flush()
+    assert cache.stats()["pending_writes"] == 0
+    reopened = open_cache(db_path)
+    assert reopened.get("k") == {"v": 1}
+    reopened.close()
+    cache.close()
+
+
+def test_writer_thread_flushes_on_its_own(db_path):
+    cache = open_cache(db_path, flush_interval=0.05)
+    cache.set("k", 1)
+    deadline = time.monotonic() + 2
+    while cache.stats()["flushes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.stats()["flushes"] == 1
+    assert cache.stats()["disk_size"] == 1
+    cache.close()
+
+
+def test_close_commits_queued_writes(db_path):
+    cache = open_cache(db_path)
+    cache.set("k", "v")
+    cache.delete("k")
+    cache.set("kept", "v")
+    cache.close()
+
+    reopened = open_cache(db_path)
+    assert reopened.get("k") is None
+    assert reopened.get("kept") == "v"
+    reopened.close()
+
+
+def test_miss_runs_no_query(db_path):
+    cache = open_cache(db_path)
+    statements = []
+    cache._reader.set_trace_callback(statements.append)
+
+    assert cache.get("never-set") is None
+    assert statements == []
+    cache.close()
+
+
+def test_evicted_key_is_read_back_from_disk_once(db_path):
+    cache = open_cache(db_path, max_entries=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.flush()
+    statements = []
+    cache._reader.set_trace_callback(statements.append)
+
+    assert cache.get("a") == 1
+    assert cache.get("a") == 1
+    assert len(statements) == 1
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    cache.close()
+
+
+def test_queued_writes_are_visible_before_flush(db_path):
+    cache = open_cache(db_path, max_entries=1)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.delete("b")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    cache.close()
+
+
+def test_index_is_loaded_from_disk(db_path):
+    cache = open_cache(db_path)
+    cache.set("a", 1)
+    cache.set("expired", 2, ttl=-1)
+    cache.close()
+
+    reopened = open_cache(db_path)
+    assert reopened.stats()["disk_size"] == 1
+    assert reopened.get("a") == 1
+    reopened.close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.cache.time", clock)
+    return clock
+
+
+def counting_fetch(values):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        value = values[min(len(calls), len(values)) - 1]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return fetch, calls
+
+
+def test_swr_fresh_stale_and_expired(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100)
+        fetch, calls = counting_fetch([["v1"], ["v2"], ["v3"]])
+
+        assert await cache.get_or_fetch("k", fetch) == ["v1"]
+        clock.now += 5
+        assert await cache.get_or_fetch("k", fetch) == ["v1"]
+        assert len(calls) == 1
+
+        # Stale: served at once, refreshed once in the background
+        clock.now += 10
+        assert await cache.get_or_fetch("k", fetch) == ["v1"]
+        assert await cache.get_or_fetch("k", fetch) == ["v1"]
+        await asyncio.sleep(0)
+        assert len(calls) == 2
+        assert await cache.get_or_fetch("k", fetch) == ["v2"]
+
+        # Past the stale window the fetch is awaited
+        clock.now += 200
+        assert await cache.get_or_fetch("k", fetch) == ["v3"]
+        assert cache.stats()["stale_hits"] == 2
+        assert cache.stats()["misses"] == 2
+        assert cache.stats()["refreshes"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_swr_keeps_stale_value_when_refresh_fails(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100)
+        fetch, calls = counting_fetch([["v1"], RuntimeError("upstream down")])
+        await cache.get_or_fetch("k", fetch)
+        clock.now += 20
+        await cache.get_or_fetch("k", fetch)
+        await asyncio.sleep(0)
+
+        assert cache.stats()["refresh_errors"] == 1
+        assert cache.peek("k") == ["v1"]
+
+    asyncio.run(scenario())
+
+
+def test_swr_does_not_keep_empty_results_and_returns_copies(clock):
+    async def scenario():
+        cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100)
+        empty, calls = counting_fetch([[]])
+        await cache.get_or_fetch("empty", empty)
+        await cache.get_or_fetch("empty", empty)
+        assert len(calls) == 2
+
+        fetch, _ = counting_fetch([[{"link": "a"}]])
+        first = await cache.get_or_fetch("k", fetch)
+        first[0]["link"] = "rewritten"
+        assert (await cache.get_or_fetch("k", fetch))[0]["link"] == "a"
+
+    asyncio.run(scenario())
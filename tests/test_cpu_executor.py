@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+
+from utils.cpu_executor import CpuExecutor
+
+MAIN_PY = os.path.join(os.path.dirname(__file__), "..", "main.py")
+
+
+def loaded_modules(names):
+    return [name for name in names if name in sys.modules]
+
+
+def test_spawned_worker_skips_bot_setup(monkeypatch):
+    # Make the pool start its worker the way it does under `python main.py`:
+    # spawn re-runs the __main__ script's file in the worker as __mp_main__
+    main_module = sys.modules["__main__"]
+    monkeypatch.setattr(main_module, "__spec__", None, raising=False)
+    monkeypatch.setattr(main_module, "__file__", os.path.abspath(MAIN_PY), raising=False)
+
+    async def probe():
+        executor = CpuExecutor("process", max_workers=1)
+        try:
+            return await executor.run(loaded_modules, ["__mp_main__", "bot", "dotenv", "sqlite3", "telegram"])
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(probe()) == ["__mp_main__"]
+
+
+def test_inline_and_thread_kinds_run_the_function():
+    async def run(kind):
+        executor = CpuExecutor(kind, max_workers=1)
+        await executor.start()
+        try:
+            return await executor.run(sum, [1, 2, 3])
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(run("inline")) == 6
+    assert asyncio.run(run("thread")) == 6
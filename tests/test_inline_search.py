@@ -0,0 +1,132 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.inline_search import InlineSearch
+from utils.query_optimizer import normalize_query
+
+
+def make_products(count, prefix="Product"):
+    return [
+        {"link": f"https://s.click.aliexpress.com/e/{prefix}{i}", "title": f"{prefix} {i}",
+         "image": f"https://img/{i}.jpg", "price": "9.90", "affiliate": True}
+        for i in range(count)
+    ]
+
+
+class FakeInlineQuery:
+    def __init__(self, user_id, query, answers):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.query = query
+        self._answers = answers
+
+    async def answer(self, results, cache_time=300, is_personal=False):
+        self._answers.append((self.query, [r.title for r in results], cache_time))
+
+
+class FakeCaches:
+    """
+    Stands in for the query cache, the search cache and the upstreams behind them:
+    a warm-up translates and searches, and leaves both results cached.
+    """
+
+    def __init__(self, search_delay=0.0):
+        self.queries = {}
+        self.searches = {}
+        self.search_delay = search_delay
+        self.translated = []
+        self.answers = []
+
+    async def translate(self, query, model):
+        self.translated.append(query)
+        optimized = f"optimized {normalize_query(query)}"
+        self.queries[normalize_query(query)] = optimized
+        return optimized
+
+    async def search(self, optimized):
+        await asyncio.sleep(self.search_delay)
+        self.searches[optimized] = make_products(3, prefix=optimized.split()[-1])
+        return self.searches[optimized]
+
+    async def generate_links(self, products, client, app_secret, limit=4):
+        return products
+
+    def inline_search(self, **kwargs):
+        kwargs.setdefault("debounce", 0.02)
+        kwargs.setdefault("answer_budget", 1.0)
+        return InlineSearch(
+            model=None, translate_and_optimize_query=self.translate, get_aliexpress_product_data=self.search,
+            generate_promotion_links=self.generate_links, client=None, app_secret="secret",
+            query_cache=self.queries, peek_products=self.searches.get, link_cache={}, **kwargs
+        )
+
+    async def send(self, inline_search, user_id, query):
+        update = SimpleNamespace(inline_query=FakeInlineQuery(user_id, query, self.answers))
+        await inline_search.handle(update, None)
+
+
+def test_too_short_query_is_answered_empty_and_uncached():
+    caches = FakeCaches()
+    inline_search = caches.inline_search()
+
+    asyncio.run(caches.send(inline_search, 1, "א"))
+
+    assert caches.answers == [("א", [], 0)]
+
+
+def test_hit_is_answered_from_the_caches():
+    caches = FakeCaches()
+    caches.queries["אוזניות"] = "earbuds"
+    caches.searches["earbuds"] = make_products(3)
+    inline_search = caches.inline_search(cache_time=300)
+
+    asyncio.run(caches.send(inline_search, 1, "אוזניות"))
+
+    assert caches.answers == [("אוזניות", ["Product 0", "Product 1", "Product 2"], 300)]
+    assert caches.translated == []
+    assert inline_search.stats()["hits"] == 1
+
+
+def test_miss_is_warmed_and_answered_within_the_budget():
+    async def scenario():
+        caches = FakeCaches()
+        inline_search = caches.inline_search()
+        await caches.send(inline_search, 1, "שעון")
+        await asyncio.sleep(0.1)
+        # The next keystroke for the same query is a hit
+        await caches.send(inline_search, 2, "שעון")
+        return caches, inline_search.stats()
+
+    caches, stats = asyncio.run(scenario())
+    assert [titles for _, titles, _ in caches.answers] == [["שעון 0", "שעון 1", "שעון 2"]] * 2
+    assert (stats["misses"], stats["warm_answers"], stats["hits"]) == (1, 1, 1)
+
+
+def test_newer_keystroke_supersedes_the_pending_miss():
+    async def scenario():
+        caches = FakeCaches()
+        inline_search = caches.inline_search(debounce=0.05)
+        for query in ("שע", "שעו", "שעון"):
+            await caches.send(inline_search, 1, query)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        return caches, inline_search.stats()
+
+    caches, stats = asyncio.run(scenario())
+    assert caches.translated == ["שעון"]
+    assert [query for query, _, _ in caches.answers] == ["שעון"]
+    assert (stats["debounced"], stats["warmups"]) == (2, 1)
+
+
+def test_warm_ups_beyond_the_limit_are_skipped():
+    async def scenario():
+        caches = FakeCaches(search_delay=0.1)
+        inline_search = caches.inline_search(max_warmups=1, answer_budget=0.5)
+        await caches.send(inline_search, 1, "שעון")
+        await caches.send(inline_search, 2, "מטען")
+        await asyncio.sleep(0.3)
+        return caches, inline_search.stats()
+
+    caches, stats = asyncio.run(scenario())
+    assert caches.translated == ["שעון"]
+    assert sorted(caches.answers) == [("מטען", [], 0), ("שעון", ["שעון 0", "שעון 1", "שעון 2"], 300)]
+    assert (stats["warmups"], stats["warmups_skipped"]) == (1, 1)
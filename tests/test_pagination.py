@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from tests.test_cache import FakeClock
+from utils.pagination import CandidateStore
+
+
+def make_products(count):
+    return [{"link": f"https://www.aliexpress.com/item/{i}.html", "title": f"Product {i}"} for i in range(count)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.pagination.time", clock)
+    return clock
+
+
+def test_pages_are_served_in_order_and_copied():
+    store = CandidateStore(page_size=2, max_results=5)
+    products = make_products(6)
+
+    pages = store.put(1, "אוזניות", products)
+    products[0]["link"] = "rewritten"
+
+    assert store.get(1, pages.token) is pages
+    assert [p["title"] for p in pages.take()[0]] == ["Product 0", "Product 1"]
+    assert pages.products[0]["link"] == "https://www.aliexpress.com/item/0.html"
+    assert [p["title"] for p in pages.take()[0]] == ["Product 2", "Product 3"]
+    assert [p["title"] for p in pages.take()[0]] == ["Product 4"]
+    assert not pages.has_more()
+
+
+def test_nothing_is_kept_for_empty_results():
+    store = CandidateStore()
+
+    assert store.put(1, "q", []) is None
+    assert store.get(1) is None
+
+
+def test_stale_token_misses():
+    store = CandidateStore()
+    old = store.put(1, "first", make_products(3))
+    store.put(1, "second", make_products(3))
+
+    assert store.get(1, old.token) is None
+    assert store.get(1).query == "second"
+    assert store.stats()["misses"] == 1
+
+
+def test_entries_expire(clock):
+    store = CandidateStore(ttl=60)
+    store.put(1, "q", make_products(3))
+
+    clock.now += 59
+    assert store.get(1) is not None
+    clock.now += 2
+    assert store.get(1) is None
+    assert store.stats()["size"] == 0
+
+
+def test_eviction_and_replacement_cancel_the_prefetch():
+    async def scenario():
+        store = CandidateStore(max_chats=2)
+        tasks = {}
+        for chat_id in (1, 2):
+            pages = store.put(chat_id, "q", make_products(3))
+            pages.prefetched = tasks[chat_id] = asyncio.ensure_future(asyncio.sleep(10))
+
+        store.get(1)  # chat 1 is now the most recently used, so chat 2 is evicted
+        store.put(3, "q", make_products(3))
+        store.put(1, "newer", make_products(3))  # a new search replaces chat 1's pages
+        await asyncio.sleep(0)
+        return store, tasks
+
+    store, tasks = asyncio.run(scenario())
+    assert store.get(2) is None
+    assert store.get(1).query == "newer"
+    assert store.evictions == 1
+    assert tasks[1].cancelled() and tasks[2].cancelled()
+
+
+def test_take_hands_over_the_prefetch_and_record_page_counts_ready_ones():
+    async def scenario():
+        store = CandidateStore()
+        pages = store.put(1, "q", make_products(8))
+        pages.prefetched = asyncio.ensure_future(asyncio.sleep(0, result="page"))
+        await asyncio.sleep(0.01)
+        _, prefetched = pages.take()
+        store.record_page(prefetched)
+
+        pending = asyncio.ensure_future(asyncio.sleep(10))
+        pages.prefetched = pending
+        pending.cancel()
+        await asyncio.sleep(0)
+        _, cancelled = pages.take()
+        store.record_page(cancelled)
+        return store, prefetched, cancelled
+
+    store, prefetched, cancelled = asyncio.run(scenario())
+    assert prefetched.result() == "page"
+    assert cancelled is None
+    assert store.stats()["prefetch_hits"] == 1
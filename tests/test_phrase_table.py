@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from tools.build_phrase_table import build_table, read_pairs
+from utils.phrase_table import PhraseTable, QueryLog
+from utils.query_optimizer import translate_and_optimize_query
+
+
+class FakeModel:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(text=self.text)
+
+
+def test_lookup_hits_misses_and_skips_long_queries():
+    table = PhraseTable({"אוזניות": "wireless earbuds"}, max_words=2)
+
+    assert table.lookup("תחפש לי אוזניות!") == "wireless earbuds"
+    assert table.lookup("שעון") is None
+    assert table.lookup("כיסוי לאייפון שקוף") is None
+    assert table.stats()["hits"] == 1
+    assert (table.misses, table.skipped) == (1, 1)
+
+
+def test_every_nth_hit_is_revalidated_by_gemini(tmp_path):
+    table = PhraseTable({"אוזניות": "wireless earbuds"}, revalidate_every=3)
+    model = FakeModel("bluetooth earbuds")
+    log = QueryLog(str(tmp_path / "log.jsonl"))
+
+    async def scenario():
+        return [await translate_and_optimize_query("אוזניות", model, phrase_table=table, query_log=log)
+                for _ in range(4)]
+
+    results = asyncio.run(scenario())
+    log.close()
+    sources = [json.loads(line)["source"] for line in open(tmp_path / "log.jsonl", encoding="utf-8")]
+
+    assert results == ["wireless earbuds", "wireless earbuds", "bluetooth earbuds", "wireless earbuds"]
+    assert sources == ["table", "table", "gemini", "table"]
+    assert model.calls == 1
+    assert table.stats()["revalidations"] == 1
+
+
+def test_table_older_than_max_age_is_not_used(tmp_path):
+    path = tmp_path / "phrase_table.json"
+    path.write_text(json.dumps({"built": int(time.time()) - 100, "phrases": {"שעון": "smart watch"}}),
+                    encoding="utf-8")
+
+    assert PhraseTable.load(str(path), max_age=1000).lookup("שעון") == "smart watch"
+    expired = PhraseTable.load(str(path), max_age=10)
+    assert expired.lookup("שעון") is None
+    assert expired.skipped == 1
+    assert PhraseTable.load(str(tmp_path / "missing.json")).phrases == {}
+
+
+def test_query_log_writes_in_the_background_and_rotates(tmp_path):
+    path = tmp_path / "log.jsonl"
+    log = QueryLog(str(path), max_bytes=300, flush_interval=0.01)
+
+    log.record("אוזניות", "wireless earbuds", "gemini")
+    deadline = time.monotonic() + 2
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_text(encoding="utf-8"))["optimized"] == "wireless earbuds"
+
+    for n in range(10):
+        log.record(f"שאילתה {n}", f"query {n}", "cache")
+    log.close()
+
+    assert log.rotations >= 1
+    assert (tmp_path / "log.jsonl.1").stat().st_size >= 300
+    rotated = list(read_pairs([str(tmp_path / "log.jsonl.1")]))
+    if path.exists():
+        rotated += list(read_pairs([str(path)]))
+    assert len(rotated) == 11
+
+
+def test_query_log_drops_lines_beyond_the_queue_limit(tmp_path):
+    log = QueryLog(str(tmp_path / "log.jsonl"), flush_interval=60, max_pending=2)
+
+    for n in range(5):
+        log.record(f"q{n}", f"query {n}", "gemini")
+    log.close()
+
+    assert log.dropped == 3
+    assert len((tmp_path / "log.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_build_table_counts_cache_answers_but_not_table_replays():
+    pairs = (
+        [("אוזניות", "Wireless Earbuds", "gemini")] + [("אוזניות", "wireless earbuds", "cache")] * 4
+        + [("שעון", "smart watch", "table")] * 10 + [("שעון", "smart watch", "gemini")]
+        + [("מטען", "fast charger", "cache")] * 5
+        + [("תיק", "backpack", "gemini"), ("תיק", "handbag", "cache"), ("תיק", "handbag", "cache")]
+    )
+
+    phrases, candidates = build_table(pairs, min_count=3, min_agreement=0.7)
+
+    assert phrases == {"אוזניות": "wireless earbuds"}
+    by_query = {c[0]: c for c in candidates}
+    assert by_query["שעון"][1:3] == (11, 1)
+    assert "מטען" not in by_query
+    assert by_query["תיק"][3:] == ("handbag", 2 / 3)
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.promotion_links import _source_key, generate_promotion_links
+
+
+def item_url(item_id, scheme="https"):
+    return f"{scheme}://www.aliexpress.com/item/{item_id}.html"
+
+
+def make_products(count):
+    return [
+        {"link": item_url(1000 + i), "title": f"Product {i}", "image": f"https://img/{i}.jpg", "price": "9.90"}
+        for i in range(count)
+    ]
+
+
+class FakeLinkClient:
+    """
+    Answers aliexpress.affiliate.link.generate, leaving out the item ids in `missing`
+    from batch requests. `echo` rewrites the source_value the gateway echoes back.
+    """
+
+    def __init__(self, missing=(), echo=None):
+        self.missing = set(missing)
+        self.echo = echo or (lambda url: url)
+        self.requests = []
+
+    async def execute(self, request):
+        source_values = request._api_params["source_values"].split(",")
+        self.requests.append(source_values)
+        entries = [
+            {"source_value": self.echo(url), "promotion_link": f"https://s.click.aliexpress.com/e/{_source_key(url)}"}
+            for url in source_values
+            if len(source_values) == 1 or _source_key(url) not in self.missing
+        ]
+        return SimpleNamespace(body={"aliexpress_affiliate_link_generate_response": {"resp_result": {
+            "result": {"promotion_links": {"promotion_link": entries}}
+        }}})
+
+
+def test_source_key_matches_items_across_url_forms():
+    assert _source_key("https://www.aliexpress.com/item/1005001.html") == "1005001"
+    assert _source_key("//he.aliexpress.com/item/1005001.html?spm=a2g0o&algo=x") == "1005001"
+    assert _source_key(" https://s.click.aliexpress.com/e/_abc ") == "https://s.click.aliexpress.com/e/_abc"
+    assert _source_key(None) == ""
+
+
+def test_one_request_per_batch():
+    client = FakeLinkClient()
+    products = make_products(12)
+
+    linked = asyncio.run(generate_promotion_links(products, client, "secret", limit=12, batch_size=5))
+
+    assert [len(r) for r in client.requests] == [5, 5, 2]
+    assert [p["link"] for p in linked] == [f"https://s.click.aliexpress.com/e/{1000 + i}" for i in range(12)]
+
+
+def test_stops_at_limit():
+    client = FakeLinkClient()
+
+    linked = asyncio.run(generate_promotion_links(make_products(12), client, "secret", limit=4, batch_size=10))
+
+    assert len(linked) == 4
+    assert len(client.requests) == 1
+
+
+def test_only_missing_items_are_retried_one_by_one():
+    client = FakeLinkClient(missing={"1001", "1003"})
+
+    linked = asyncio.run(generate_promotion_links(make_products(5), client, "secret", limit=5))
+
+    assert client.requests[0] == [item_url(1000 + i) for i in range(5)]
+    assert sorted(client.requests[1:]) == [[item_url(1001)], [item_url(1003)]]
+    assert len(linked) == 5
+
+
+def test_echoed_source_values_are_matched_by_item_id():
+    client = FakeLinkClient(echo=lambda url: url.replace("https://", "http://") + "?aff_fcid=x")
+
+    linked = asyncio.run(generate_promotion_links(make_products(3), client, "secret", limit=3))
+
+    assert len(client.requests) == 1
+    assert [p["link"] for p in linked] == [f"https://s.click.aliexpress.com/e/{1000 + i}" for i in range(3)]
+
+
+def test_incomplete_products_are_skipped():
+    client = FakeLinkClient()
+    products = make_products(3)
+    products[1]["image"] = ""
+
+    linked = asyncio.run(generate_promotion_links(products, client, "secret", limit=3))
+
+    assert [p["title"] for p in linked] == ["Product 0", "Product 2"]
+    assert client.requests == [[item_url(1000), item_url(1002)]]
+
+
+def test_cached_links_skip_the_api():
+    from utils.cache import TieredCache
+
+    cache = TieredCache("promotion_links", ttl=60)
+    client = FakeLinkClient()
+    asyncio.run(generate_promotion_links(make_products(2), client, "secret", limit=2, cache=cache))
+
+    linked = asyncio.run(generate_promotion_links(make_products(3), client, "secret", limit=3, cache=cache))
+
+    assert client.requests == [[item_url(1000), item_url(1001)], [item_url(1002)]]
+    assert [p["link"] for p in linked] == [f"https://s.click.aliexpress.com/e/{1000 + i}" for i in range(3)]
+
+
+class OpenCircuitClient:
+    async def execute(self, request):
+        from iop import CircuitOpenError
+
+        raise CircuitOpenError("IOP circuit breaker is open")
+
+
+def test_open_circuit_returns_cached_links_only():
+    from utils.cache import TieredCache
+
+    cache = TieredCache("promotion_links", ttl=60)
+    asyncio.run(generate_promotion_links(make_products(2)[1:], FakeLinkClient(), "secret", limit=1, cache=cache))
+
+    linked = asyncio.run(generate_promotion_links(make_products(3), OpenCircuitClient(), "secret", limit=3,
+                                                  cache=cache))
+
+    assert [p["link"] for p in linked] == ["https://s.click.aliexpress.com/e/1001"]
+
+
+def test_open_circuit_plain_link_mode():
+    linked = asyncio.run(generate_promotion_links(make_products(3), OpenCircuitClient(), "secret", limit=2,
+                                                  plain_links=True))
+
+    assert [p["link"] for p in linked] == [item_url(1000), item_url(1001)]
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from iop import CircuitBreaker, CircuitOpenError, IopRequest, ResilientIopClient
+from utils.scheduler import ScheduledProxy, SchedulerBusy, UpstreamScheduler
+from utils.upstreams import build_iop_client, build_schedulers
+
+LINK_API = "aliexpress.affiliate.link.generate"
+
+
+class FakeGateway:
+    """
+    Answers `execute` after `delay` seconds with the next code from `codes`
+    ("0" once they run out), or raises `error`.
+    """
+
+    def __init__(self, delay=0.0, codes=(), error=None, delays=None):
+        self.delay = delay
+        self.delays = list(delays or [])
+        self.codes = list(codes)
+        self.error = error
+        self.calls = 0
+
+    async def execute(self, request, access_token=None):
+        self.calls += 1
+        await asyncio.sleep(self.delays.pop(0) if self.delays else self.delay)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(code=self.codes.pop(0) if self.codes else "0")
+
+
+def resilient(gateway, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    kwargs.setdefault("hedge", False)
+    return ResilientIopClient(gateway, **kwargs)
+
+
+def test_retryable_code_is_retried():
+    gateway = FakeGateway(codes=["ApiCallLimit"])
+    client = resilient(gateway)
+
+    response = asyncio.run(client.execute(IopRequest(LINK_API)))
+
+    assert response.code == "0"
+    assert (gateway.calls, client.retries) == (2, 1)
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_idempotent_call_is_not_retried():
+    gateway = FakeGateway(codes=["ApiCallLimit"])
+    client = resilient(gateway)
+
+    response = asyncio.run(client.execute(IopRequest("aliexpress.affiliate.order.list")))
+
+    assert response.code == "ApiCallLimit"
+    assert gateway.calls == 1
+
+
+def test_slow_request_is_hedged():
+    gateway = FakeGateway(delays=[0.5, 0.01])
+    client = resilient(gateway, hedge=True, hedge_default_delay=0.02)
+
+    start = time.perf_counter()
+    asyncio.run(client.execute(IopRequest(LINK_API)))
+
+    assert time.perf_counter() - start < 0.3
+    assert (client.hedges, client.hedge_wins) == (1, 1)
+
+
+def test_deadline_bounds_the_call():
+    client = resilient(FakeGateway(delay=1.0), deadline=0.1)
+
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client.execute(IopRequest(LINK_API)))
+    assert time.perf_counter() - start < 0.5
+
+
+def test_breaker_opens_then_half_open_trial_closes_it():
+    gateway = FakeGateway(error=OSError("connection reset"))
+    client = resilient(gateway, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(OSError):
+                await client.execute(IopRequest(LINK_API))
+        assert client.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await client.execute(IopRequest(LINK_API))
+        calls = gateway.calls
+
+        await asyncio.sleep(0.06)
+        gateway.error = None
+        gateway.delay = 0.05
+        # Only one trial goes through while half-open
+        results = await asyncio.gather(
+            client.execute(IopRequest(LINK_API)), client.execute(IopRequest(LINK_API)), return_exceptions=True
+        )
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == 2
+    assert [type(r).__name__ for r in results] == ["SimpleNamespace", "CircuitOpenError"]
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.breaker.rejected == 2
+
+
+def test_failed_trial_reopens_the_breaker():
+    gateway = FakeGateway(error=OSError("connection reset"))
+    client = resilient(gateway, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+
+    async def scenario():
+        with pytest.raises(OSError):
+            await client.execute(IopRequest(LINK_API))
+        await asyncio.sleep(0.06)
+        with pytest.raises(OSError):
+            await client.execute(IopRequest(LINK_API))
+
+    asyncio.run(scenario())
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_local_queueing_is_not_counted_against_a_healthy_gateway():
+    # bot.py's wiring: the scheduler admits whole resilient calls, so a call that waits
+    # in the local queue longer than its deadline still gets its full deadline afterwards
+    gateway = FakeGateway(delay=0.02)
+    env = {"IOP_RATE": "100", "IOP_BURST": "5", "IOP_CONCURRENCY": "5", "IOP_DEADLINE": "0.2"}
+    _, _, scheduler = build_schedulers(env)
+    client = build_iop_client(gateway, scheduler, env)
+
+    async def scenario():
+        return await asyncio.gather(
+            *[client.execute(IopRequest(LINK_API)) for _ in range(40)], return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [r for r in results if isinstance(r, BaseException)] == []
+    assert scheduler.stats()["completed"] == 40
+    assert client.breaker.failures == 0
+    assert client.hedges == 0
+    assert max(client._latencies) < 0.1
+
+
+def test_scheduler_rejections_are_not_gateway_failures():
+    client = resilient(FakeGateway(delay=0.05), breaker=CircuitBreaker(failure_threshold=1))
+    scheduler = UpstreamScheduler("iop", rate=1000, max_concurrency=1, max_queue=1)
+    proxy = ScheduledProxy(client, scheduler, ["execute"])
+
+    async def scenario():
+        return await asyncio.gather(
+            *[proxy.execute(IopRequest(LINK_API)) for _ in range(3)], return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert [type(r) for r in results].count(SchedulerBusy) == 1
+    assert client.breaker.state == CircuitBreaker.CLOSED
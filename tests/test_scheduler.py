@@ -0,0 +1,132 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.scheduler import ChatThrottle, ScheduledProxy, SchedulerBusy, UpstreamScheduler, current_chat_id
+
+
+def test_concurrency_is_bounded():
+    async def scenario():
+        scheduler = UpstreamScheduler("test", rate=1000, max_concurrency=2)
+        running = []
+        peak = []
+
+        async def call():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+        await asyncio.gather(*[scheduler.run(call) for _ in range(6)])
+        return max(peak), scheduler.stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats["completed"] == 6
+    assert stats["queued"] == 0 and stats["in_flight"] == 0
+
+
+def test_full_queue_rejects():
+    async def scenario():
+        scheduler = UpstreamScheduler("gemini", rate=1000, max_concurrency=1, max_queue=2)
+        release = asyncio.Event()
+        calls = [asyncio.create_task(scheduler.run(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.run(release.wait)
+        release.set()
+        await asyncio.gather(*calls)
+        return busy.value, scheduler.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.upstream == "gemini"
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 3
+
+
+def test_waiting_chats_are_served_round_robin():
+    async def scenario():
+        scheduler = UpstreamScheduler("scrape", rate=1000, max_concurrency=1, max_queue=20)
+        order = []
+
+        async def search(chat_id, n):
+            current_chat_id.set(chat_id)
+
+            async def call():
+                order.append(f"{chat_id}{n}")
+                await asyncio.sleep(0.01)
+
+            await scheduler.run(call)
+
+        # Chat "a" sends a burst; "b" and "c" each send one search a moment later
+        tasks = [asyncio.create_task(search("a", n)) for n in range(5)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(search(chat_id, 0)) for chat_id in ("b", "c")]
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["a0", "a1", "b0", "c0", "a2", "a3", "a4"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = UpstreamScheduler("iop", rate=1000, max_concurrency=1, max_queue=1)
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.run(release.wait))
+        waiting = asyncio.create_task(scheduler.run(release.wait))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.stats()["queued"] == 0
+        # The freed queue slot admits a new call
+        queued = asyncio.create_task(scheduler.run(release.wait))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(running, queued)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["completed"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_rate_limit():
+    async def scenario():
+        scheduler = UpstreamScheduler("test", rate=50, burst=1, max_concurrency=10)
+        start = time.perf_counter()
+        await asyncio.gather(*[scheduler.run(asyncio.sleep, 0) for _ in range(6)])
+        return time.perf_counter() - start
+
+    assert asyncio.run(scenario()) >= 0.09
+
+
+def test_chat_throttle_spaces_one_chat_only():
+    async def scenario():
+        throttle = ChatThrottle(min_interval=0.05)
+        start = time.perf_counter()
+        await asyncio.gather(throttle.wait(1), throttle.wait(2), throttle.wait(3))
+        parallel = time.perf_counter() - start
+        start = time.perf_counter()
+        await asyncio.gather(*[throttle.wait(4) for _ in range(3)])
+        return parallel, time.perf_counter() - start, throttle.delayed
+
+    parallel, serial, delayed = asyncio.run(scenario())
+    assert parallel < 0.04
+    assert serial >= 0.09
+    assert delayed == 2
+
+
+def test_scheduled_proxy_wraps_named_methods_only():
+    class Client:
+        timeout = 15
+
+        async def execute(self, request):
+            return request
+
+    scheduler = UpstreamScheduler("iop", rate=1000)
+    proxy = ScheduledProxy(Client(), scheduler, ["execute"])
+
+    assert asyncio.run(proxy.execute("req")) == "req"
+    assert proxy.timeout == 15
+    assert scheduler.completed == 1
@@ -0,0 +1,60 @@
+import os
+
+from utils.search_parser import extract_item_list, extract_products, parse_search_page
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "fixtures", "wholesale_bluetooth_earbuds.html")
+
+
+def load_fixture():
+    with open(FIXTURE, "rb") as f:
+        return f.read()
+
+
+def test_extracts_complete_items_in_page_order():
+    records = extract_products(load_fixture())
+
+    assert [r.item_id for r in records] == [
+        "1005006012345601",
+        "1005006012345602",
+        "1005006012345603",
+        "1005006012345604",
+        "1005006012345605",
+        "1005006012345608",
+    ]
+    first = records[0]
+    assert first.title == "TWS Wireless Bluetooth 5.3 Earbuds Noise Cancelling Sport Headphones"
+    assert first.image == "https://ae-pic-a1.aliexpress-media.com/kf/S3f2a0c1e9b6d4a7e8c5b2d1f0e9a8b7cT.jpg"
+    assert first.price == "24.51"
+
+
+def test_skips_the_head_config_and_decodes_the_payload():
+    # The head script mentions "itemList" too, without a "content" array nearby
+    assert len(extract_item_list(load_fixture())) == 8
+
+
+def test_item_id_falls_back_to_tracking_params():
+    records = {r.item_id: r for r in extract_products(load_fixture())}
+    assert records["1005006012345604"].title == "Kids Wireless Headphones Over Ear Cat Ears 85dB Limit"
+
+
+def test_null_prices_and_titles():
+    records = {r.item_id: r for r in extract_products(load_fixture())}
+    # "prices": null with the sale price under another key
+    assert records["1005006012345605"].price == "33.66"
+    # "prices": null with no sale price anywhere, and "title": null
+    assert "1005006012345606" not in records
+    assert "1005006012345607" not in records
+
+
+def test_parse_search_page_builds_item_links():
+    products = parse_search_page(load_fixture().decode("utf-8"))
+    assert products[0] == {
+        "link": "https://www.aliexpress.com/item/1005006012345601.html",
+        "title": "TWS Wireless Bluetooth 5.3 Earbuds Noise Cancelling Sport Headphones",
+        "image": "https://ae-pic-a1.aliexpress-media.com/kf/S3f2a0c1e9b6d4a7e8c5b2d1f0e9a8b7cT.jpg",
+        "price": "24.51",
+    }
+
+
+def test_page_without_payload():
+    assert extract_products(b"<html><body>captcha</body></html>") == []
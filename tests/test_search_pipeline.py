@@ -0,0 +1,114 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+
+from utils.hebrew_search_handler import format_preview, format_results, run_search_pipeline
+from utils.promotion_links import LinksUnavailable
+from utils.scheduler import SchedulerBusy
+
+
+def make_products(count):
+    return [
+        {"link": f"https://www.aliexpress.com/item/{1000 + i}.html", "title": f"Product {i}",
+         "image": f"https://img/{i}.jpg", "price": "9.90"}
+        for i in range(count)
+    ]
+
+
+class FakeUpstreams:
+    def __init__(self, products, unlinked=(), links_error=None):
+        self.products = products
+        self.unlinked = set(unlinked)
+        self.links_error = links_error
+        self.collages = []
+
+    async def translate(self, query, model):
+        return "earbuds"
+
+    async def search(self, query):
+        return self.products
+
+    async def generate_links(self, products, client, app_secret, limit=4):
+        if self.links_error is not None:
+            raise self.links_error
+        linked = []
+        for product in products:
+            if product["title"] in self.unlinked:
+                continue
+            product["link"] = f"https://s.click.aliexpress.com/e/{product['title']}"
+            linked.append(product)
+            if len(linked) == limit:
+                break
+        return linked
+
+    async def collage(self, products):
+        self.collages.append([p["title"] for p in products])
+        return BytesIO(",".join(p["title"] for p in products).encode())
+
+    async def improve_titles(self, titles, model):
+        return [f"Improved {title}" for title in titles]
+
+    def run(self):
+        return asyncio.run(run_search_pipeline(
+            "אוזניות", None, self.search, self.generate_links, self.collage, self.improve_titles,
+            self.translate, None, "secret"
+        ))
+
+
+def test_all_linked_uses_the_concurrent_collage_and_titles():
+    upstreams = FakeUpstreams(make_products(6))
+
+    result = upstreams.run()
+
+    assert [p["title"] for p in result["products"]] == ["Product 0", "Product 1", "Product 2", "Product 3"]
+    assert all(p["link"].startswith("https://s.click.aliexpress.com/") for p in result["products"])
+    assert result["titles"][0] == "Improved Product 0"
+    assert upstreams.collages == [["Product 0", "Product 1", "Product 2", "Product 3"]]
+    assert [p["title"] for p in result["more"]] == ["Product 4", "Product 5"]
+
+
+def test_unlinked_products_are_replaced_by_the_next_candidates():
+    upstreams = FakeUpstreams(make_products(7), unlinked={"Product 1"})
+
+    result = upstreams.run()
+
+    assert [p["title"] for p in result["products"]] == ["Product 0", "Product 2", "Product 3", "Product 4"]
+    assert result["titles"] == ["Improved Product 0", "Improved Product 2", "Improved Product 3", "Product 4"]
+    assert upstreams.collages[-1] == ["Product 0", "Product 2", "Product 3", "Product 4"]
+    assert result["collage"] == b"Product 0,Product 2,Product 3,Product 4"
+    assert [p["title"] for p in result["more"]] == ["Product 5", "Product 6"]
+
+
+def test_no_linked_products_raises():
+    upstreams = FakeUpstreams(make_products(3), unlinked={"Product 0", "Product 1", "Product 2"})
+
+    with pytest.raises(LinksUnavailable):
+        upstreams.run()
+
+
+def test_scheduler_busy_in_links_is_not_hidden_by_plain_links():
+    upstreams = FakeUpstreams(make_products(3), links_error=SchedulerBusy("iop queue full"))
+
+    with pytest.raises(SchedulerBusy):
+        upstreams.run()
+
+
+def test_no_results():
+    result = FakeUpstreams([]).run()
+
+    assert result["products"] == []
+    assert result["more"] == []
+
+
+def test_results_are_escaped_for_html():
+    product = {"link": "https://s.click.aliexpress.com/e/_abc?a=1&b=2", "title": "Cable <USB-C> & charger",
+               "price": "9.90"}
+
+    text = format_results([product], ["<b>Fast</b> cable"])
+    preview = format_preview([product])
+
+    assert "&lt;b&gt;Fast&lt;/b&gt; cable" in text
+    assert "Cable &lt;USB-C&gt; &amp; charger" in preview
+    assert "a=1&amp;b=2" in text
+    assert "<" not in text + preview
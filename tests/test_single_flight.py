@@ -0,0 +1,128 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+
+from tests.conftest import wait_for
+from utils.hebrew_search_handler import handle_hebrew_search
+from utils.single_flight import SingleFlight
+
+
+def counting_work(result="done", delay=0.05, error=None):
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return work, calls
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        work, calls = counting_work()
+        results = await asyncio.gather(*[flights.do("k", work) for _ in range(3)])
+        assert flights.in_flight() == 0
+        # Finished work is forgotten, so a later call starts fresh
+        await flights.do("k", work)
+        return results, calls, flights
+
+    results, calls, flights = asyncio.run(scenario())
+    assert results == ["done"] * 3
+    assert len(calls) == 2
+    assert (flights.started, flights.shared) == (2, 2)
+
+
+def test_cancelled_waiter_leaves_shared_work_running():
+    async def scenario():
+        flights = SingleFlight()
+        work, calls = counting_work(delay=0.1)
+        first = asyncio.create_task(flights.do("k", work))
+        second = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first, calls
+
+    result, first, calls = asyncio.run(scenario())
+    assert result == "done"
+    assert first.cancelled()
+    assert len(calls) == 1
+
+
+def test_timed_out_waiter_leaves_shared_work_running():
+    async def scenario():
+        flights = SingleFlight()
+        work, calls = counting_work(delay=0.1)
+        patient = asyncio.create_task(flights.do("k", work))
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do("k", work, timeout=0.01)
+        return await patient, calls
+
+    result, calls = asyncio.run(scenario())
+    assert result == "done"
+    assert len(calls) == 1
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flights = SingleFlight()
+        work, _ = counting_work(error=RuntimeError("scrape failed"))
+        results = await asyncio.gather(flights.do("k", work), flights.do("k", work), return_exceptions=True)
+        return results, flights.in_flight()
+
+    results, in_flight = asyncio.run(scenario())
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert in_flight == 0
+
+
+def test_identical_searches_through_the_application_scrape_once(telegram):
+    scrapes = []
+    flights = SingleFlight()
+    products = [
+        {"link": f"https://www.aliexpress.com/item/{1000 + i}.html", "title": f"Product {i}",
+         "image": f"https://img/{i}.jpg", "price": "9.90"}
+        for i in range(4)
+    ]
+
+    async def translate(query, model):
+        return "bluetooth earbuds"
+
+    async def scrape(query):
+        scrapes.append(query)
+        await asyncio.sleep(0.2)
+        return [dict(p) for p in products]
+
+    async def generate_links(products, client, app_secret, limit=4):
+        for product in products:
+            product["link"] = product["link"].replace("www.aliexpress.com/item", "s.click.aliexpress.com/e")
+        return products[:limit]
+
+    async def collage(products):
+        return BytesIO(b"collage")
+
+    async def improve_titles(titles, model):
+        return titles
+
+    async def handler(update, context):
+        await handle_hebrew_search(
+            update=update, context=context, model=None, get_aliexpress_product_data=scrape,
+            generate_promotion_links=generate_links, fetch_and_create_collage=collage,
+            improve_titles_with_gemini=improve_titles, translate_and_optimize_query=translate,
+            client=None, app_secret="secret", hebrew_triggers=["תחפש לי"], single_flight=flights
+        )
+
+    async def scenario():
+        async with telegram(handler) as harness:
+            await harness.send("תחפש לי אוזניות בלוטוס", chat_id=1)
+            await harness.send("תחפש לי   אוזניות בלוטוס", chat_id=2)
+            await wait_for(lambda: len(harness.sent("sendPhoto")) == 2)
+            return harness.sent("sendPhoto")
+
+    photos = asyncio.run(scenario())
+    assert len(scrapes) == 1
+    assert sorted(int(p["chat_id"]) for p in photos) == [1, 2]
+    assert flights.shared == 1
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.stage_graph import StageGraph
+
+
+def test_independent_stages_overlap():
+    async def sleep(value):
+        await asyncio.sleep(0.1)
+        return value
+
+    graph = StageGraph()
+    graph.add("a", lambda: sleep(1))
+    graph.add("b", lambda a: sleep(a + 1), deps=["a"])
+    graph.add("c", lambda a: sleep(a + 2), deps=["a"])
+    graph.add("d", lambda b, c: b + c, deps=["b", "c"])
+
+    start = time.perf_counter()
+    results = asyncio.run(graph.run())
+
+    assert results == {"a": 1, "b": 2, "c": 3, "d": 5}
+    assert time.perf_counter() - start < 0.3
+    path, _ = graph.critical_path()
+    assert path[0] == "a" and path[-1] == "d"
+
+
+def test_failed_stage_with_fallback_feeds_dependents():
+    def fail():
+        raise RuntimeError("gemini down")
+
+    graph = StageGraph()
+    graph.add("titles", fail, fallback=[])
+    graph.add("reply", lambda titles: len(titles), deps=["titles"])
+
+    results = asyncio.run(graph.run())
+
+    assert results == {"titles": [], "reply": 0}
+    assert isinstance(graph.errors["titles"], RuntimeError)
+
+
+def test_required_failure_cancels_the_rest_and_is_reraised():
+    cancelled = []
+
+    class Busy(Exception):
+        pass
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("slow")
+            raise
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise Busy("queue full")
+
+    graph = StageGraph()
+    graph.add("slow", slow, fallback=None)
+    graph.add("links", fail)
+    graph.add("after", lambda links: links, deps=["links"])
+
+    with pytest.raises(Busy):
+        asyncio.run(graph.run())
+    assert cancelled == ["slow"]
+
+
+def test_unknown_dependency():
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add("scrape", lambda query: query, deps=["translate"])
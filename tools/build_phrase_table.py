@@ -0,0 +1,110 @@
+"""
+Builds the phrase table (utils/phrase_table.py) from the query log.
+
+Reads the JSONL query log(s) written by utils.phrase_table.QueryLog and keeps
+a Hebrew query when it is short, was answered often enough, and those answers
+agree (after case and whitespace normalization) in a large enough share. The
+table maps each kept query to that translation.
+
+"gemini" and "cache" records count as answers: the query cache keeps Gemini's
+answers for a week, so most repeats of a common query are served from it and
+counting only fresh Gemini answers would keep such queries out of the table
+for weeks. A query needs at least one "gemini" record. "table" records replay
+the table itself, so counting them would let an entry confirm itself on every
+rebuild; they are only reported, as how often the query was asked. Table
+entries still get fresh Gemini answers through the bot's revalidation
+(PHRASE_TABLE_REVALIDATE_EVERY), which a rebuild uses to correct or drop them.
+
+Usage:
+    python -m tools.build_phrase_table query_pairs.jsonl --output phrase_table.json
+    python -m tools.build_phrase_table query_pairs.jsonl query_pairs.jsonl.1 --output phrase_table.json
+    python -m tools.build_phrase_table logs/*.jsonl --min-count 5 --min-agreement 0.8 --max-words 2
+"""
+import argparse
+import json
+import time
+from collections import Counter, defaultdict
+
+from utils.query_optimizer import normalize_query
+
+
+def read_pairs(paths):
+    """
+    Yields (normalized query, optimized query, source) from the log files, skipping broken lines.
+    """
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                query = normalize_query(record.get("query", ""))
+                optimized = " ".join(str(record.get("optimized") or "").split())
+                if query and optimized:
+                    yield query, optimized, record.get("source", "gemini")
+
+
+def build_table(pairs, min_count=3, min_agreement=0.7, max_words=3):
+    """
+    Returns (phrases, candidates): the kept {query: translation} and, for the
+    report, (query, asked, Gemini and cache answers, top translation, agreement)
+    of every short query Gemini translated.
+    """
+    answers = defaultdict(Counter)
+    asked = Counter()
+    from_gemini = set()
+    for query, optimized, source in pairs:
+        asked[query] += 1
+        if source in ("gemini", "cache"):
+            answers[query][optimized.lower()] += 1
+        if source == "gemini":
+            from_gemini.add(query)
+
+    phrases = {}
+    candidates = []
+    for query, counter in answers.items():
+        if query.count(" ") >= max_words or query not in from_gemini:
+            continue
+        count = sum(counter.values())
+        translation, top = counter.most_common(1)[0]
+        agreement = top / count
+        candidates.append((query, asked[query], count, translation, agreement))
+        if count >= min_count and agreement >= min_agreement:
+            phrases[query] = translation
+    return phrases, candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="JSONL query logs")
+    parser.add_argument("--output", default="phrase_table.json")
+    parser.add_argument("--min-count", type=int, default=3, help="Gemini and cache answers a query needs")
+    parser.add_argument("--min-agreement", type=float, default=0.7,
+                        help="share of its answers that must agree on the translation")
+    parser.add_argument("--max-words", type=int, default=3, help="longest query kept, in words")
+    parser.add_argument("--top", type=int, default=20, help="candidates to list")
+    args = parser.parse_args()
+
+    phrases, candidates = build_table(read_pairs(args.logs), args.min_count, args.min_agreement, args.max_words)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "built": int(time.time()),
+            "min_count": args.min_count,
+            "min_agreement": args.min_agreement,
+            "max_words": args.max_words,
+            "phrases": dict(sorted(phrases.items())),
+        }, f, ensure_ascii=False, indent=1)
+
+    asked = sum(c[1] for c in candidates)
+    covered = sum(c[1] for c in candidates if c[0] in phrases)
+    print(f"{len(phrases)} of {len(candidates)} short queries kept, covering {covered} of their {asked} "
+          f"requests ({covered / asked * 100 if asked else 0:.0f}%) -> {args.output}")
+    print(f"{'query':<30}{'asked':>7}{'answers':>8}{'agree':>7}  translation")
+    for query, times, count, translation, agreement in sorted(candidates, key=lambda c: c[1], reverse=True)[:args.top]:
+        mark = "*" if query in phrases else " "
+        print(f"{mark}{query:<29}{times:>7}{count:>8}{agreement:>7.0%}  {translation}")
+
+
+if __name__ == "__main__":
+    main()
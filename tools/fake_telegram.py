@@ -0,0 +1,167 @@
+"""
+Fake Telegram Bot API for exercising the bot's webhook mode locally.
+
+It answers the Bot API methods the bot uses (getMe, setWebhook, sendMessage,
+sendPhoto, editMessageText, deleteMessage, ...), remembers the webhook the bot
+registers and then posts synthetic text-message updates to it, signed with the
+registered secret token. Every call the bot makes is printed.
+
+Run it, then start the bot against it:
+
+    python -m tools.fake_telegram --port 8081 --count 5 "תחפש לי אוזניות בלוטוס"
+
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot \\
+    WEBHOOK_URL=http://127.0.0.1:8080/telegram WEBHOOK_SECRET=local-secret \\
+    python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def make_update(update_id, text, chat_id, user_id=None, message_id=None):
+    """
+    Builds the JSON of a private-chat text message update.
+    """
+    user_id = user_id or chat_id
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id or update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Tester"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Tester"},
+            "text": text,
+        },
+    }
+
+
+class FakeTelegram:
+    """
+    In-process fake of the Telegram Bot API.
+
+    Attributes:
+        webhook_url (str): URL registered through setWebhook, if any
+        secret_token (str): Secret token registered through setWebhook
+        calls (list): (method, params) of every Bot API call received
+        webhook_registered (asyncio.Event): Set when setWebhook is called
+    """
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.webhook_url = None
+        self.secret_token = None
+        self.calls = []
+        self.webhook_registered = asyncio.Event()
+        self._message_ids = itertools.count(10_000)
+        self._file_ids = itertools.count(1)
+
+    def _message(self, params, **extra):
+        chat_id = int(params.get("chat_id", 0))
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = {key: value for key, value in (await request.post()).items() if isinstance(value, str)}
+        self.calls.append((method, params))
+        if self.verbose:
+            summary = params.get("text") or params.get("caption") or ""
+            print(f"← {method} {summary[:60]!r}")
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.secret_token = params.get("secret_token")
+            self.webhook_registered.set()
+            result = True
+        elif method == "sendMessage":
+            result = self._message(params, text=params.get("text", ""))
+        elif method == "editMessageText":
+            result = self._message(params, text=params.get("text", ""))
+        elif method == "sendPhoto":
+            file_id = f"fake-photo-{next(self._file_ids)}"
+            result = self._message(params, caption=params.get("caption", ""), photo=[
+                {"file_id": file_id, "file_unique_id": file_id, "width": 1000, "height": 1000}
+            ])
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self):
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def post_updates(self, texts, count=1, rate=1.0, chat_ids=(1,)):
+        """
+        Posts `count` updates per text to the registered webhook at `rate` updates/second.
+
+        Returns:
+            list: HTTP status of each delivery
+        """
+        statuses = []
+        update_ids = itertools.count(1)
+        async with aiohttp.ClientSession() as session:
+            for _ in range(count):
+                for text, chat_id in zip(texts, itertools.cycle(chat_ids)):
+                    update = make_update(next(update_ids), text, chat_id)
+                    headers = {SECRET_HEADER: self.secret_token} if self.secret_token else {}
+                    async with session.post(self.webhook_url, json=update, headers=headers) as resp:
+                        statuses.append(resp.status)
+                    if self.verbose:
+                        print(f"→ update {update['update_id']} {text!r}: HTTP {resp.status}")
+                    await asyncio.sleep(1 / rate)
+        return statuses
+
+
+async def run(args):
+    fake = FakeTelegram()
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fake Bot API on http://{args.host}:{args.port}/bot — waiting for setWebhook...")
+    try:
+        await fake.webhook_registered.wait()
+        print(f"Webhook registered: {fake.webhook_url}")
+        await fake.post_updates(args.texts, count=args.count, rate=args.rate)
+        # Keep answering the bot's replies until interrupted
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts", nargs="*", default=["תחפש לי אוזניות בלוטוס"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--count", type=int, default=1, help="updates to send per text")
+    parser.add_argument("--rate", type=float, default=1.0, help="updates per second")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
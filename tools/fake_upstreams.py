@@ -0,0 +1,277 @@
+"""
+Local stand-ins for every upstream the bot calls, for load tests and benchmarks.
+
+- FakeIopGateway: an IOP gateway that verifies request signatures exactly like
+  iop.base.sign and answers aliexpress.affiliate.link.generate and
+  aliexpress.affiliate.product.query.
+- FakeWholesale: the he.aliexpress.com wholesale search page, serving recorded
+  HTML (image hosts rewritten to the fake CDN) or a synthetic page.
+- FakeImageCdn: product images as JPEGs.
+- FakeGeminiModel: an in-process stand-in for genai.GenerativeModel.
+
+Every fake takes a `latency` (seconds, or a (min, max) range) that is added to
+each response.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import zlib
+from io import BytesIO
+
+from aiohttp import web
+
+from iop import IopRequest, sign
+
+
+def _delay(latency):
+    if isinstance(latency, (tuple, list)):
+        return random.uniform(*latency)
+    return latency or 0
+
+
+class _FakeServer:
+    """
+    Base class: runs an aiohttp app on an ephemeral (or given) local port.
+    """
+
+    def __init__(self, latency=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self._runner = None
+
+    def routes(self, app):
+        raise NotImplementedError
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def sleep(self):
+        self.requests += 1
+        delay = _delay(self.latency)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def start(self):
+        app = web.Application()
+        self.routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeIopGateway(_FakeServer):
+    """
+    IOP gateway stand-in. Requests with a wrong signature get an
+    IncompleteSignature error, like the real gateway.
+
+    Args:
+        app_secret (str): Secret used to verify signatures
+        failure_rate (float, optional): Share of calls answered with an
+            ApiCallLimit error. Defaults to 0.
+        image_base (str, optional): Base URL of the product images returned by
+            product.query, e.g. a FakeImageCdn. Defaults to the real CDN host.
+        items (int, optional): Products per product.query page. Defaults to 20.
+    """
+
+    def __init__(self, app_secret, failure_rate=0.0, image_base="https://ae01.alicdn.com", items=20, **kwargs):
+        super().__init__(**kwargs)
+        self.app_secret = app_secret
+        self.failure_rate = failure_rate
+        self.image_base = image_base
+        self.items = items
+        self.signature_errors = 0
+
+    @property
+    def url(self):
+        return f"{self.base_url}/sync"
+
+    def routes(self, app):
+        app.router.add_post("/sync", self.handle)
+        app.router.add_get("/sync", self.handle)
+
+    def _error(self, code, message):
+        return web.json_response({"type": "ISV", "code": code, "message": message,
+                                  "request_id": hashlib.md5(message.encode()).hexdigest()[:12]})
+
+    async def handle(self, request):
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update({key: value for key, value in (await request.post()).items()})
+        await self.sleep()
+
+        received = params.pop("sign", "")
+        if sign(self.app_secret, IopRequest(params.get("method", "")), params) != received:
+            self.signature_errors += 1
+            return self._error("IncompleteSignature", "The request signature does not conform to platform standards")
+        if random.random() < self.failure_rate:
+            return self._error("ApiCallLimit", "The request has exceeded the call limit")
+
+        method = params.get("method")
+        if method == "aliexpress.affiliate.link.generate":
+            return web.json_response(self.link_generate(params))
+        if method == "aliexpress.affiliate.product.query":
+            return web.json_response(self.product_query(params))
+        return self._error("InvalidApiPath", f"Unknown method {method}")
+
+    def link_generate(self, params):
+        links = []
+        for source in params.get("source_values", "").split(","):
+            if not source:
+                continue
+            digest = zlib.crc32(source.encode()) & 0xFFFFFFFF
+            links.append({
+                "source_value": source,
+                "promotion_link": f"https://s.click.aliexpress.com/e/_fake{digest:08x}",
+            })
+        return {"aliexpress_affiliate_link_generate_response": {"resp_result": {
+            "resp_code": 200, "resp_msg": "Call succeeds",
+            "result": {"total_result_count": len(links),
+                       "tracking_id": params.get("tracking_id"),
+                       "promotion_links": {"promotion_link": links}},
+        }}}
+
+    def product_query(self, params):
+        keywords = params.get("keywords", "")
+        page_size = min(int(params.get("page_size", self.items)), self.items)
+        offset = (zlib.crc32(keywords.encode()) % 10_000) * 1000 + (int(params.get("page_no", 1)) - 1) * page_size
+        products = []
+        for i in range(page_size):
+            product_id = 1005000000000000 + offset + i
+            products.append({
+                "product_id": product_id,
+                "product_title": f"{keywords} item {i + 1}",
+                "product_main_image_url": f"{self.image_base}/kf/Q{offset + i}.jpg",
+                "product_detail_url": f"https://www.aliexpress.com/item/{product_id}.html",
+                "promotion_link": f"https://s.click.aliexpress.com/e/_fake{product_id:x}",
+                "target_sale_price": f"{9.9 + i * 1.37:.2f}",
+                "target_sale_price_currency": params.get("target_currency", "ILS"),
+            })
+        return {"aliexpress_affiliate_product_query_response": {"resp_result": {
+            "resp_code": 200, "resp_msg": "Call succeeds",
+            "result": {"current_page_no": int(params.get("page_no", 1)),
+                       "current_record_count": len(products),
+                       "total_record_count": 1000,
+                       "products": {"product": products}},
+        }}}
+
+
+class FakeWholesale(_FakeServer):
+    """
+    Wholesale search page stand-in.
+
+    Args:
+        image_base (str): Base URL of the fake image CDN
+        pages (list, optional): Recorded HTML pages (bytes) served round-robin.
+            Defaults to None, which serves a synthetic page per query.
+        items (int, optional): Items per synthetic page. Defaults to 60.
+    """
+
+    def __init__(self, image_base, pages=None, items=60, **kwargs):
+        super().__init__(**kwargs)
+        self.image_base = image_base
+        self.items = items
+        self.pages = [self._rewrite_images(page) for page in pages or []]
+        self._synthetic = {}
+
+    @property
+    def url(self):
+        return f"{self.base_url}/wholesale"
+
+    def routes(self, app):
+        app.router.add_get("/wholesale", self.handle)
+
+    def _rewrite_images(self, page):
+        return re.sub(rb"(?:https?:)?//ae\d+(?:-\w+)?\.alicdn\.com", self.image_base.encode(), page)
+
+    def page_for(self, query):
+        if self.pages:
+            return self.pages[zlib.crc32(query.encode()) % len(self.pages)]
+        if query not in self._synthetic:
+            from benchmarks.search_parser import make_synthetic_page
+
+            offset = (zlib.crc32(query.encode()) % 10_000) * 1000
+            self._synthetic[query] = make_synthetic_page(
+                items=self.items, filler_kb=300, image_base=self.image_base, id_offset=offset
+            )
+        return self._synthetic[query]
+
+    async def handle(self, request):
+        await self.sleep()
+        body = self.page_for(request.query.get("SearchText", ""))
+        response = web.Response(body=body, content_type="text/html", charset="utf-8")
+        response.set_cookie("xman_t", f"rotated{self.requests}")
+        return response
+
+
+class FakeImageCdn(_FakeServer):
+    """
+    Image CDN stand-in serving a few pre-encoded JPEGs of `size` pixels.
+    """
+
+    def __init__(self, size=800, variants=8, **kwargs):
+        super().__init__(**kwargs)
+        from PIL import Image
+
+        self.images = []
+        for i in range(variants):
+            image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+            image = Image.blend(image, Image.new("RGB", (size, size), ((i * 53) % 256, (i * 97) % 256, 128)), 0.5)
+            output = BytesIO()
+            image.save(output, format="JPEG", quality=85)
+            self.images.append(output.getvalue())
+
+    def routes(self, app):
+        app.router.add_get("/kf/{name}", self.handle)
+
+    async def handle(self, request):
+        await self.sleep()
+        body = self.images[zlib.crc32(request.match_info["name"].encode()) % len(self.images)]
+        return web.Response(body=body, content_type="image/jpeg")
+
+
+class _FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    In-process stand-in for genai.GenerativeModel with configurable latency.
+
+    Translation prompts get a deterministic English query back. Prompts that ask
+    for a JSON response (batched titles) get one {"index", "title"} object per
+    numbered line of the prompt.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.calls += 1
+        delay = _delay(self.latency)
+        if delay:
+            await asyncio.sleep(delay)
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            titles = re.findall(r"^(\d+)\. (.+)$", prompt, re.MULTILINE)
+            return _FakeGeminiResponse(json.dumps(
+                [{"index": int(i), "title": f"✨ {title[:40]}"} for i, title in titles], ensure_ascii=False
+            ))
+        query = prompt.rsplit("\n", 1)[-1]
+        return _FakeGeminiResponse(f"product {zlib.crc32(query.encode()) % 1000} wireless best seller")
+
+    def generate_content(self, prompt, **kwargs):
+        raise RuntimeError("FakeGeminiModel only supports generate_content_async")
@@ -0,0 +1,103 @@
+"""
+Startup profile of the bot: per-module import time plus bot.py's startup phases.
+
+Imports bot.py in a fresh interpreter with `-X importtime` and
+STARTUP_PROFILE=1, then prints the slowest imports (cumulative and self time)
+and the phase report bot.py prints itself. Nothing is started: importing bot
+only builds the clients, caches and schedulers.
+
+Usage:
+    python -m tools.startup_profile --top 15
+    python -m tools.startup_profile --module bot --lazy   # also resolve lazy objects
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+PROFILE_CODE = """
+import {module}
+{module}.startup.mark("rest of module")
+"""
+
+RESOLVE_LAZY = """
+from utils.startup import LazyObject
+for value in list(vars({module}).values()):
+    if isinstance(value, LazyObject):
+        value.resolve()
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Returns (module, self_us, cumulative_us, depth) tuples from `-X importtime` output.
+    """
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.append((name, int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+def direct_imports(modules, module):
+    """
+    Returns the imports made directly by `module` (one level below it).
+    """
+    pending = []
+    for entry in modules:
+        if entry[3] == 0:
+            if entry[0] == module:
+                return pending
+            pending = []
+        elif entry[3] == 1:
+            pending.append(entry)
+    return []
+
+
+def profile(module="bot", lazy=False):
+    env = dict(os.environ, STARTUP_PROFILE="1")
+    code = PROFILE_CODE.format(module=module)
+    if lazy:
+        code += RESOLVE_LAZY.format(module=module)
+    code += f"{module}.startup.report()\n"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        raise SystemExit(result.returncode)
+    return parse_importtime(result.stderr), result.stdout
+
+
+def print_table(title, rows):
+    print(title)
+    print(f"{'module':<50}{'self ms':>10}{'cumul. ms':>12}")
+    for name, own, cumulative, depth in rows:
+        print(f"{name:<50}{own / 1000:>10.1f}{cumulative / 1000:>12.1f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="bot", help="module to import")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--lazy", action="store_true", help="also resolve the module's LazyObjects")
+    args = parser.parse_args()
+
+    modules, phases = profile(args.module, args.lazy)
+    total = sum(own for _, own, _, _ in modules)
+    print(f"{len(modules)} modules imported in {total / 1000:.1f} ms\n")
+
+    print_table(f"Slowest imports made by {args.module} (cumulative)",
+                sorted(direct_imports(modules, args.module), key=lambda m: m[2], reverse=True)[:args.top])
+    print_table("Slowest modules (self)",
+                sorted(modules, key=lambda m: m[1], reverse=True)[:args.top])
+    print(phases.rstrip())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,54 @@
 """
 Utility functions for the AliExpress Telegram Bot.
+
+Names are imported from their submodules on first access, so importing one
+utility doesn't pull in the dependencies of all the others.
 """
 
-from .query_optimizer import translate_and_optimize_query
-from .title_improver import improve_title_with_gemini
-from .promotion_links import generate_promotion_links
-from .hebrew_search_handler import handle_hebrew_search
-from .image_collage import fetch_and_create_collage
-from .webhook_manager import delete_webhook
-
-__all__ = [
-    'translate_and_optimize_query', 
-    'improve_title_with_gemini', 
-    'generate_promotion_links',
-    'handle_hebrew_search',
-    'fetch_and_create_collage',
-    'delete_webhook'
-]
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    'translate_and_optimize_query': '.query_optimizer',
+    'normalize_query': '.query_optimizer',
+    'PhraseTable': '.phrase_table',
+    'QueryLog': '.phrase_table',
+    'improve_title_with_gemini': '.title_improver',
+    'improve_titles_with_gemini': '.title_improver',
+    'generate_promotion_links': '.promotion_links',
+    'handle_hebrew_search': '.hebrew_search_handler',
+    'handle_more_results': '.hebrew_search_handler',
+    'fetch_and_create_collage': '.image_collage',
+    'delete_webhook': '.webhook_manager',
+    'register_webhook': '.webhook_manager',
+    'WebhookServer': '.webhook_server',
+    'AliExpressScraper': '.scraper',
+    'ProductQuerySearch': '.product_query',
+    'InlineSearch': '.inline_search',
+    'StageGraph': '.stage_graph',
+    'CpuExecutor': '.cpu_executor',
+    'UpstreamScheduler': '.scheduler',
+    'ScheduledProxy': '.scheduler',
+    'SchedulerBusy': '.scheduler',
+    'SingleFlight': '.single_flight',
+    'REGISTRY': '.metrics',
+    'start_metrics_server': '.metrics',
+    'TieredCache': '.cache',
+    'StaleWhileRevalidateCache': '.cache',
+    'CollageCache': '.cache',
+    'CandidateStore': '.pagination',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
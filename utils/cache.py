@@ -0,0 +1,430 @@
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TieredCache:
+    """
+    A key/value cache with an in-memory LRU tier and an optional on-disk SQLite tier.
+
+    Entries expire after `ttl` seconds in both tiers. The memory tier holds at most
+    `max_entries` items and the disk tier at most `max_disk_entries`; the oldest
+    entries are evicted first. Values must be JSON serializable.
+
+    Lookups and writes are served from memory, so the event loop never waits on
+    the disk tier's commits. `set` and `delete` only queue the change; a writer
+    thread commits the queue in one transaction every `flush_interval` seconds,
+    and `close` commits what is left. The keys on disk are indexed in memory, so
+    a miss costs no query and only a key that was evicted from the memory tier
+    but is still on disk is read back, once. The cache assumes it is the only
+    writer of its namespace.
+
+    Args:
+        namespace (str): Name that separates this cache's rows in a shared database
+        ttl (float): Time to live of an entry in seconds
+        max_entries (int, optional): Size bound of the memory tier. Defaults to 1024.
+        db_path (str, optional): SQLite file for the disk tier. Defaults to None (memory only).
+        max_disk_entries (int, optional): Size bound of the disk tier. Defaults to 50000.
+        flush_interval (float, optional): Seconds between commits of queued writes. Defaults to 1.0.
+    """
+
+    def __init__(self, namespace, ttl, max_entries=1024, db_path=None, max_disk_entries=50000, flush_interval=1.0):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.flush_interval = flush_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Queued disk writes: key -> (serialized value, expires_at), or None for a delete
+        self._pending = {}
+        # The batch the writer is committing, until the disk index reflects it
+        self._flushing = {}
+        # Expiry of every row in the disk tier, as of the last flush
+        self._on_disk = {}
+        self._db = None
+        self._reader = None
+        self._writer = None
+        self._closing = threading.Event()
+        self._disk_writes = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+
+        if db_path:
+            # One connection per thread: the writer's commits never hold up reads on the event loop
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_expiry ON cache (namespace, expires_at)")
+            self._db.commit()
+            self._reader = sqlite3.connect(db_path, check_same_thread=False)
+            self._on_disk = self._load_disk_index()
+            self._writer = threading.Thread(target=self._write_loop, name=f"cache-writer-{namespace}", daemon=True)
+            self._writer.start()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for `key`, or `default` if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if key in self._pending:
+                row = self._pending[key]
+            elif key in self._flushing:
+                row = self._flushing[key]
+            elif self._on_disk.get(key, 0) > now:
+                row = self._reader.execute(
+                    "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+                if row is None:
+                    # Pruned from disk since the index was built
+                    self._on_disk.pop(key, None)
+            else:
+                row = None
+
+            if row and row[1] > now:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores `value` under `key` in every tier.
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        serialized = json.dumps(value, ensure_ascii=False) if self._db is not None else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._pending[key] = (serialized, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                self._pending[key] = None
+
+    def flush(self):
+        """
+        Commits the queued disk writes. Called by the writer thread and by `close`.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+        if not batch:
+            return
+        writes = [(self.namespace, key, row[0], row[1]) for key, row in batch.items() if row is not None]
+        deletes = [(self.namespace, key) for key, row in batch.items() if row is None]
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)", writes
+            )
+            self._db.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", deletes)
+            pruned = self._disk_writes // 100 != (self._disk_writes + len(writes)) // 100
+            self._disk_writes += len(writes)
+            if pruned:
+                self._prune_disk()
+            self._db.commit()
+        except sqlite3.Error as e:
+            self._db.rollback()
+            with self._lock:
+                self._flushing = {}
+            print(f"⚠️ Failed to write {len(batch)} {self.namespace} cache entries to disk: {e}")
+            return
+        self.flushes += 1
+
+        index = self._load_disk_index() if pruned else None
+        with self._lock:
+            if index is not None:
+                self._on_disk = index
+            else:
+                for key, row in batch.items():
+                    if row is None:
+                        self._on_disk.pop(key, None)
+                    else:
+                        self._on_disk[key] = row[1]
+            self._flushing = {}
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current size of the memory tier.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._memory),
+            "disk_size": len(self._on_disk),
+            "pending_writes": len(self._pending),
+            "flushes": self.flushes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """
+        Stops the writer thread after it commits the queued writes, and closes the database.
+        """
+        if self._db is None:
+            return
+        self._closing.set()
+        self._writer.join()
+        self._reader.close()
+        self._db.close()
+        self._db = None
+        self._reader = None
+
+    def _write_loop(self):
+        while not self._closing.is_set():
+            self._closing.wait(self.flush_interval)
+            self.flush()
+
+    def _load_disk_index(self):
+        return dict(self._db.execute(
+            "SELECT key, expires_at FROM cache WHERE namespace = ? AND expires_at > ?",
+            (self.namespace, time.time())
+        ).fetchall())
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _prune_disk(self):
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, time.time())
+        )
+        self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_disk_entries)
+        )
+
+
+class StaleWhileRevalidateCache:
+    """
+    An in-memory LRU cache for async lookups that serves stale entries while refreshing them.
+
+    An entry younger than `fresh_ttl` is returned as is. An entry older than that but
+    younger than `fresh_ttl + stale_ttl` is still returned immediately, and a single
+    background refresh is started for its key. Older entries are treated as missing.
+    Values are deep-copied on the way out so callers may mutate what they get.
+
+    Args:
+        fresh_ttl (float): Seconds an entry is served without a refresh
+        stale_ttl (float): Extra seconds a stale entry may be served while refreshing
+        max_entries (int, optional): Size bound of the cache. Defaults to 256.
+    """
+
+    def __init__(self, fresh_ttl, stale_ttl, max_entries=256):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for `key`, awaiting `fetch()` only on a miss.
+
+        Args:
+            key: The cache key
+            fetch: Coroutine function without arguments that produces the value
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.fresh_ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            if age < self.fresh_ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                self._revalidate(key, fetch)
+                return copy.deepcopy(value)
+            del self._entries[key]
+
+        self.misses += 1
+        value = await fetch()
+        self._store(key, value)
+        return copy.deepcopy(value)
+
+    def peek(self, key):
+        """
+        Returns a copy of the entry for `key` if it may still be served, without fetching.
+        """
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] >= self.fresh_ttl + self.stale_ttl:
+            return None
+        return copy.deepcopy(entry[0])
+
+    def stats(self):
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+    def _store(self, key, value):
+        # Empty results usually mean a failed or throttled upstream call; don't keep them
+        if not value:
+            return
+        self._entries[key] = (copy.deepcopy(value), time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _revalidate(self, key, fetch):
+        if key in self._refreshing:
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+
+    async def _refresh(self, key, fetch):
+        try:
+            self._store(key, await fetch())
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            print(f"⚠️ Background refresh failed for {key!r}: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+
+class CollageCache:
+    """
+    LRU cache of rendered collages keyed by the ordered product image URLs.
+
+    Each entry holds the encoded collage and, once it has been uploaded, the
+    Telegram `file_id` of the photo. A repeat result set is then sent by
+    `file_id` with no download, render or upload. When Telegram rejects a
+    `file_id`, `invalidate_file_id` drops it and the kept bytes are uploaded again.
+
+    Args:
+        max_entries (int, optional): Maximum number of collages. Defaults to 256.
+        max_bytes (int, optional): Maximum total size of the kept collages. Defaults to 64 MB.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.file_id_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(products):
+        return tuple(product["image"] for product in products)
+
+    def get(self, key):
+        """
+        Returns the {"collage", "file_id"} entry for `key`, or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry)
+
+    def file_id(self, key):
+        """
+        Returns the Telegram file_id for `key` if one is known, without counting a lookup.
+        """
+        entry = self._entries.get(key)
+        if entry is None or not entry["file_id"]:
+            return None
+        self._entries.move_to_end(key)
+        self.file_id_hits += 1
+        return entry["file_id"]
+
+    def put(self, key, collage):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old["collage"])
+        self._entries[key] = {"collage": collage, "file_id": old["file_id"] if old else None}
+        self._bytes += len(collage)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted["collage"])
+            self.evictions += 1
+
+    def set_file_id(self, key, file_id):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["file_id"] = file_id
+
+    def invalidate_file_id(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry["file_id"]:
+            entry["file_id"] = None
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "file_id_hits": self.file_id_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
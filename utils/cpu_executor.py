@@ -0,0 +1,105 @@
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import time
+
+from .metrics import REGISTRY
+
+CPU_TASK_SECONDS = REGISTRY.histogram(
+    "bot_cpu_task_seconds", "Time CPU-bound work took including the wait for a worker, by task.", ["task"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+KINDS = ("process", "thread", "inline")
+
+
+def warm_up():
+    """
+    Loads what the offloaded tasks need so a worker's first task doesn't pay
+    for it: PIL, the badge font and rendered badges, and the search parser.
+    """
+    from .image_collage import _get_badge
+    from .search_parser import extract_products
+
+    for idx in range(1, 5):
+        _get_badge(idx)
+    extract_products(b'"itemList":{"content":[]}')
+    return os.getpid()
+
+
+class CpuExecutor:
+    """
+    Runs CPU-bound work (HTML parsing, collage rendering) off the event loop.
+
+    "process" uses a process pool, so the work runs in parallel despite the GIL
+    and never stalls the loop; functions and their arguments must be picklable,
+    so tasks take and return plain bytes, tuples and lists. "thread" uses a
+    thread pool (no pickling, but the GIL is shared with the loop) and "inline"
+    runs the work on the loop thread as before.
+
+    Workers are started and warmed up by `start`; `run` starts the pool on first
+    use if `start` was never called. Spawned workers re-import the launching
+    script as __mp_main__, so that script must do nothing at import time
+    (see main.py, which only imports bot.py under `if __name__ == "__main__"`).
+
+    Args:
+        kind (str, optional): "process", "thread" or "inline". Defaults to "process".
+        max_workers (int, optional): Pool size. Defaults to the CPU count, at most 4.
+        start_method (str, optional): multiprocessing start method for process
+            pools. Defaults to "spawn", which is safe with the loop's threads.
+    """
+
+    def __init__(self, kind="process", max_workers=None, start_method="spawn"):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown CPU executor kind {kind!r}, expected one of {KINDS}")
+        self.kind = kind
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.start_method = start_method
+        self._pool = None
+        self.submitted = 0
+
+    def _get_pool(self):
+        if self._pool is None and self.kind != "inline":
+            if self.kind == "process":
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=warm_up
+                )
+            else:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="cpu", initializer=warm_up
+                )
+        return self._pool
+
+    async def start(self):
+        """
+        Starts every worker and waits until each has warmed up.
+        """
+        if self.kind == "inline":
+            warm_up()
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        # One short task per worker makes the pool start all of them now
+        await asyncio.gather(*[
+            loop.run_in_executor(pool, time.sleep, 0.05) for _ in range(self.max_workers)
+        ])
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Returns `fn(*args, **kwargs)` computed on a worker.
+        """
+        self.submitted += 1
+        with CPU_TASK_SECONDS.time(task=fn.__name__):
+            if self.kind == "inline":
+                return fn(*args, **kwargs)
+            call = functools.partial(fn, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), call)
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
@@ -1,13 +1,405 @@
-from telegram import Update
+import asyncio
+import html
+import time
 from io import BytesIO
+from typing import TYPE_CHECKING
 
-async def handle_hebrew_search(update: Update, context, model, get_aliexpress_product_data, 
-                              generate_promotion_links, fetch_and_create_collage, 
-                              improve_title_with_gemini, translate_and_optimize_query,
-                              client, app_secret, hebrew_triggers):
+from .stage_graph import StageGraph
+from .scheduler import SchedulerBusy, current_chat_id
+from .query_optimizer import normalize_query
+from .pagination import MORE_CALLBACK_PREFIX
+from .promotion_links import LinksUnavailable
+from .metrics import (
+    SEARCH_FIRST_CONTENT_SECONDS, SEARCH_REPLY_SECONDS, SEARCH_SECONDS, SEARCHES_IN_FLIGHT, SEARCHES_TOTAL,
+    SLOW_SEARCHES, record_stage_timings
+)
+
+if TYPE_CHECKING:
+    from telegram import Update
+
+RESULTS_PER_SEARCH = 4
+
+
+def _is_bundle(product):
+    link = product["link"]
+    return "BundleDeals" in link or "bundle" in link.lower() or "productIds=" in link
+
+
+def select_candidates(products, limit=RESULTS_PER_SEARCH):
+    """
+    Drops bundle pages and incomplete products and keeps the first `limit` results
+    (all of them when `limit` is None).
+    """
+    return [
+        p for p in products
+        if not _is_bundle(p) and all(p.get(k) for k in ('link', 'title', 'image', 'price'))
+    ][:limit]
+
+
+def format_results(products, titles):
+    """
+    The results message; sent with parse_mode="HTML", so scraped and generated text is escaped.
+    """
+    product_texts = []
+    for i, (product, title) in enumerate(zip(products, titles), start=1):
+        product_entry = (
+            f"{i}. 🛍️ {html.escape(title)}\n"
+            f"💸 {html.escape(str(product['price']))} ש\"ח\n"
+            f"🔗 {html.escape(product['link'])}"
+        )
+        product_texts.append(product_entry)
+    return "\n\n".join(product_texts) + "\n\nהקוסם AI"
+
+
+def format_preview(products):
+    """
+    The interim reply shown while the collage and improved titles are being prepared.
+    """
+    return format_results(products, [p['title'] for p in products]) + "\n\n⏳ מכין תמונה ותיאורים..."
+
+
+class SearchProgress:
+    """
+    Partial results of one pipeline run, shared by every chat waiting on it.
+
+    `preview` resolves with the candidates (affiliate links included) as soon as
+    the links stage is done.
+    """
+
+    def __init__(self):
+        self.preview = asyncio.get_running_loop().create_future()
+        self.finished = False
+        self.waiters = 0
+
+    def publish_preview(self, products):
+        if not self.preview.done():
+            self.preview.set_result(products)
+
+
+def more_results_markup(pages):
+    """
+    Returns the inline "more results" button for `pages`, or None when there are no more.
+    """
+    if pages is None or not pages.has_more():
+        return None
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 עוד תוצאות", callback_data=MORE_CALLBACK_PREFIX + pages.token)
+    ]])
+
+
+async def link_products(products, generate_promotion_links, client, app_secret, limit=None):
+    """
+    Returns the first `limit` of `products` (all when None) that have an affiliate
+    link, in order; plain links are replaced in place.
+
+    Products from the product-query API already carry affiliate links. Products
+    the API could not link are dropped, so later products take their places.
+    """
+    limit = len(products) if limit is None else limit
+    pending = [p for p in products if not p.get('affiliate')]
+    linked = set()
+    if pending:
+        linked = {id(p) for p in await generate_promotion_links(pending, client, app_secret, limit=limit)}
+    return [p for p in products if p.get('affiliate') or id(p) in linked][:limit]
+
+
+async def render_products_collage(products, fetch_and_create_collage, collage_cache=None):
+    """
+    Returns the encoded collage of `products`, from `collage_cache` when it has it.
+    """
+    if not products:
+        return None
+    key = collage_cache.key(products) if collage_cache is not None else None
+    if key is not None:
+        cached = collage_cache.get(key)
+        if cached is not None:
+            return cached["collage"]
+    output = await fetch_and_create_collage(products)
+    # A collage with missing tiles is sent once but not kept
+    if key is not None and not getattr(output, "missing", 0):
+        collage_cache.put(key, output.getvalue())
+    return output.getvalue()
+
+
+async def finish_page(page, products, collage, titles, fetch_and_create_collage, collage_cache=None):
+    """
+    Matches the collage and titles prepared for `page` to the `products` that got links.
+
+    The collage and titles are prepared concurrently with the links, for the
+    products expected on the page. When some were dropped for lack of an
+    affiliate link, the kept products keep their improved titles, the ones that
+    took their places use their own, and the collage is rendered again.
+
+    Returns:
+        tuple: (collage bytes or None, titles)
+    """
+    if [id(p) for p in products] == [id(p) for p in page]:
+        return collage, titles or [p['title'] for p in products]
+    improved = {id(p): title for p, title in zip(page, titles or [])}
+    titles = [improved.get(id(p), p['title']) for p in products]
+    try:
+        collage = await render_products_collage(products, fetch_and_create_collage, collage_cache)
+    except Exception as e:
+        print(f"⚠️ Collage failed for the linked products: {e}")
+        collage = None
+    return collage, titles
+
+
+def _link_page(products, linked):
+    if products and not linked:
+        raise LinksUnavailable(f"None of {len(products)} products could be linked")
+    return linked
+
+
+# (single flight, key) -> SearchProgress of the pipeline run in flight for that key
+_progress = {}
+
+
+def _join_progress(single_flight, key):
+    """
+    Returns the progress of the shared run this chat is about to join, or a new one.
+    """
+    if single_flight is None:
+        progress = SearchProgress()
+    else:
+        progress = _progress.get((id(single_flight), key))
+        if progress is None or progress.finished:
+            progress = SearchProgress()
+            _progress[(id(single_flight), key)] = progress
+    progress.waiters += 1
+    return progress
+
+
+def _leave_progress(single_flight, key, progress):
+    progress.waiters -= 1
+    if single_flight is not None and progress.waiters == 0 and _progress.get((id(single_flight), key)) is progress:
+        del _progress[(id(single_flight), key)]
+
+
+async def run_search_pipeline(query, model, get_aliexpress_product_data, generate_promotion_links,
+                              fetch_and_create_collage, improve_titles_with_gemini,
+                              translate_and_optimize_query, client, app_secret, collage_cache=None,
+                              progress=None):
+    """
+    Runs the chat-independent part of a search and returns everything a reply needs.
+
+    The search runs as a stage graph: translate → scrape → candidates, after which
+    affiliate links (unless the search backend already returned them), the collage
+    and the improved titles are produced concurrently. Only products with an
+    affiliate link are shown: unlinked ones are replaced by the next candidates
+    (see `finish_page`), and a search where nothing could be linked raises
+    LinksUnavailable. Collage and titles degrade gracefully (no photo, original
+    titles) if their stage fails.
+
+    Args:
+        query (str): The Hebrew query, without the trigger phrase
+        progress (SearchProgress, optional): Receives the linked candidates as
+            soon as the links stage is done. Defaults to None.
+        (remaining arguments as in `handle_hebrew_search`)
+
+    Returns:
+        dict: "products" (list), "titles" (list), "collage" (bytes or None),
+            "collage_key" (CollageCache key or None), "more" (the remaining
+            candidates, for later pages) and "timing" (critical path summary)
+    """
+    async def translate():
+        # Translate and optimize the query before searching
+        optimized_query = await translate_and_optimize_query(query, model)
+        print(optimized_query)
+        return optimized_query
+
+    async def links(candidates):
+        linked = []
+        try:
+            linked = await link_products(candidates, generate_promotion_links, client, app_secret,
+                                         limit=RESULTS_PER_SEARCH)
+            return _link_page(candidates, linked)
+        finally:
+            if progress is not None:
+                progress.publish_preview(linked)
+
+    # Collage and titles start right away, for the candidates expected to be linked
+    def collage(candidates):
+        return render_products_collage(candidates[:RESULTS_PER_SEARCH], fetch_and_create_collage, collage_cache)
+
+    async def titles(candidates):
+        if not candidates:
+            return []
+        return await improve_titles_with_gemini([p['title'] for p in candidates[:RESULTS_PER_SEARCH]], model)
+
+    def page(candidates, products, collage, titles):
+        return finish_page(candidates[:RESULTS_PER_SEARCH], products, collage, titles, fetch_and_create_collage,
+                           collage_cache)
+
+    graph = StageGraph()
+    graph.add("translate", translate)
+    graph.add("scrape", get_aliexpress_product_data, deps=["translate"])
+    graph.add("candidates", lambda products: select_candidates(products, limit=None), deps=["scrape"])
+    graph.add("links", links, deps=["candidates"])
+    graph.add("collage", collage, deps=["candidates"], fallback=None)
+    graph.add("titles", titles, deps=["candidates"], fallback=[])
+    graph.add("page", page, deps=["candidates", "links", "collage", "titles"])
+
+    try:
+        results = await graph.run()
+    finally:
+        if progress is not None:
+            progress.finished = True
+        print(f"⏱️ {graph.report()}")
+        _, total = graph.critical_path()
+        record_stage_timings(graph.timings)
+        SEARCH_SECONDS.observe(total)
+        SLOW_SEARCHES.maybe_sample(query, total, graph.timings)
+
+    # The candidates themselves are returned: links() rewrote their URLs in place
+    candidates = results["candidates"]
+    products = results["links"]
+    collage, titles = results["page"]
+    shown = {id(p) for p in products}
+    last = max((i for i, p in enumerate(candidates) if id(p) in shown), default=-1)
+    return {
+        "products": products,
+        "titles": titles,
+        "collage": collage,
+        "collage_key": collage_cache.key(products) if collage_cache is not None and products else None,
+        "more": candidates[last + 1:],
+        "timing": graph.report(),
+    }
+
+
+async def prepare_page(products, generate_promotion_links, fetch_and_create_collage, client, app_secret,
+                       collage_cache=None, model=None, improve_titles_with_gemini=None):
+    """
+    Produces the affiliate links, the collage and, given `improve_titles_with_gemini`,
+    the improved titles of one page of further results, concurrently. Products
+    that could not be linked are left off the page.
+
+    Returns:
+        dict: "products", "collage", "collage_key" and "titles" (empty when not
+            produced) as in `run_search_pipeline`
+    """
+    async def links():
+        return _link_page(products, await link_products(products, generate_promotion_links, client, app_secret))
+
+    graph = StageGraph()
+    graph.add("links", links)
+    graph.add("collage", lambda: render_products_collage(products, fetch_and_create_collage, collage_cache),
+              fallback=None)
+    if improve_titles_with_gemini is not None:
+        graph.add("titles", lambda: improve_titles_with_gemini([p['title'] for p in products], model),
+                  fallback=[])
+    results = await graph.run()
+    linked = results["links"]
+    titles = results.get("titles") or []
+    collage, linked_titles = await finish_page(products, linked, results["collage"], titles,
+                                               fetch_and_create_collage, collage_cache)
+    return {
+        "products": linked,
+        "titles": linked_titles if titles else [],
+        "collage": collage,
+        "collage_key": collage_cache.key(linked) if collage_cache is not None else None,
+    }
+
+
+def prefetch_next_page(candidate_store, pages, model, generate_promotion_links, fetch_and_create_collage,
+                       improve_titles_with_gemini, client, app_secret, collage_cache=None):
+    """
+    Starts preparing the next page of `pages` in the background, if there is one.
+
+    Titles are only prefetched when the store's `prefetch_titles` is set, since
+    each prefetch costs a Gemini call even if the page is never asked for.
+    """
+    if pages is None or not pages.has_more() or pages.prefetched is not None:
+        return
+    if not candidate_store.prefetch_titles:
+        improve_titles_with_gemini = None
+    pages.prefetched = asyncio.create_task(prepare_page(
+        pages.peek(), generate_promotion_links, fetch_and_create_collage, client, app_secret, collage_cache,
+        model, improve_titles_with_gemini
+    ))
+
+
+async def handle_more_results(update: "Update", context, candidate_store, model, generate_promotion_links,
+                              fetch_and_create_collage, improve_titles_with_gemini, client, app_secret,
+                              collage_cache=None):
+    """
+    Sends the next page of the chat's latest search from `candidate_store`.
+
+    Handles both the inline "more results" button (a callback query whose data
+    names the search) and the text trigger (the chat's latest search). The page
+    after it is prefetched once this one is sent.
+
+    Args:
+        candidate_store (CandidateStore): The chats' remaining results
+        (remaining arguments as in `handle_hebrew_search`)
+
+    Returns:
+        None
+    """
+    chat_id = update.effective_chat.id
+    current_chat_id.set(chat_id)
+    token = None
+    if update.callback_query is not None:
+        token = update.callback_query.data[len(MORE_CALLBACK_PREFIX):]
+        # Stops the button's spinner; the page itself is sent as a new message
+        await update.callback_query.answer()
+
+    pages = candidate_store.get(chat_id, token)
+    if pages is None:
+        await context.bot.send_message(
+            chat_id=chat_id, text="⌛ התוצאות של החיפוש הקודם כבר לא זמינות... תחפש/י שוב עם 'תחפש לי'."
+        )
+        return
+    if not pages.has_more():
+        await context.bot.send_message(chat_id=chat_id, text="זהו, אין עוד תוצאות לחיפוש הזה 🙂")
+        return
+
+    products, prefetched = pages.take()
+    candidate_store.record_page(prefetched)
+    try:
+        if prefetched is None:
+            result = await prepare_page(products, generate_promotion_links, fetch_and_create_collage, client,
+                                        app_secret, collage_cache, model, improve_titles_with_gemini)
+        else:
+            result = await prefetched
+        products = result["products"]
+        if not result["titles"]:
+            try:
+                result["titles"] = await improve_titles_with_gemini([p['title'] for p in products], model)
+            except Exception as e:
+                print(f"⚠️ Title improvement failed for more results: {e}")
+        result["titles"] = result["titles"] or [p['title'] for p in products]
+        await send_results(update, result, collage_cache, reply_markup=more_results_markup(pages))
+    except Exception as e:
+        print(f"⚠️ More results failed for {pages.query!r}: {e!r}")
+        await context.bot.send_message(chat_id=chat_id, text="מצטער, משהו השתבש... תנסה/י שוב בעוד רגע.")
+        return
+    prefetch_next_page(candidate_store, pages, model, generate_promotion_links, fetch_and_create_collage,
+                       improve_titles_with_gemini, client, app_secret, collage_cache)
+
+
+async def handle_hebrew_search(update: "Update", context, model, get_aliexpress_product_data,
+                              generate_promotion_links, fetch_and_create_collage,
+                              improve_titles_with_gemini, translate_and_optimize_query,
+                              client, app_secret, hebrew_triggers, single_flight=None, timeout=None,
+                              collage_cache=None, progressive=False, edit_throttle=None,
+                              candidate_store=None, more_triggers=()):
     """
     Handles Hebrew search requests for AliExpress products via Telegram.
-    
+
+    Identical queries that arrive while a search is already running share that
+    search's result (see `single_flight`); every chat still gets its own reply.
+
+    In progressive mode the loading message is edited into the product list with
+    plain titles as soon as the links are ready; the final reply with the collage
+    and improved titles then replaces it.
+
+    With a `candidate_store`, the results beyond the first page are kept for the
+    chat and offered through a "more results" button or `more_triggers`; the
+    second page is prefetched right after the reply is sent.
+
     Args:
         update (Update): The Telegram update object
         context: The Telegram context object
@@ -15,16 +407,34 @@ async def handle_hebrew_search(update: Update, context, model, get_aliexpress_pr
         get_aliexpress_product_data: Function to get product data
         generate_promotion_links: Function to generate promotion links
         fetch_and_create_collage: Function to create image collage
-        improve_title_with_gemini: Function to improve product titles
+        improve_titles_with_gemini: Function to improve a batch of product titles
         translate_and_optimize_query: Function to translate and optimize queries
-        client: The IopClient instance
+        client: The AsyncIopClient instance
         app_secret: The AliExpress app secret
         hebrew_triggers: List of Hebrew trigger phrases
-        
+        single_flight (SingleFlight, optional): Coalesces in-flight searches by
+            normalized query. Defaults to None.
+        timeout (float, optional): Seconds this chat waits for results. Defaults to None.
+        collage_cache (CollageCache, optional): Rendered collages and their Telegram
+            file_ids, reused for repeat result sets. Defaults to None.
+        progressive (bool, optional): Show the linked products before the final
+            reply. Defaults to False.
+        edit_throttle (ChatThrottle, optional): Spaces out progressive edits per chat.
+            Defaults to None.
+        candidate_store (CandidateStore, optional): Keeps each chat's further
+            results for "more". Defaults to None.
+        more_triggers (list, optional): Messages asking for the next page. Defaults to ().
+
     Returns:
         None
     """
     user_text = update.message.text.strip()
+    if candidate_store is not None and user_text in more_triggers:
+        await handle_more_results(
+            update, context, candidate_store, model, generate_promotion_links, fetch_and_create_collage,
+            improve_titles_with_gemini, client, app_secret, collage_cache
+        )
+        return
     if not any(user_text.startswith(trigger) for trigger in hebrew_triggers):
         await update.message.reply_text(
             "חברים על מנת לחפש תרשמו:\nתחפש לי / תמצא לי + תיאור המוצר"
@@ -41,46 +451,150 @@ async def handle_hebrew_search(update: Update, context, model, get_aliexpress_pr
         await update.message.reply_text("❗ תכתוב מה לחפש אחרי 'תחפש לי', 'תמצא לי' או 'תשלוף לי'.")
         return
 
+    received = time.perf_counter()
+    # Upstream schedulers queue this search's calls fairly against other chats
+    current_chat_id.set(update.effective_chat.id)
+
     loading_message = await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text="🧙‍♂️הקוסם בודק מחירים, עובר על ביקורות ומכין לכם את הקסם🪄 — שנייה וזה אצלכם!!"
     )
 
-    # Translate and optimize the query before searching
-    optimized_query = await translate_and_optimize_query(query, model)
-    print(optimized_query)
-    products = await get_aliexpress_product_data(optimized_query)
-    products = [
-        p for p in products
-        if "BundleDeals" not in p["link"]
-           and "bundle" not in p["link"].lower()
-           and "productIds=" not in p["link"]
-    ]
-    products = generate_promotion_links(products, client, app_secret)
-    products = products[:4]
+    flight_key = normalize_query(query)
+    progress = _join_progress(single_flight, flight_key) if progressive else None
+
+    def search():
+        return run_search_pipeline(
+            query, model, get_aliexpress_product_data, generate_promotion_links,
+            fetch_and_create_collage, improve_titles_with_gemini,
+            translate_and_optimize_query, client, app_secret, collage_cache, progress
+        )
+
+    async def show_preview():
+        # Shielded: cancelling this chat's preview must not cancel the shared future
+        products = await asyncio.shield(progress.preview)
+        if not products:
+            return False
+        if edit_throttle is not None:
+            await edit_throttle.wait(update.effective_chat.id)
+        await loading_message.edit_text(format_preview(products), parse_mode="HTML", disable_web_page_preview=True)
+        SEARCH_FIRST_CONTENT_SECONDS.observe(time.perf_counter() - received, content="preview")
+        return True
 
+    preview_task = asyncio.create_task(show_preview()) if progress is not None else None
+    SEARCHES_IN_FLIGHT.inc()
+    outcome = "error"
+    try:
+        if single_flight is not None:
+            result = await single_flight.do(flight_key, search, timeout=timeout)
+        elif timeout is not None:
+            result = await asyncio.wait_for(search(), timeout)
+        else:
+            result = await search()
+        preview_shown = await _finish_preview(preview_task)
+        preview_task = None
+        pages = None
+        if candidate_store is not None and result["products"]:
+            pages = candidate_store.put(update.effective_chat.id, query, result["more"])
+        await send_results(update, result, collage_cache, reply_markup=more_results_markup(pages))
+        outcome = "ok" if result["products"] else "no_results"
+        if not preview_shown:
+            SEARCH_FIRST_CONTENT_SECONDS.observe(time.perf_counter() - received, content="final")
+        SEARCH_REPLY_SECONDS.observe(time.perf_counter() - received)
+        prefetch_next_page(candidate_store, pages, model, generate_promotion_links, fetch_and_create_collage,
+                           improve_titles_with_gemini, client, app_secret, collage_cache)
+    except SchedulerBusy as e:
+        outcome = "busy"
+        print(f"⚠️ Search rejected for {query!r}: {e}")
+        await update.message.reply_text("😅 יש כרגע עומס על הקוסם... תנסה/י שוב בעוד כמה שניות.")
+    except LinksUnavailable as e:
+        outcome = "no_links"
+        print(f"⚠️ Search without affiliate links for {query!r}: {e}")
+        await update.message.reply_text("😅 לא הצלחתי להכין קישורים כרגע... תנסה/י שוב בעוד דקה.")
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        print(f"⚠️ Search timed out for {query!r}")
+        await update.message.reply_text("⌛ החיפוש לוקח יותר מדי זמן... תנסה/י שוב בעוד רגע.")
+    except Exception as e:
+        print(f"⚠️ Search failed for {query!r}: {e!r}")
+        await update.message.reply_text("מצטער, משהו השתבש בחיפוש... תנסה/י שוב בעוד רגע.")
+    finally:
+        SEARCHES_IN_FLIGHT.dec()
+        SEARCHES_TOTAL.inc(outcome=outcome)
+        if progress is not None:
+            await _finish_preview(preview_task)
+            _leave_progress(single_flight, flight_key, progress)
+        await loading_message.delete()
+
+
+async def _finish_preview(preview_task):
+    """
+    Stops a preview that hasn't been shown yet and returns whether it was shown.
+    """
+    if preview_task is None:
+        return False
+    if not preview_task.done():
+        preview_task.cancel()
+    await asyncio.wait([preview_task])
+    if preview_task.cancelled():
+        return False
+    if preview_task.exception() is not None:
+        print(f"⚠️ Progressive preview failed: {preview_task.exception()}")
+        return False
+    return preview_task.result()
+
+
+async def send_results(update: "Update", result, collage_cache=None, reply_markup=None):
+    """
+    Replies to the user's message with the results of `run_search_pipeline`.
+
+    With a `collage_cache`, a collage Telegram already stores is sent by its
+    file_id; otherwise it is uploaded and the file_id of the upload is kept.
+    For a "more results" button press, the reply goes to the message with the button.
+    """
+    message = update.effective_message
+    products = result["products"]
     if not products:
-        await update.message.reply_text("מצטער לא נמצאו תוצאות... תנסה/י שוב הפעם בניסוח שונה.")
+        await message.reply_text("מצטער לא נמצאו תוצאות... תנסה/י שוב הפעם בניסוח שונה.")
         return
 
-    collage_image = await fetch_and_create_collage(products)
-    product_texts = []
-
-    for i, product in enumerate(products, start=1):
-        improved_title = await improve_title_with_gemini(product['title'], model)
-        product_entry = (
-            f"{i}. 🛍️ {improved_title}\n"
-            f"💸 {product['price']} ש\"ח\n"
-            f"🔗 {product['link']}"
-        )
-        product_texts.append(product_entry)
+    final_message = format_results(products, result["titles"])
+    if result["collage"] is not None:
+        key = result.get("collage_key") if collage_cache is not None else None
+        file_id = collage_cache.file_id(key) if key is not None else None
+        if file_id is not None:
+            from telegram.error import BadRequest
 
-    final_message = "\n\n".join(product_texts) + "\n\nהקוסם AI"
+            try:
+                await message.reply_photo(
+                    photo=file_id,
+                    caption=final_message,
+                    parse_mode="HTML",
+                    reply_to_message_id=message.message_id,
+                    reply_markup=reply_markup
+                )
+                return
+            except BadRequest as e:
+                # Telegram no longer knows this file; upload the kept bytes again
+                print(f"⚠️ Cached collage rejected, re-uploading: {e}")
+                collage_cache.invalidate_file_id(key)
 
-    await update.message.reply_photo(
-        photo=collage_image,
-        caption=final_message,
-        parse_mode="HTML",
-        reply_to_message_id=update.message.message_id
-    )
-    await loading_message.delete()
\ No newline at end of file
+        sent = await message.reply_photo(
+            photo=BytesIO(result["collage"]),
+            caption=final_message,
+            parse_mode="HTML",
+            reply_to_message_id=message.message_id,
+            reply_markup=reply_markup
+        )
+        if key is not None and getattr(sent, "photo", None):
+            collage_cache.set_file_id(key, sent.photo[-1].file_id)
+    else:
+        await message.reply_text(
+            final_message,
+            parse_mode="HTML",
+            reply_to_message_id=message.message_id,
+            reply_markup=reply_markup
+        )
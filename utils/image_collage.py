@@ -1,78 +1,185 @@
+import asyncio
+import functools
 import os
 import re
+import time
 import aiohttp
-from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 
-async def fetch_and_create_collage(products, size=(500, 500)):
+from .metrics import UPSTREAM_SECONDS
+
+# Pooled session shared by every collage, created on first use
+_session = None
+
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+
+def _get_session():
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=64, limit_per_host=16, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+
+async def close_image_session():
     """
-    Fetches product images and creates a collage with numbered indicators.
-    
+    Closes the shared image download session (call on application shutdown).
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _clean_image_url(image_url):
+    # Clean up the image URL to end at the first valid image extension
+    match = re.search(r"(https?://[^\s]+?\.(jpg|jpeg|png|webp|gif))", image_url, re.IGNORECASE)
+    if match:
+        return match.group(1)
+    return image_url
+
+
+async def fetch_image_bytes(image_url, timeout=10, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Downloads a single image over the shared session.
+
+    The body is streamed and the download is abandoned as soon as it exceeds
+    `max_bytes`, so an oversized image never has to fit in memory.
+
     Args:
-        products (list): List of product dictionaries containing image URLs
-        size (tuple, optional): Size of each image in the collage. Defaults to (500, 500).
-        
+        image_url (str): The image URL
+        timeout (float, optional): Total seconds allowed for the download. Defaults to 10.
+        max_bytes (int, optional): Maximum accepted image size. Defaults to 5 MB.
+
     Returns:
-        BytesIO: A BytesIO object containing the JPEG image data
+        bytes: The image data, or None if the download failed or was rejected
     """
-    processed_images = []
-    for idx, product in enumerate(products, start=1):
-        image_url = product["image"]
-
-        # Clean up the image URL to end at the first valid image extension
-        match = re.search(r"(https?://[^\s]+?\.(jpg|jpeg|png|webp|gif))", image_url, re.IGNORECASE)
-        if match:
-            image_url = match.group(1)
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as resp:
-                if resp.status != 200 or "image" not in resp.headers.get("Content-Type", ""):
-                    continue
-                img_bytes = await resp.read()
-        try:
-            image = Image.open(BytesIO(img_bytes)).convert("RGB")
-        except Exception as e:
-            print(f"Failed to open image: {e} (URL: {image_url})")
-            continue
-        image = image.resize(size)
+    image_url = _clean_image_url(image_url)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with _get_session().get(image_url, timeout=client_timeout) as resp:
+            if resp.status != 200 or "image" not in resp.headers.get("Content-Type", ""):
+                return None
+            if resp.content_length is not None and resp.content_length > max_bytes:
+                print(f"Image too large: {resp.content_length} bytes (URL: {image_url})")
+                return None
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                data.extend(chunk)
+                if len(data) > max_bytes:
+                    print(f"Image too large: over {max_bytes} bytes (URL: {image_url})")
+                    return None
+            outcome = "ok"
+            return bytes(data)
+    except Exception as e:
+        print(f"Failed to download image: {e} (URL: {image_url})")
+        return None
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream="image_cdn", outcome=outcome)
+
+
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'DejaVuSans.ttf')
+
+
+@functools.lru_cache(maxsize=4)
+def _get_font(font_size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(FONT_PATH, font_size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=32)
+def _get_badge(idx, font_size=45):
+    """
+    Renders the green numbered badge once and keeps it as an RGBA overlay.
+    """
+    from PIL import Image, ImageDraw
+
+    font = _get_font(font_size)
+    text = str(idx)
+    bbox = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
 
-        draw = ImageDraw.Draw(image)
-        font_size = 45
-        font_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts', 'DejaVuSans.ttf')
+    padding = 10
+    box_width = text_width + padding
+    box_height = text_height + padding
 
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-        except IOError:
-            font = ImageFont.load_default()
+    badge = Image.new("RGBA", (box_width + 1, box_height + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(badge)
+    draw.rounded_rectangle([0, 0, box_width, box_height], radius=15, fill=(0, 200, 0))
 
-        text = str(idx)
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
+    text_x = (box_width - text_width) // 2
+    text_y = (box_height - text_height) // 2 - 10
+    draw.text((text_x, text_y), text, font=font, fill="white")
+    return badge
 
-        padding = 10
-        box_width = text_width + padding
-        box_height = text_height + padding
-        box_x = (image.width - box_width) // 2
-        box_y = size[1] // 10 - 20
 
-        draw.rounded_rectangle(
-            [box_x, box_y, box_x + box_width, box_y + box_height],
-            radius=15,
-            fill=(0, 200, 0)
-        )
+def _decode_tile(img_bytes, size):
+    """
+    Decodes an image straight to roughly the tile size.
+
+    JPEGs use draft mode, which lets libjpeg scale by 1/2, 1/4 or 1/8 while
+    decoding; other formats are shrunk with `reduce` before the final resample.
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(img_bytes))
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+    image = image.convert("RGB")
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image.resize(size, Image.Resampling.BICUBIC)
 
-        text_x = box_x + (box_width - text_width) // 2
-        text_y = box_y + (box_height - text_height) // 2 - 10
 
-        draw.text((text_x, text_y), text, font=font, fill="white")
-        processed_images.append(image)
+def _render_tile(img_bytes, idx, size):
+    try:
+        image = _decode_tile(img_bytes, size)
+    except Exception as e:
+        print(f"Failed to open image: {e}")
+        return None
+
+    badge = _get_badge(idx)
+    box_x = (image.width - badge.width + 1) // 2
+    box_y = size[1] // 10 - 20
+    image.paste(badge, (box_x, box_y), badge)
+    return image
+
+
+def render_collage(images, size=(500, 500), output_format="JPEG", quality=75, progressive=True):
+    """
+    Composes downloaded images into a 2x2 numbered collage and encodes it.
+
+    Args:
+        images (list): Raw image bytes per slot, None for a missing image
+        size (tuple, optional): Size of each image in the collage. Defaults to (500, 500).
+        output_format (str, optional): "JPEG" or "WEBP". Defaults to "JPEG".
+        quality (int, optional): Encoder quality. Defaults to 75.
+        progressive (bool, optional): Progressive JPEG encoding. Defaults to True.
+
+    Returns:
+        bytes: The encoded collage
+    """
+    from PIL import Image
 
     collage_width = size[0] * 2
     collage_height = size[1] * 2
     collage = Image.new("RGB", (collage_width, collage_height))
 
-    for i, img in enumerate(processed_images):
+    for i, img_bytes in enumerate(images):
+        if img_bytes is None:
+            continue
+        img = _render_tile(img_bytes, i + 1, size)
+        if img is None:
+            continue
         row = i // 2
         col = i % 2
         x = col * size[0]
@@ -80,6 +187,46 @@ async def fetch_and_create_collage(products, size=(500, 500)):
         collage.paste(img, (x, y))
 
     output = BytesIO()
-    collage.save(output, format="JPEG")
-    output.seek(0)
-    return output
\ No newline at end of file
+    if output_format.upper() == "WEBP":
+        collage.save(output, format="WEBP", quality=quality, method=4)
+    else:
+        collage.save(output, format="JPEG", quality=quality, progressive=progressive)
+    return output.getvalue()
+
+
+async def fetch_and_create_collage(products, size=(500, 500), timeout=10, max_bytes=MAX_IMAGE_BYTES,
+                                   output_format="JPEG", quality=75, progressive=True, executor=None):
+    """
+    Fetches product images and creates a collage with numbered indicators.
+
+    All images are downloaded concurrently over one pooled session. Each product
+    keeps its own slot in the grid regardless of the order downloads finish in.
+
+    Args:
+        products (list): List of product dictionaries containing image URLs
+        size (tuple, optional): Size of each image in the collage. Defaults to (500, 500).
+        timeout (float, optional): Per-image download timeout in seconds. Defaults to 10.
+        max_bytes (int, optional): Maximum accepted size of a single image. Defaults to 5 MB.
+        output_format (str, optional): "JPEG" or "WEBP". Defaults to "JPEG".
+        quality (int, optional): Encoder quality. Defaults to 75.
+        progressive (bool, optional): Progressive JPEG encoding. Defaults to True.
+        executor (CpuExecutor, optional): Renders the collage off the event loop. Defaults to None.
+
+    Returns:
+        BytesIO: A BytesIO object containing the encoded image data. Its `missing`
+            attribute counts the images that could not be fetched.
+    """
+    downloads = await asyncio.gather(*[
+        fetch_image_bytes(product["image"], timeout=timeout, max_bytes=max_bytes)
+        for product in products
+    ])
+
+    if executor is None:
+        collage = render_collage(downloads, size, output_format=output_format, quality=quality,
+                                 progressive=progressive)
+    else:
+        collage = await executor.run(render_collage, downloads, size, output_format=output_format,
+                                     quality=quality, progressive=progressive)
+    output = BytesIO(collage)
+    output.missing = downloads.count(None)
+    return output
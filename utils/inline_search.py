@@ -0,0 +1,232 @@
+import asyncio
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from .hebrew_search_handler import link_products, select_candidates
+from .promotion_links import cached_promotion_link
+from .query_optimizer import normalize_query
+from .scheduler import current_chat_id
+
+if TYPE_CHECKING:
+    from telegram import Update
+
+
+def format_inline_result(product):
+    return (
+        f"🛍️ {product['title']}\n"
+        f"💸 {product['price']} ש\"ח\n"
+        f"🔗 {product['link']}"
+    )
+
+
+class InlineSearch:
+    """
+    Answers inline queries (@bot <query> in any chat) from cached results only.
+
+    Telegram gives inline answers a tight time budget, far below a full search,
+    so a query is answered at once when its translation, search results and
+    affiliate links are all cached. Otherwise the query is a miss: after
+    `debounce` seconds without a newer keystroke from the same user, a warm-up
+    runs the cacheable part of the search (translate, search, links) in the
+    background, and the query is answered from the caches if the warm-up
+    finishes within `answer_budget`. A later keystroke then hits the cache.
+    Nothing waits inside the handler itself, so update workers are never held.
+
+    Answers with results are cached by Telegram for `cache_time` seconds and
+    shared between users; empty answers are not cached.
+
+    Args:
+        model: The Gemini model instance
+        translate_and_optimize_query: Function to translate and optimize queries
+            (with `query_cache` bound as its cache)
+        get_aliexpress_product_data: Function to get product data (through the search cache)
+        generate_promotion_links: Function to generate promotion links (with `link_cache` bound)
+        client: The AsyncIopClient instance
+        app_secret (str): The AliExpress app secret
+        query_cache (TieredCache): Optimized queries by normalized Hebrew query
+        peek_products (callable): Returns the cached products for an optimized query, or None
+        link_cache (TieredCache): Promotion links by item id and tracking id
+        tracking_id (str, optional): Affiliate tracking id of `link_cache`. Defaults to 'default'.
+        phrase_table (PhraseTable, optional): Local translations, tried before `query_cache`.
+            Defaults to None.
+        debounce (float, optional): Seconds a miss waits for a newer keystroke. Defaults to 0.4.
+        answer_budget (float, optional): Seconds a miss waits for its warm-up. Defaults to 2.5.
+        cache_time (int, optional): Seconds Telegram may cache an answer with results. Defaults to 300.
+        max_results (int, optional): Results per answer. Defaults to 10.
+        max_warmups (int, optional): Concurrent warm-ups; further misses aren't warmed. Defaults to 4.
+        min_query_length (int, optional): Shorter queries are answered empty. Defaults to 2.
+        max_users (int, optional): Users with a pending miss tracked at once. Defaults to 10000.
+    """
+
+    def __init__(self, model, translate_and_optimize_query, get_aliexpress_product_data, generate_promotion_links,
+                 client, app_secret, query_cache, peek_products, link_cache, tracking_id='default',
+                 phrase_table=None, debounce=0.4, answer_budget=2.5, cache_time=300, max_results=10, max_warmups=4,
+                 min_query_length=2, max_users=10000):
+        self.model = model
+        self.translate_and_optimize_query = translate_and_optimize_query
+        self.get_aliexpress_product_data = get_aliexpress_product_data
+        self.generate_promotion_links = generate_promotion_links
+        self.client = client
+        self.app_secret = app_secret
+        self.query_cache = query_cache
+        self.peek_products = peek_products
+        self.link_cache = link_cache
+        self.tracking_id = tracking_id
+        self.phrase_table = phrase_table
+        self.debounce = debounce
+        self.answer_budget = answer_budget
+        self.cache_time = cache_time
+        self.max_results = max_results
+        self.max_warmups = max_warmups
+        self.min_query_length = min_query_length
+        self.max_users = max_users
+        self._pending = OrderedDict()
+        self._warming = {}
+        self.hits = 0
+        self.misses = 0
+        self.debounced = 0
+        self.warmups = 0
+        self.warmups_skipped = 0
+        self.warm_answers = 0
+
+    def lookup(self, query):
+        """
+        Returns the products to answer `query` with, from the caches only, or None.
+
+        Only products whose affiliate link is known are included.
+        """
+        key = normalize_query(query)
+        optimized = self.phrase_table.lookup(query, key) if self.phrase_table is not None else None
+        if not optimized and key:
+            optimized = self.query_cache.get(key)
+        if not optimized:
+            return None
+        products = self.peek_products(optimized)
+        if not products:
+            return None
+        results = []
+        for product in select_candidates(products, limit=None):
+            if product.get('affiliate'):
+                link = product['link']
+            else:
+                link = cached_promotion_link(product['link'], self.link_cache, self.tracking_id)
+            if link:
+                results.append(dict(product, link=link))
+                if len(results) == self.max_results:
+                    break
+        return results or None
+
+    async def handle(self, update: "Update", context):
+        """
+        InlineQueryHandler callback.
+        """
+        inline_query = update.inline_query
+        user_id = inline_query.from_user.id
+        query = inline_query.query.strip()
+
+        # A newer keystroke supersedes the user's pending miss
+        pending = self._pending.pop(user_id, None)
+        if pending is not None and not pending.done():
+            pending.cancel()
+            self.debounced += 1
+
+        if len(normalize_query(query)) < self.min_query_length:
+            await inline_query.answer([], cache_time=0)
+            return
+
+        products = self.lookup(query)
+        if products:
+            self.hits += 1
+            await self._answer(inline_query, products)
+            return
+
+        self.misses += 1
+        # Warm-up calls are queued fairly against chats' searches under this user's id
+        current_chat_id.set(user_id)
+        self._pending[user_id] = asyncio.create_task(self._answer_miss(user_id, inline_query, query))
+        while len(self._pending) > self.max_users:
+            _, oldest = self._pending.popitem(last=False)
+            oldest.cancel()
+
+    async def _answer_miss(self, user_id, inline_query, query):
+        try:
+            await asyncio.sleep(self.debounce)
+            warm_up = self._start_warm_up(query)
+            if warm_up is not None:
+                # Waiting doesn't cancel the warm-up if this query is superseded meanwhile
+                await asyncio.wait([warm_up], timeout=self.answer_budget)
+            products = self.lookup(query)
+            if products:
+                self.warm_answers += 1
+            await self._answer(inline_query, products or [])
+        except Exception as e:
+            # Typically the query expired on Telegram's side before the answer
+            print(f"⚠️ Inline answer failed for {query!r}: {e}")
+        finally:
+            if self._pending.get(user_id) is asyncio.current_task():
+                del self._pending[user_id]
+
+    def _start_warm_up(self, query):
+        """
+        Returns the warm-up task for `query`, starting one unless too many are running.
+        """
+        key = normalize_query(query)
+        task = self._warming.get(key)
+        if task is not None:
+            return task
+        if len(self._warming) >= self.max_warmups:
+            self.warmups_skipped += 1
+            return None
+        self.warmups += 1
+        task = asyncio.create_task(self.warm_up(query))
+        self._warming[key] = task
+        task.add_done_callback(lambda t: self._warm_up_done(key, t))
+        return task
+
+    def _warm_up_done(self, key, task):
+        self._warming.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Inline warm-up failed for {key!r}: {task.exception()!r}")
+
+    async def warm_up(self, query):
+        """
+        Runs the cacheable part of a search for `query`: translation, search and
+        the affiliate links of the first `max_results` candidates.
+        """
+        optimized = await self.translate_and_optimize_query(query, self.model)
+        products = await self.get_aliexpress_product_data(optimized)
+        await link_products(select_candidates(products, limit=self.max_results), self.generate_promotion_links,
+                            self.client, self.app_secret)
+
+    async def _answer(self, inline_query, products):
+        from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+        results = [
+            InlineQueryResultArticle(
+                id=str(idx),
+                title=product['title'],
+                description=f"💸 {product['price']} ש\"ח",
+                thumbnail_url=product['image'],
+                url=product['link'],
+                input_message_content=InputTextMessageContent(format_inline_result(product))
+            )
+            for idx, product in enumerate(products)
+        ]
+        # Only answers with results are worth caching on Telegram's side
+        await inline_query.answer(results, cache_time=self.cache_time if results else 0, is_personal=False)
+
+    def close(self):
+        for task in list(self._pending.values()) + list(self._warming.values()):
+            task.cancel()
+        self._pending.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "debounced": self.debounced,
+            "warmups": self.warmups,
+            "warmups_skipped": self.warmups_skipped,
+            "warm_answers": self.warm_answers,
+            "warming": len(self._warming),
+        }
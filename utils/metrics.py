@@ -0,0 +1,296 @@
+import bisect
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = key + (("le", _format_value(float(bound))),)
+            lines.append(f"{self.name}_bucket{_format_labels(labels)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the bot's metrics and renders them in the Prometheus text format.
+
+    Besides metrics updated in place, collectors can be registered: callables
+    returning (name, kind, documentation, labels dict, value) tuples that are
+    evaluated at scrape time, e.g. to expose cache or scheduler counters.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, documentation, labelnames, **kwargs)
+            self._metrics[name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        collected = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+                continue
+            for name, kind, documentation, labels, value in samples:
+                entry = collected.setdefault(name, (kind, documentation, []))
+                entry[2].append((tuple(sorted(labels.items())), value))
+        for name, (kind, documentation, samples) in collected.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SEARCH_STAGE_SECONDS = REGISTRY.histogram(
+    "bot_search_stage_seconds", "Duration of each handle_hebrew_search stage.", ["stage"]
+)
+SEARCH_SECONDS = REGISTRY.histogram(
+    "bot_search_seconds", "End-to-end duration of a search pipeline run."
+)
+SEARCHES_TOTAL = REGISTRY.counter(
+    "bot_searches_total", "Searches handled, by outcome.", ["outcome"]
+)
+SEARCHES_IN_FLIGHT = REGISTRY.gauge(
+    "bot_searches_in_flight", "Searches currently being handled."
+)
+SEARCH_FIRST_CONTENT_SECONDS = REGISTRY.histogram(
+    "bot_search_first_content_seconds",
+    "Time from a search request to the first useful content shown, by what it was.", ["content"]
+)
+SEARCH_REPLY_SECONDS = REGISTRY.histogram(
+    "bot_search_reply_seconds", "Time from a search request until the final reply was sent."
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "bot_upstream_call_seconds", "Duration of calls to upstream services.", ["upstream", "outcome"]
+)
+UPSTREAM_QUEUE_SECONDS = REGISTRY.histogram(
+    "bot_upstream_queue_wait_seconds", "Time calls waited for admission to an upstream.", ["upstream"]
+)
+
+
+def record_stage_timings(timings):
+    """
+    Observes the (start, end) timings of a StageGraph run.
+    """
+    for stage, (start, end) in timings.items():
+        SEARCH_STAGE_SECONDS.observe(end - start, stage=stage)
+
+
+def cache_collector(caches):
+    """
+    Returns a collector exposing the stats() counters of named caches.
+
+    Args:
+        caches (dict): Cache name to TieredCache / StaleWhileRevalidateCache / CollageCache / CandidateStore
+    """
+    def collect():
+        for cache_name, cache in caches.items():
+            stats = cache.stats()
+            for stat in ("hits", "stale_hits", "memory_hits", "disk_hits", "file_id_hits", "prefetch_hits", "misses",
+                         "evictions", "invalidations"):
+                if stat in stats:
+                    yield ("bot_cache_events_total", "counter", "Cache lookups and evictions, by result.",
+                           {"cache": cache_name, "event": stat}, stats[stat])
+            yield ("bot_cache_entries", "gauge", "Entries currently held in memory.",
+                   {"cache": cache_name}, stats["size"])
+    return collect
+
+
+def scheduler_collector(schedulers):
+    """
+    Returns a collector exposing the live queue counters of UpstreamSchedulers.
+    """
+    def collect():
+        for scheduler in schedulers:
+            stats = scheduler.stats()
+            labels = {"upstream": scheduler.name}
+            yield ("bot_upstream_queued", "gauge", "Calls waiting for admission.", labels, stats["queued"])
+            yield ("bot_upstream_in_flight", "gauge", "Calls currently running.", labels, stats["in_flight"])
+            yield ("bot_upstream_rejected_total", "counter", "Calls rejected because the queue was full.",
+                   labels, stats["rejected"])
+    return collect
+
+
+class SlowRequestSampler:
+    """
+    Opt-in sampling of slow searches with their per-stage breakdown.
+
+    Disabled until `configure` sets a threshold. A sampled search is printed and
+    kept in a bounded list served at /slow next to /metrics.
+    """
+
+    def __init__(self, max_samples=50):
+        self.threshold = None
+        self.sample_rate = 1.0
+        self.samples = deque(maxlen=max_samples)
+
+    def configure(self, threshold, sample_rate=1.0):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+
+    def maybe_sample(self, query, total, timings):
+        if self.threshold is None or total < self.threshold or random.random() >= self.sample_rate:
+            return
+        stages = {stage: round(end - start, 3) for stage, (start, end) in timings.items()}
+        sample = {"time": time.time(), "query": query, "total": round(total, 3), "stages": stages}
+        self.samples.append(sample)
+        print(f"🐢 Slow search {query!r} took {total:.2f}s: {stages}")
+
+
+SLOW_SEARCHES = SlowRequestSampler()
+
+
+async def start_metrics_server(host="127.0.0.1", port=9100, registry=REGISTRY, sampler=SLOW_SEARCHES):
+    """
+    Serves /metrics (Prometheus text format) and /slow (sampled slow searches as JSON).
+
+    Returns:
+        web.AppRunner: The runner; call `cleanup()` on it to stop the server
+    """
+    async def metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def slow(request):
+        return web.Response(text=json.dumps(list(sampler.samples), ensure_ascii=False),
+                            content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/slow", slow)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,151 @@
+import itertools
+import time
+from collections import OrderedDict
+
+MORE_CALLBACK_PREFIX = "more:"
+
+_tokens = itertools.count(1)
+
+
+class ResultPages:
+    """
+    The results of one search that haven't been shown yet, served a page at a time.
+
+    Attributes:
+        token (str): Identifies the search in the "more" button's callback data
+        query (str): The Hebrew query the results belong to
+        prefetched (asyncio.Task): Prepares the next page in the background, if started
+    """
+
+    def __init__(self, token, query, products, page_size, expires_at):
+        self.token = token
+        self.query = query
+        self.products = products
+        self.page_size = page_size
+        self.expires_at = expires_at
+        self.offset = 0
+        self.prefetched = None
+
+    def has_more(self):
+        return self.offset < len(self.products)
+
+    def peek(self):
+        """
+        Returns the next page without taking it.
+        """
+        return self.products[self.offset:self.offset + self.page_size]
+
+    def take(self):
+        """
+        Takes the next page and returns (products, prefetch task or None).
+        """
+        page = self.peek()
+        self.offset += len(page)
+        prefetched, self.prefetched = self.prefetched, None
+        if prefetched is not None and prefetched.cancelled():
+            prefetched = None
+        return page, prefetched
+
+    def cancel_prefetch(self):
+        if self.prefetched is not None:
+            self.prefetched.cancel()
+            self.prefetched = None
+
+
+class CandidateStore:
+    """
+    Per-chat store of the results a search found beyond its first page, so a
+    "more" request is answered without searching again.
+
+    A chat keeps only its latest search. Entries expire `ttl` seconds after the
+    search and the least recently used chats are dropped beyond `max_chats`;
+    dropping an entry cancels its prefetch.
+
+    After each page is sent, the next page's links and collage are prepared in
+    the background; with `prefetch_titles` its improved titles are too, which
+    makes the page instant but spends a Gemini call on pages nobody asks for.
+
+    Args:
+        ttl (float, optional): Seconds a search's results stay available. Defaults to 900.
+        max_chats (int, optional): Chats kept. Defaults to 1000.
+        max_results (int, optional): Extra results kept per search. Defaults to 20.
+        page_size (int, optional): Results per page. Defaults to 4.
+        prefetch_titles (bool, optional): Also prefetch improved titles. Defaults to False.
+    """
+
+    def __init__(self, ttl=900, max_chats=1000, max_results=20, page_size=4, prefetch_titles=False):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.max_results = max_results
+        self.page_size = page_size
+        self.prefetch_titles = prefetch_titles
+        self._chats = OrderedDict()
+        self.hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, chat_id, query, products):
+        """
+        Keeps `products` as the chat's next pages and returns their ResultPages,
+        or None if there is nothing to keep.
+        """
+        self.discard(chat_id)
+        if not products:
+            return None
+        # Copies: the link stage rewrites product links in place, and the
+        # scraped list may be shared with other chats through the search cache
+        pages = ResultPages(
+            str(next(_tokens)), query, [dict(p) for p in products[:self.max_results]],
+            self.page_size, time.monotonic() + self.ttl
+        )
+        self._chats[chat_id] = pages
+        while len(self._chats) > self.max_chats:
+            _, evicted = self._chats.popitem(last=False)
+            evicted.cancel_prefetch()
+            self.evictions += 1
+        return pages
+
+    def get(self, chat_id, token=None):
+        """
+        Returns the chat's ResultPages, or None if they expired or, given a
+        `token`, belong to a different search.
+        """
+        pages = self._chats.get(chat_id)
+        if pages is not None and pages.expires_at <= time.monotonic():
+            self.discard(chat_id)
+            pages = None
+        if pages is None or (token is not None and pages.token != token):
+            self.misses += 1
+            return None
+        self._chats.move_to_end(chat_id)
+        self.hits += 1
+        return pages
+
+    def record_page(self, prefetched):
+        """
+        Counts a served page that had been prefetched and was already prepared.
+        """
+        if prefetched is not None and prefetched.done():
+            self.prefetch_hits += 1
+
+    def discard(self, chat_id):
+        pages = self._chats.pop(chat_id, None)
+        if pages is not None:
+            pages.cancel_prefetch()
+
+    def close(self):
+        for pages in self._chats.values():
+            pages.cancel_prefetch()
+        self._chats.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "prefetch_hits": self.prefetch_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._chats),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
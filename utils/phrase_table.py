@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+
+from .query_optimizer import normalize_query
+
+
+class PhraseTable:
+    """
+    Local Hebrew → English translations of common short queries.
+
+    The table maps normalized Hebrew queries (see `normalize_query`) to the
+    optimized English query Gemini gave for them. It is built offline from the
+    query log by `python -m tools.build_phrase_table`, which keeps only phrases
+    Gemini answered the same way often enough, and is loaded into a dict at
+    startup. A lookup is a dict access, so matching queries skip Gemini
+    entirely; novel queries and queries longer than `max_words` go on to Gemini.
+
+    Entries are not trusted forever: every `revalidate_every`-th hit of a phrase
+    is passed on to Gemini instead, so the query log keeps fresh answers a
+    rebuild can correct or drop the entry with, and a table older than `max_age`
+    seconds is not used at all until it is rebuilt.
+
+    Args:
+        phrases (dict, optional): Normalized Hebrew query to English query. Defaults to empty.
+        max_words (int, optional): Longer queries are never answered from the table. Defaults to 3.
+        built (float, optional): Unix time the table was built. Defaults to None (unknown).
+        max_age (float, optional): Seconds after `built` the table stays in use. Defaults to None (no limit).
+        revalidate_every (int, optional): Every Nth hit of a phrase goes to Gemini; 0 never. Defaults to 0.
+    """
+
+    def __init__(self, phrases=None, max_words=3, built=None, max_age=None, revalidate_every=0):
+        self.phrases = dict(phrases or {})
+        self.max_words = max_words
+        self.built = built
+        self.max_age = max_age
+        self.revalidate_every = revalidate_every
+        self._phrase_hits = {}
+        self._expired = False
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.revalidations = 0
+
+    @classmethod
+    def load(cls, path, max_words=3, max_age=None, revalidate_every=0):
+        """
+        Loads a table written by tools.build_phrase_table; a missing file gives an empty table.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(max_words=max_words)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Failed to load phrase table from {path}: {e}")
+            return cls(max_words=max_words)
+        return cls(data.get("phrases", {}), max_words=max_words, built=data.get("built"), max_age=max_age,
+                   revalidate_every=revalidate_every)
+
+    def expired(self):
+        """
+        Whether the table is older than `max_age` (a table without a build time never expires).
+        """
+        if self.max_age is None or self.built is None:
+            return False
+        if not self._expired and time.time() - self.built > self.max_age:
+            self._expired = True
+            print(f"⚠️ Phrase table is older than {self.max_age}s and is no longer used; rebuild it")
+        return self._expired
+
+    def lookup(self, query, key=None):
+        """
+        Returns the English query for `query`, or None if the table doesn't know it
+        or the hit is passed on to Gemini for revalidation.
+
+        Args:
+            query (str): The Hebrew query
+            key (str, optional): `normalize_query(query)`, if already computed
+        """
+        key = normalize_query(query) if key is None else key
+        if not key or key.count(" ") >= self.max_words or self.expired():
+            self.skipped += 1
+            return None
+        result = self.phrases.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        if self.revalidate_every:
+            count = self._phrase_hits.get(key, 0) + 1
+            self._phrase_hits[key] = count
+            if count % self.revalidate_every == 0:
+                self.revalidations += 1
+                return None
+        self.hits += 1
+        return result
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "phrases": len(self.phrases),
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "revalidations": self.revalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryLog:
+    """
+    Appends (normalized Hebrew query, optimized English query, source) records
+    to a JSONL file, the input of tools.build_phrase_table. The source is
+    "gemini", "cache" or "table", so the log shows both how often a query is
+    asked and how consistently it was translated. Only the query text is
+    logged, nothing about the user.
+
+    `record` only queues the line; a writer thread appends queued lines every
+    `flush_interval` seconds, so the event loop never waits on the disk. Once
+    the file reaches `max_bytes` it is renamed to `<path>.1` (replacing the
+    previous one) and a new file is started. Lines beyond `max_pending` queued
+    ones are dropped.
+
+    Args:
+        path (str): The JSONL file to append to
+        max_bytes (int, optional): Size at which the file is rotated. Defaults to 50 MB.
+        flush_interval (float, optional): Seconds between writes. Defaults to 1.0.
+        max_pending (int, optional): Lines queued at most. Defaults to 10000.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, flush_interval=1.0, max_pending=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._file = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._closing = threading.Event()
+        self.dropped = 0
+        self.rotations = 0
+        self._writer = threading.Thread(target=self._write_loop, name="query-log-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, query, optimized, source):
+        line = json.dumps({"query": query, "optimized": optimized, "source": source, "ts": int(time.time())},
+                          ensure_ascii=False)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(line + "\n")
+
+    def flush(self):
+        """
+        Appends the queued lines. Called by the writer thread and by `close`.
+        """
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._file.close()
+                self._file = None
+                os.replace(self.path, self.path + ".1")
+                self.rotations += 1
+        except OSError as e:
+            print(f"⚠️ Failed to log query pairs: {e}")
+
+    def close(self):
+        """
+        Stops the writer thread after it writes the queued lines.
+        """
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        self._writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_loop(self):
+        while not self._closing.is_set():
+            self._closing.wait(self.flush_interval)
+            self.flush()
@@ -0,0 +1,136 @@
+from .promotion_links import _source_key
+
+PRODUCT_QUERY_METHOD = 'aliexpress.affiliate.product.query'
+
+PRODUCT_QUERY_FIELDS = ','.join([
+    'product_id', 'product_title', 'product_main_image_url', 'product_detail_url',
+    'promotion_link', 'target_sale_price', 'target_sale_price_currency',
+])
+
+
+class ProductQueryError(Exception):
+    """
+    Raised when aliexpress.affiliate.product.query answers with an error.
+    """
+
+
+def _build_query_request(search_text, app_secret, tracking_id, page_no, page_size, target_currency,
+                         target_language, ship_to_country, sort):
+    from iop import IopRequest
+
+    request = IopRequest(PRODUCT_QUERY_METHOD)
+    request.add_api_param('app_signature', app_secret)
+    request.add_api_param('keywords', search_text)
+    request.add_api_param('fields', PRODUCT_QUERY_FIELDS)
+    request.add_api_param('page_no', str(page_no))
+    request.add_api_param('page_size', str(page_size))
+    request.add_api_param('target_currency', target_currency)
+    request.add_api_param('target_language', target_language)
+    request.add_api_param('ship_to_country', ship_to_country)
+    request.add_api_param('tracking_id', tracking_id)
+    if sort:
+        request.add_api_param('sort', sort)
+    return request
+
+
+def parse_product_query(body):
+    """
+    Maps an aliexpress.affiliate.product.query response body to product dicts.
+
+    The dicts have the same link, title, image and price keys as the scraper's,
+    with `link` already being the affiliate promotion link. `affiliate` is set
+    so the link-generation stage can skip them.
+
+    Raises:
+        ProductQueryError: If the gateway or the API reported an error
+    """
+    if body.get('code') not in (None, '0'):
+        raise ProductQueryError(f"{body.get('code')}: {body.get('message')}")
+    resp_result = body.get('aliexpress_affiliate_product_query_response', {}).get('resp_result', {})
+    if resp_result.get('resp_code') not in (None, 200):
+        raise ProductQueryError(f"{resp_result.get('resp_code')}: {resp_result.get('resp_msg')}")
+
+    products = []
+    for item in (resp_result.get('result') or {}).get('products', {}).get('product', []) or []:
+        link = item.get('promotion_link')
+        title = item.get('product_title')
+        image = item.get('product_main_image_url')
+        price = item.get('target_sale_price')
+        if not (link and title and image and price):
+            continue
+        item_id = str(item.get('product_id') or _source_key(item.get('product_detail_url')))
+        products.append({
+            'link': link,
+            'title': title,
+            'image': image,
+            'price': str(price),
+            'item_id': item_id,
+            'affiliate': True,
+        })
+    return products
+
+
+class ProductQuerySearch:
+    """
+    Product search through the official aliexpress.affiliate.product.query API.
+
+    One signed call returns titles, prices, images and promotion links, so no
+    scraping or link.generate round is needed. When the API fails or finds
+    nothing, `fallback` (e.g. the scraper's search) is used instead.
+
+    Args:
+        client: The AsyncIopClient (or a wrapper with the same `execute`) to call the API with
+        app_secret (str): The AliExpress app secret
+        tracking_id (str, optional): Affiliate tracking id. Defaults to 'default'.
+        page_size (int, optional): Products per query. Defaults to 20.
+        target_currency (str, optional): Currency of the prices. Defaults to 'ILS'.
+        target_language (str, optional): Language of the titles. Defaults to 'HE'.
+        ship_to_country (str, optional): Country the products must ship to. Defaults to 'IL'.
+        sort (str, optional): API sort order, e.g. 'LAST_VOLUME_DESC'. Defaults to None (relevance).
+        fallback (callable, optional): Async search function used when the API fails. Defaults to None.
+    """
+
+    def __init__(self, client, app_secret, tracking_id='default', page_size=20, target_currency='ILS',
+                 target_language='HE', ship_to_country='IL', sort=None, fallback=None):
+        self.client = client
+        self.app_secret = app_secret
+        self.tracking_id = tracking_id
+        self.page_size = page_size
+        self.target_currency = target_currency
+        self.target_language = target_language
+        self.ship_to_country = ship_to_country
+        self.sort = sort
+        self.fallback = fallback
+        self.api_searches = 0
+        self.fallbacks = 0
+
+    async def query(self, search_text, page_no=1):
+        """
+        Returns the product dicts of one result page.
+
+        Raises:
+            ProductQueryError: If the API reported an error
+        """
+        request = _build_query_request(
+            search_text, self.app_secret, self.tracking_id, page_no, self.page_size,
+            self.target_currency, self.target_language, self.ship_to_country, self.sort
+        )
+        response = await self.client.execute(request)
+        return parse_product_query(response.body or {})
+
+    async def search(self, search_text):
+        """
+        Searches through the API, falling back to `fallback` on errors or no results.
+        """
+        try:
+            products = await self.query(search_text)
+            self.api_searches += 1
+            if products or self.fallback is None:
+                return products
+            print(f"⚠️ Product query found nothing for {search_text!r}, falling back")
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"⚠️ Product query failed for {search_text!r}, falling back: {e!r}")
+        self.fallbacks += 1
+        return await self.fallback(search_text)
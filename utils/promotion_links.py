@@ -1,45 +1,193 @@
-def generate_promotion_links(product_list, client, app_secret, limit=4):
+import asyncio
+import re
+
+from iop.resilience import CircuitOpenError
+
+from .scheduler import SchedulerBusy
+
+REQUIRED_FIELDS = ['link', 'title', 'image', 'price']
+
+
+class LinksUnavailable(Exception):
+    """
+    Raised when none of a search's products could be given an affiliate link.
+    """
+
+
+def _source_key(url):
+    """
+    Returns a stable key for matching a source URL with the API's echo of it.
+
+    The gateway may return `source_value` with a different scheme or without the
+    query string, so products are matched by their AliExpress item id when possible.
+    """
+    match = re.search(r"/item/(\d+)\.html", url or "")
+    if match:
+        return match.group(1)
+    return (url or "").strip()
+
+
+def _build_link_request(source_values, app_secret, tracking_id):
+    from iop import IopRequest
+
+    request = IopRequest('aliexpress.affiliate.link.generate')
+    request.add_api_param('app_signature', app_secret)
+    request.add_api_param('promotion_link_type', '0')
+    request.add_api_param('source_values', ','.join(source_values))
+    request.add_api_param('tracking_id', tracking_id)
+    return request
+
+
+async def _request_links(source_values, client, app_secret, tracking_id):
+    """
+    Requests promotion links for several source URLs in a single API call.
+
+    Returns:
+        dict: Mapping of source key (see `_source_key`) to promotion link
+    """
+    request = _build_link_request(source_values, app_secret, tracking_id)
+    try:
+        response = await client.execute(request)
+        promotion_links = (
+            response.body.get('aliexpress_affiliate_link_generate_response', {})
+            .get('resp_result', {})
+            .get('result', {})
+            .get('promotion_links', {})
+            .get('promotion_link', [])
+        )
+    except (CircuitOpenError, SchedulerBusy):
+        raise
+    except Exception as e:
+        print(f"⚠️ Error generating promotion links: {e}")
+        return {}
+
+    links = {}
+    for entry in promotion_links or []:
+        if entry.get('promotion_link') and entry.get('source_value'):
+            links[_source_key(entry['source_value'])] = entry['promotion_link']
+
+    # A single-item request needs no matching, even if source_value was not echoed
+    if len(source_values) == 1 and not links and promotion_links:
+        if promotion_links[0].get('promotion_link'):
+            links[_source_key(source_values[0])] = promotion_links[0]['promotion_link']
+    return links
+
+
+def _cache_key(source_key, tracking_id):
+    return f"{tracking_id}:{source_key}"
+
+
+def cached_promotion_link(link, cache, tracking_id='default'):
+    """
+    Returns the cached promotion link for a product URL, or None, without calling the API.
+    """
+    return cache.get(_cache_key(_source_key(link), tracking_id))
+
+
+async def generate_promotion_links(product_list, client, app_secret, limit=4, tracking_id='default', batch_size=10,
+                                   cache=None, plain_links=False):
     """
     Generates affiliate promotion links for AliExpress products.
-    
+
+    Candidate URLs are sent in batches of comma-separated `source_values`, and only
+    the items missing from a batch response are retried one by one.
+
     Args:
         product_list (list): List of product dictionaries
-        client: The IopClient instance to use for API calls
+        client: The AsyncIopClient instance to use for API calls
         app_secret (str): The AliExpress app secret
         limit (int, optional): Maximum number of products to process. Defaults to 4.
-        
+        tracking_id (str, optional): Affiliate tracking id. Defaults to 'default'.
+        batch_size (int, optional): Number of URLs per API call. Defaults to 10.
+        cache (TieredCache, optional): Cache of promotion links keyed by item id and tracking id.
+            Cached items are not sent to the API. Defaults to None.
+        plain_links (bool, optional): While the client's circuit breaker is open,
+            return products without a promotion link too, with their plain
+            (non-affiliate) links. Defaults to False.
+
     Returns:
-        list: List of products with promotion links
+        list: The first `limit` products that got a promotion link; products
+            the API could not link are left out. While the client's circuit
+            breaker is open, only products with a cached link are returned,
+            unless `plain_links` is set.
     """
-    from iop import IopRequest
-    
+    # ודא שכל השדות קיימים
+    candidates = [p for p in product_list if all(k in p and p[k] for k in REQUIRED_FIELDS)]
+
     enriched = []
-    for product in product_list:
-        source_url = product['link']
-        request = IopRequest('aliexpress.affiliate.link.generate')
-        request.add_api_param('app_signature', app_secret)
-        request.add_api_param('promotion_link_type', '0')
-        request.add_api_param('source_values', source_url)
-        request.add_api_param('tracking_id', 'default')
-        response = client.execute(request)
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
 
+        links = {}
+        fetched = {}
+        uncached = []
+        found = len(enriched)
+        for product in batch:
+            if found == limit:
+                break
+            key = _source_key(product['link'])
+            cached = cache.get(_cache_key(key, tracking_id)) if cache is not None else None
+            if cached:
+                links[key] = cached
+                found += 1
+            else:
+                uncached.append(product['link'])
         try:
-            promotion_links = (
-                response.body.get('aliexpress_affiliate_link_generate_response', {})
-                .get('resp_result', {})
-                .get('result', {})
-                .get('promotion_links', {})
-                .get('promotion_link', [])
-            )
-            if promotion_links and promotion_links[0].get('promotion_link'):
-                product['link'] = promotion_links[0].get('promotion_link')
-                # ודא שכל השדות קיימים
-                if all(k in product and product[k] for k in ['link', 'title', 'image', 'price']):
-                    enriched.append(product)
+            if uncached:
+                fetched = await _request_links(uncached, client, app_secret, tracking_id)
+                links.update(fetched)
+
+            # Retry only the failures that rank ahead of the point where the limit is reached
+            failed = []
+            found = len(enriched)
+            for product in batch:
+                if found == limit:
+                    break
+                if _source_key(product['link']) in links:
+                    found += 1
+                else:
+                    failed.append(product)
+            if failed:
+                retries = await asyncio.gather(*[
+                    _request_links([p['link']], client, app_secret, tracking_id) for p in failed
+                ], return_exceptions=True)
+                for retry in retries:
+                    if isinstance(retry, BaseException):
+                        raise retry
+                    fetched.update(retry)
+                    links.update(retry)
+        except CircuitOpenError:
+            if plain_links:
+                print("⚠️ Promotion links unavailable (circuit open), using plain links")
+            else:
+                print("⚠️ Promotion links unavailable (circuit open), using cached links only")
+            for product in candidates[start:]:
+                key = _source_key(product['link'])
+                promotion_link = links.get(key)
+                if not promotion_link and cache is not None:
+                    promotion_link = cache.get(_cache_key(key, tracking_id))
+                if promotion_link:
+                    product['link'] = promotion_link
+                elif not plain_links:
+                    continue
+                enriched.append(product)
+                if len(enriched) == limit:
+                    break
+            return enriched
+
+        if cache is not None and uncached:
+            for key, promotion_link in fetched.items():
+                if key.isdigit():
+                    cache.set(_cache_key(key, tracking_id), promotion_link)
+
+        for product in batch:
+            promotion_link = links.get(_source_key(product['link']))
+            if not promotion_link:
+                continue
+            product['link'] = promotion_link
+            enriched.append(product)
             # עצור כשיש מספיק מוצרים
             if len(enriched) == limit:
-                break
-        except Exception:
-            continue
+                return enriched
 
-    return enriched
\ No newline at end of file
+    return enriched
@@ -1,17 +1,65 @@
 import re
 
+from .scheduler import SchedulerBusy
 
-async def translate_and_optimize_query(query: str, model) -> str:
+# Words left over from triggers such as "תחפש לי" that do not describe the product
+TRIGGER_REMNANTS = {"תחפש", "תמצא", "תשלוף", "לי", "בבקשה", "אפשר"}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a Hebrew query so that trivially different phrasings share a cache key.
+
+    Lowercases, replaces punctuation with spaces, collapses whitespace and drops
+    leading trigger remnants ("תחפש לי", "לי", ...).
+
+    Args:
+        query (str): The query as typed by the user
+
+    Returns:
+        str: The normalized query
+    """
+    text = re.sub(r"[^\w\s]", " ", (query or "").lower())
+    words = text.split()
+    while words and words[0] in TRIGGER_REMNANTS:
+        words.pop(0)
+    return " ".join(words)
+
+
+async def translate_and_optimize_query(query: str, model, cache=None, phrase_table=None, query_log=None) -> str:
     """
     Translates and optimizes a Hebrew product query for AliExpress search.
-    
+
+    Short common queries are answered from `phrase_table` without calling
+    Gemini; the others are looked up in `cache` and then sent to Gemini.
+
     Args:
         query (str): The original query in Hebrew
         model: The Gemini model instance to use for translation
-        
+        cache (TieredCache, optional): Cache of optimized queries keyed by the
+            normalized query. Defaults to None.
+        phrase_table (PhraseTable, optional): Local translations of common
+            queries, tried first. Defaults to None.
+        query_log (QueryLog, optional): Receives every translated pair and where
+            it came from, to rebuild the phrase table from. Defaults to None.
+
     Returns:
         str: The optimized English query
     """
+    key = normalize_query(query)
+    if phrase_table is not None:
+        local = phrase_table.lookup(query, key)
+        if local:
+            if query_log is not None:
+                query_log.record(key, local, "table")
+            return local
+    if cache is not None and key:
+        cached = cache.get(key)
+        if cached:
+            if query_log is not None:
+                query_log.record(key, cached, "cache")
+            return cached
+
     prompt = (
         "You are an expert AliExpress search optimizer. "
         "Given a product description in Hebrew, translate it to English and expand it with relevant keywords and details so that AliExpress will understand exactly what the user is looking for. "
@@ -20,7 +68,7 @@ async def translate_and_optimize_query(query: str, model) -> str:
         f"{query}"
     )
     try:
-        response = model.generate_content(prompt)
+        response = await model.generate_content_async(prompt)
         result = response.text.strip()
         # Remove anything in square brackets
         result = re.sub(r"\[.*?\]", "", result)
@@ -28,7 +76,16 @@ async def translate_and_optimize_query(query: str, model) -> str:
         result = re.sub(r"-\s*AliExpress.*$", "", result, flags=re.IGNORECASE)
         # Remove extra spaces
         result = result.strip()
-        return result
+    except SchedulerBusy:
+        # Backpressure, not a Gemini error: the handler answers with its "busy" reply
+        raise
     except Exception as e:
         print(f"⚠️ Error with Gemini: {e}")
-        return query
\ No newline at end of file
+        return query
+
+    # Only real translations are cached; the fallback above is not
+    if cache is not None and key and result:
+        cache.set(key, result)
+    if query_log is not None and key and result:
+        query_log.record(key, result, "gemini")
+    return result
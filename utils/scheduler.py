@@ -0,0 +1,221 @@
+import asyncio
+import contextvars
+import functools
+import time
+from collections import OrderedDict, deque
+
+from .metrics import UPSTREAM_QUEUE_SECONDS, UPSTREAM_SECONDS
+
+# Chat the current search belongs to; set by the handler, read by the schedulers
+current_chat_id = contextvars.ContextVar("current_chat_id", default=None)
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised when an upstream's queue is full and the call was rejected.
+    """
+
+    def __init__(self, upstream):
+        super().__init__(f"{upstream} is busy")
+        self.upstream = upstream
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatThrottle:
+    """
+    Spaces out actions in the same chat, e.g. message edits, by `min_interval`
+    seconds to stay within Telegram's per-chat limits (about one per second).
+
+    Each `wait` reserves the chat's next free slot, so concurrent callers for one
+    chat are spread out instead of firing together.
+    """
+
+    def __init__(self, min_interval=1.0, max_chats=10000):
+        self.min_interval = min_interval
+        self.max_chats = max_chats
+        self._next = OrderedDict()
+        self.delayed = 0
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        ready = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = ready + self.min_interval
+        self._next.move_to_end(chat_id)
+        while len(self._next) > self.max_chats:
+            self._next.popitem(last=False)
+        if ready > now:
+            self.delayed += 1
+            await asyncio.sleep(ready - now)
+
+
+class UpstreamScheduler:
+    """
+    Admission control for calls to one upstream (Gemini, the search scrape, IOP).
+
+    At most `max_concurrency` calls run at once and calls start no faster than
+    the token bucket allows. Waiting calls are queued per chat and served
+    round-robin across chats, so one chat's burst can't starve the others. When
+    `max_queue` calls are already waiting, new calls fail fast with SchedulerBusy.
+
+    Args:
+        name (str): Upstream name, used in errors and stats
+        rate (float): Calls per second allowed by the token bucket
+        burst (float, optional): Token bucket capacity. Defaults to `rate`.
+        max_concurrency (int, optional): Concurrent calls. Defaults to 4.
+        max_queue (int, optional): Maximum waiting calls. Defaults to 50.
+    """
+
+    def __init__(self, name, rate, burst=None, max_concurrency=4, max_queue=50):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._bucket = TokenBucket(rate, burst)
+        self._waiting = OrderedDict()
+        self._queued = 0
+        self._active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Awaits `fn(*args, **kwargs)` once admitted.
+
+        Raises:
+            SchedulerBusy: If the queue is full
+        """
+        enqueued = time.monotonic()
+        await self._acquire(current_chat_id.get())
+        try:
+            await self._bucket.acquire()
+            self._record_wait(time.monotonic() - enqueued)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=self.name, outcome=outcome)
+        finally:
+            self.completed += 1
+            self._release()
+
+    def wrap(self, fn):
+        """
+        Returns an async function that runs `fn` through this scheduler.
+        """
+        @functools.wraps(fn)
+        async def scheduled(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+        return scheduled
+
+    def stats(self):
+        return {
+            "queued": self._queued,
+            "in_flight": self._active,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_count": self.wait_count,
+            "wait_seconds_total": self.wait_total,
+            "wait_seconds_max": self.wait_max,
+            "wait_seconds_avg": self.wait_total / self.wait_count if self.wait_count else 0.0,
+        }
+
+    async def _acquire(self, chat_id):
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            return
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusy(self.name)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(chat_id, deque()).append(future)
+        self._queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation; give it back
+                self._release()
+            else:
+                self._discard(chat_id, future)
+            raise
+
+    def _discard(self, chat_id, future):
+        waiters = self._waiting.get(chat_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[chat_id]
+
+    def _release(self):
+        self._active -= 1
+        while self._waiting and self._active < self.max_concurrency:
+            chat_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                # Round-robin: this chat goes to the back of the line
+                self._waiting.move_to_end(chat_id)
+            else:
+                del self._waiting[chat_id]
+            if future.cancelled():
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def _record_wait(self, seconds):
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        UPSTREAM_QUEUE_SECONDS.observe(seconds, upstream=self.name)
+
+
+class ScheduledProxy:
+    """
+    Wraps an object so that the named coroutine methods go through a scheduler.
+
+    Example:
+        model = ScheduledProxy(model, gemini_scheduler, ["generate_content_async"])
+        client = ScheduledProxy(client, iop_scheduler, ["execute"])
+    """
+
+    def __init__(self, target, scheduler, methods):
+        self._target = target
+        self._scheduler = scheduler
+        self._methods = set(methods)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in self._methods:
+            return self._scheduler.wrap(attr)
+        return attr
@@ -0,0 +1,126 @@
+import json
+import os
+from http.cookies import SimpleCookie
+
+import aiohttp
+from yarl import URL
+
+from .search_parser import extract_products, parse_search_page
+
+SEARCH_URL = "https://he.aliexpress.com/wholesale"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Referer": "https://www.google.com/",
+    "DNT": "1",
+    "Upgrade-Insecure-Requests": "1",
+}
+
+
+def load_cookies_from_browser_export(path: str) -> SimpleCookie:
+    """
+    Loads a browser cookie export (a JSON list of cookie objects) into morsels.
+
+    Domain and path are kept so the cookies are only sent where the browser would send them.
+
+    Args:
+        path (str): Path of the JSON export
+
+    Returns:
+        SimpleCookie: The exported cookies
+    """
+    with open(path, "r") as f:
+        raw_cookies = json.load(f)
+
+    cookies = SimpleCookie()
+    for cookie in raw_cookies:
+        name = cookie["name"]
+        cookies[name] = cookie["value"]
+        if cookie.get("domain"):
+            cookies[name]["domain"] = cookie["domain"]
+        cookies[name]["path"] = cookie.get("path") or "/"
+    return cookies
+
+
+class AliExpressScraper:
+    """
+    Long-lived scraping session for the AliExpress wholesale search page.
+
+    One pooled keep-alive aiohttp session owns the cookie jar. The jar is seeded
+    from the browser export once and only re-read when the file's mtime changes;
+    cookies the site rotates through Set-Cookie are picked up by the jar as
+    responses arrive.
+
+    Args:
+        cookies_path (str, optional): Browser cookie export. Defaults to "cookies.json".
+        search_url (str, optional): Wholesale search endpoint. Defaults to SEARCH_URL.
+        timeout (float, optional): Total seconds allowed per search. Defaults to 20.
+        limit (int, optional): Max pooled connections. Defaults to 20.
+        keepalive_timeout (float, optional): Seconds idle connections are kept. Defaults to 60.
+        executor (CpuExecutor, optional): Parses pages off the event loop. Defaults to None.
+    """
+
+    def __init__(self, cookies_path="cookies.json", search_url=SEARCH_URL, timeout=20, limit=20,
+                 keepalive_timeout=60, executor=None):
+        self.cookies_path = cookies_path
+        self.executor = executor
+        self.search_url = search_url
+        self.timeout = timeout
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._cookies_mtime = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.CookieJar(),
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._cookies_mtime = None
+        return self._session
+
+    def _reload_cookies_if_changed(self, session):
+        try:
+            mtime = os.stat(self.cookies_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._cookies_mtime:
+            return
+        try:
+            cookies = load_cookies_from_browser_export(self.cookies_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Failed to load cookies from {self.cookies_path}: {e}")
+            return
+        session.cookie_jar.update_cookies(cookies, response_url=URL(self.search_url))
+        self._cookies_mtime = mtime
+
+    async def fetch_search_page(self, search_text: str) -> bytes:
+        """
+        Downloads the raw wholesale search page for `search_text`.
+        """
+        session = self._get_session()
+        self._reload_cookies_if_changed(session)
+        async with session.get(self.search_url, params={"SearchText": search_text}) as response:
+            return await response.read()
+
+    async def search(self, search_text: str) -> list:
+        """
+        Searches AliExpress and returns product dicts with link, title, image and price.
+        """
+        html = await self.fetch_search_page(search_text)
+        if self.executor is None:
+            return parse_search_page(html)
+        # Only the page bytes go to the worker and only compact records come back
+        records = await self.executor.run(extract_products, html)
+        return [record.to_product() for record in records]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
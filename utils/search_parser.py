@@ -0,0 +1,145 @@
+import json
+import re
+import urllib.parse
+from typing import NamedTuple
+
+# Start of the search result payload embedded in the wholesale page
+_ITEM_LIST = re.compile(rb'"itemList"\s*:\s*\{')
+_CONTENT = re.compile(rb'"content"\s*:\s*\[')
+# How far after "itemList" the "content" array may start
+_CONTENT_WINDOW = 4096
+
+_decoder = json.JSONDecoder()
+
+
+class ProductRecord(NamedTuple):
+    item_id: str
+    title: str
+    image: str
+    price: str
+
+    def to_product(self) -> dict:
+        """
+        Returns the product dict used throughout the bot.
+        """
+        return {
+            "link": f"https://www.aliexpress.com/item/{self.item_id}.html",
+            "title": self.title,
+            "image": self.image,
+            "price": self.price,
+        }
+
+
+def _find(obj, key, depth=6):
+    """
+    Depth-first lookup of `key` in nested dicts/lists, limited to `depth` levels.
+    """
+    if depth < 0:
+        return None
+    if isinstance(obj, dict):
+        if key in obj:
+            return obj[key]
+        children = obj.values()
+    elif isinstance(obj, list):
+        children = obj
+    else:
+        return None
+    for child in children:
+        if isinstance(child, (dict, list)):
+            found = _find(child, key, depth - 1)
+            if found is not None:
+                return found
+    return None
+
+
+def _item_id(item):
+    item_id = item.get("productId") or item.get("itemId")
+    if item_id:
+        return str(item_id)
+    # Older payloads only carry the id inside the URL-encoded tracking params
+    pdp_cdi = _find(item.get("trace") or {}, "pdp_cdi")
+    if isinstance(pdp_cdi, str):
+        match = re.search(r'"itemId":"(\d+)"', urllib.parse.unquote(pdp_cdi))
+        if match:
+            return match.group(1)
+    return None
+
+
+def _to_record(item):
+    if not isinstance(item, dict):
+        return None
+    item_id = _item_id(item)
+    image = _find(item.get("image") or {}, "imgUrl")
+    title = _find(item.get("title") or {}, "displayTitle")
+    # Keys can be present with a null value, so `or {}` rather than a .get() default
+    sale_price = (item.get("prices") or {}).get("salePrice") or _find(item, "salePrice")
+    price = sale_price.get("minPrice") if isinstance(sale_price, dict) else None
+    if not (item_id and image and title and price is not None):
+        return None
+    if image.startswith("//"):
+        image = f"https:{image}"
+    return ProductRecord(item_id, title, image, str(price))
+
+
+def extract_item_list(html) -> list:
+    """
+    Finds the `itemList.content` array in a wholesale search page and decodes it.
+
+    Only the bytes from the start of the array onwards are decoded, and the JSON
+    decoder stops at the end of the array, so the rest of the page is never parsed.
+
+    Args:
+        html (bytes | str): The raw search page
+
+    Returns:
+        list: The raw item objects, or an empty list if no payload was found
+    """
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+
+    for item_list in _ITEM_LIST.finditer(html):
+        content = _CONTENT.search(html, item_list.end(), item_list.end() + _CONTENT_WINDOW)
+        if not content:
+            continue
+        start = content.end() - 1
+        try:
+            items, _ = _decoder.raw_decode(html[start:].decode("utf-8", errors="replace"))
+        except ValueError:
+            continue
+        if isinstance(items, list):
+            return items
+    return []
+
+
+def extract_products(html) -> list:
+    """
+    Parses a wholesale search page into product records.
+
+    Every field of a record comes from the same item object, so ids, titles,
+    images and prices can't drift out of alignment.
+
+    Args:
+        html (bytes | str): The raw search page
+
+    Returns:
+        list: ProductRecord entries in page order; incomplete items are skipped
+    """
+    records = []
+    for item in extract_item_list(html):
+        record = _to_record(item)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def parse_search_page(html) -> list:
+    """
+    Parses a wholesale search page into the bot's product dicts.
+
+    Args:
+        html (bytes | str): The raw search page
+
+    Returns:
+        list: Product dicts with link, title, image and price
+    """
+    return [record.to_product() for record in extract_products(html)]
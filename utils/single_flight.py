@@ -0,0 +1,53 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one shared task.
+
+    The first caller for a key starts the work; callers arriving while it is still
+    running wait for the same result. Each waiter awaits the task through
+    `asyncio.shield`, so a waiter that is cancelled or times out leaves the shared
+    work running for everybody else. The key is forgotten as soon as the task
+    finishes, so later calls start fresh work.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key, fn, timeout=None):
+        """
+        Returns the result of `fn()` for `key`, sharing in-flight work.
+
+        Args:
+            key: Deduplication key
+            fn: Coroutine function without arguments that does the work
+            timeout (float, optional): Seconds this caller is willing to wait. Defaults to None.
+
+        Raises:
+            asyncio.TimeoutError: If this caller's timeout expires (the work goes on)
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        if timeout is None:
+            return await asyncio.shield(task)
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every waiter has given up
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,117 @@
+import asyncio
+import inspect
+import time
+
+_REQUIRED = object()
+
+
+class StageGraph:
+    """
+    Runs named pipeline stages as a small dependency graph of asyncio tasks.
+
+    Every stage starts as soon as the stages it depends on have finished, so
+    independent branches overlap. A stage added with a `fallback` never fails the
+    graph: if it raises, the error is recorded and dependents receive the fallback
+    value instead. A failure in a required stage cancels the rest and is re-raised
+    from `run`.
+
+    Example:
+        graph = StageGraph()
+        graph.add("translate", lambda: translate(query))
+        graph.add("scrape", scrape, deps=["translate"])
+        graph.add("titles", improve_titles, deps=["scrape"], fallback=[])
+        results = await graph.run()
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self.timings = {}
+        self.errors = {}
+        self._origin = None
+
+    def add(self, name, fn, deps=(), fallback=_REQUIRED):
+        """
+        Adds a stage. Dependencies must already have been added.
+
+        Args:
+            name (str): Unique stage name
+            fn: Callable receiving the results of `deps` as positional arguments;
+                it may return a value or an awaitable
+            deps (list, optional): Names of the stages this one waits for
+            fallback (optional): Result to use if the stage raises. Without it the
+                stage is required.
+        """
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Unknown dependency {dep!r} for stage {name!r}")
+        self._stages[name] = (fn, list(deps), fallback)
+
+    async def run(self):
+        """
+        Runs every stage and returns a dict of stage name to result.
+        """
+        self._origin = time.perf_counter()
+        tasks = {}
+
+        async def run_stage(name):
+            fn, deps, fallback = self._stages[name]
+            args = [await tasks[dep] for dep in deps]
+            start = time.perf_counter()
+            try:
+                result = fn(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                self.errors[name] = e
+                if fallback is _REQUIRED:
+                    raise
+                print(f"⚠️ Stage {name} failed, using fallback: {e}")
+                result = fallback
+            finally:
+                self.timings[name] = (start - self._origin, time.perf_counter() - self._origin)
+            return result
+
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return dict(zip(tasks, results))
+
+    def critical_path(self):
+        """
+        Returns the chain of stages that determined the total latency.
+
+        Starting from the stage that finished last, it repeatedly follows the
+        dependency that finished last.
+
+        Returns:
+            tuple: (list of stage names in execution order, total seconds)
+        """
+        finished = [name for name in self._stages if name in self.timings]
+        if not finished:
+            return [], 0.0
+        name = max(finished, key=lambda n: self.timings[n][1])
+        total = self.timings[name][1]
+        path = [name]
+        while True:
+            deps = [dep for dep in self._stages[name][1] if dep in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda n: self.timings[n][1])
+            path.append(name)
+        return list(reversed(path)), total
+
+    def report(self):
+        """
+        Returns a one-line summary of the critical path, e.g.
+        "translate 0.62s → scrape 1.10s → titles 0.95s → reply 0.31s = 2.98s".
+        """
+        path, total = self.critical_path()
+        steps = " → ".join(f"{name} {self.timings[name][1] - self.timings[name][0]:.2f}s" for name in path)
+        return f"{steps} = {total:.2f}s"
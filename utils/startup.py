@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+class StartupProfiler:
+    """
+    Records how long each startup phase takes.
+
+    Disabled profilers cost nothing; enabled ones (STARTUP_PROFILE=1) print a
+    report of the marked phases and of LazyObjects resolved after startup.
+    Per-module import times come from `python -m tools.startup_profile`.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        """
+        Ends `phase`, which began at the previous mark (or at construction).
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def record(self, phase, seconds):
+        self.phases.append((phase, seconds))
+        if self.enabled:
+            print(f"⏱️ {phase}: {seconds * 1000:.1f} ms")
+
+    def report(self):
+        if not self.enabled:
+            return
+        total = self._last - self.started
+        print(f"⏱️ Startup took {total * 1000:.1f} ms")
+        for phase, seconds in self.phases:
+            print(f"   {phase:<24}{seconds * 1000:>9.1f} ms")
+
+
+class LazyObject:
+    """
+    Builds an object on first attribute access instead of at import time.
+
+    `resolve()` is thread-safe, so the object can be warmed up in an executor
+    after startup while early callers wait for the same instance.
+
+    Example:
+        model = LazyObject(lambda: genai.GenerativeModel("gemini-2.0-flash"), "gemini model")
+    """
+
+    def __init__(self, factory, name=None, profiler=None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "lazy object")
+        self._profiler = profiler
+        self._lock = threading.Lock()
+        self._target = None
+
+    def resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    start = time.perf_counter()
+                    self._target = self._factory()
+                    if self._profiler is not None:
+                        self._profiler.record(f"{self._name} (lazy)", time.perf_counter() - start)
+        return self._target
+
+    @property
+    def resolved(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
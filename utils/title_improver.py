@@ -1,11 +1,17 @@
+import json
+import re
+
+from .scheduler import SchedulerBusy
+
+
 async def improve_title_with_gemini(title: str, model) -> str:
     """
     Improves a product title to make it more attractive in Hebrew.
-    
+
     Args:
         title (str): The original product title
         model: The Gemini model instance to use for title improvement
-        
+
     Returns:
         str: The improved product title in Hebrew
     """
@@ -15,8 +21,92 @@ async def improve_title_with_gemini(title: str, model) -> str:
         "החזר את השם המתוקן בלבד, בלי טקסט נוסף."
     )
     try:
-        response = model.generate_content(prompt)
+        response = await model.generate_content_async(prompt)
         return response.text.strip()
+    except SchedulerBusy:
+        # Backpressure, not a Gemini error: the handler answers with its "busy" reply
+        raise
     except Exception as e:
         print(f"⚠️ Error with Gemini: {e}")
-        return title
\ No newline at end of file
+        return title
+
+
+def parse_batch_titles(text: str, originals: list) -> list:
+    """
+    Parses the JSON answer of a batched title request.
+
+    Accepts a JSON array of strings or of {"index", "title"} objects, optionally
+    wrapped in a Markdown code fence or surrounded by extra text. Any entry that
+    is missing or empty falls back to the original title at the same position.
+
+    Args:
+        text (str): The raw model response
+        originals (list): The original titles, in request order
+
+    Returns:
+        list: One title per original, in the same order
+    """
+    results = list(originals)
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip())
+    try:
+        data = json.loads(text)
+    except ValueError:
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if not match:
+            return results
+        try:
+            data = json.loads(match.group(0))
+        except ValueError:
+            return results
+
+    if isinstance(data, dict):
+        data = data.get("titles", [])
+    if not isinstance(data, list):
+        return results
+
+    for position, entry in enumerate(data):
+        index, title = position, entry
+        if isinstance(entry, dict):
+            # "index" is 1-based in the prompt; trust it only when it is a number
+            if isinstance(entry.get("index"), int):
+                index = entry["index"] - 1
+            title = entry.get("title")
+        if isinstance(title, str) and title.strip() and 0 <= index < len(results):
+            results[index] = title.strip()
+    return results
+
+
+async def improve_titles_with_gemini(titles: list, model) -> list:
+    """
+    Improves several product titles with a single Gemini request.
+
+    Args:
+        titles (list): The original product titles
+        model: The Gemini model instance to use for title improvement
+
+    Returns:
+        list: The improved titles in Hebrew, in the same order; any title the model
+            did not return properly is left unchanged
+    """
+    if not titles:
+        return []
+
+    numbered = "\n".join(f"{i}. {title}" for i, title in enumerate(titles, start=1))
+    prompt = (
+        "תשפר את שמות המוצרים הבאים שיהיו מושכים, ברורים וקולחים לקונים בעברית.\n"
+        "החזר JSON בלבד: מערך של אובייקטים מהצורה {\"index\": מספר, \"title\": \"השם המתוקן\"}, "
+        f"אובייקט אחד לכל מוצר ({len(titles)} בסך הכל), באותו סדר.\n\n"
+        f"{numbered}"
+    )
+    try:
+        response = await model.generate_content_async(
+            prompt,
+            generation_config={"response_mime_type": "application/json"}
+        )
+        return parse_batch_titles(response.text, titles)
+    except SchedulerBusy:
+        # Backpressure, not a Gemini error: the handler answers with its "busy" reply
+        raise
+    except Exception as e:
+        print(f"⚠️ Error with Gemini: {e}")
+        return list(titles)
@@ -0,0 +1,125 @@
+"""
+Builds the upstream side of a search (schedulers, the resilient IOP client and
+the product search backends) from environment variables.
+
+bot.py and benchmarks/load.py both wire their searches through these, so the
+benchmark measures the same admission control and IOP resilience the bot runs.
+"""
+
+import os
+
+from iop import CircuitBreaker, ResilientIopClient
+
+from .product_query import ProductQuerySearch
+from .scheduler import ScheduledProxy, UpstreamScheduler
+
+
+def build_schedulers(env=os.environ):
+    """
+    Builds the admission control for each upstream: rate (calls/s), concurrency and queue depth.
+
+    Args:
+        env (Mapping): Configuration, e.g. os.environ
+
+    Returns:
+        tuple: The (gemini, scrape, iop) UpstreamSchedulers
+    """
+    gemini = UpstreamScheduler(
+        "gemini",
+        rate=float(env.get("GEMINI_RATE", "5")),
+        burst=float(env.get("GEMINI_BURST", "10")),
+        max_concurrency=int(env.get("GEMINI_CONCURRENCY", "8")),
+        max_queue=int(env.get("GEMINI_QUEUE", "100"))
+    )
+    scrape = UpstreamScheduler(
+        "scrape",
+        rate=float(env.get("SCRAPE_RATE", "1")),
+        burst=float(env.get("SCRAPE_BURST", "3")),
+        max_concurrency=int(env.get("SCRAPE_CONCURRENCY", "2")),
+        max_queue=int(env.get("SCRAPE_QUEUE", "30"))
+    )
+    iop = UpstreamScheduler(
+        "iop",
+        rate=float(env.get("IOP_RATE", "10")),
+        burst=float(env.get("IOP_BURST", "20")),
+        max_concurrency=int(env.get("IOP_CONCURRENCY", "10")),
+        max_queue=int(env.get("IOP_QUEUE", "100"))
+    )
+    return gemini, scrape, iop
+
+
+def build_iop_client(iop_client, scheduler, env=os.environ):
+    """
+    Wraps an AsyncIopClient in deadlines, retries, hedging and a circuit breaker,
+    admitted by `scheduler`.
+
+    Each call is admitted once and then runs its retries and hedges in that slot,
+    so time spent queued locally counts neither toward the deadline nor as gateway
+    latency or failure.
+
+    Args:
+        iop_client (AsyncIopClient): The gateway client
+        scheduler (UpstreamScheduler): The IOP scheduler
+        env (Mapping): Configuration, e.g. os.environ
+
+    Returns:
+        ScheduledProxy: The client; `breaker`, `retries` and `hedges` are read through it
+    """
+    resilient = ResilientIopClient(
+        iop_client,
+        deadline=float(env.get("IOP_DEADLINE", "8")),
+        max_retries=int(env.get("IOP_MAX_RETRIES", "2")),
+        hedge=env.get("IOP_HEDGE", "1") == "1",
+        breaker=CircuitBreaker(
+            failure_threshold=int(env.get("IOP_BREAKER_FAILURES", "5")),
+            reset_timeout=float(env.get("IOP_BREAKER_RESET", "30"))
+        )
+    )
+    return ScheduledProxy(resilient, scheduler, ["execute"])
+
+
+def build_product_query(client, app_secret, tracking_id, fallback, env=os.environ):
+    """
+    Builds the aliexpress.affiliate.product.query search backend.
+
+    Args:
+        client: The IOP client from build_iop_client
+        app_secret (str): AliExpress app secret
+        tracking_id (str): Affiliate tracking ID
+        fallback: Coroutine function(search_text) used when the API has no results
+        env (Mapping): Configuration, e.g. os.environ
+
+    Returns:
+        ProductQuerySearch: The backend
+    """
+    return ProductQuerySearch(
+        client, app_secret,
+        tracking_id=tracking_id,
+        page_size=int(env.get("PRODUCT_QUERY_PAGE_SIZE", "20")),
+        target_currency=env.get("PRODUCT_QUERY_CURRENCY", "ILS"),
+        target_language=env.get("PRODUCT_QUERY_LANGUAGE", "HE"),
+        ship_to_country=env.get("PRODUCT_QUERY_SHIP_TO", "IL"),
+        sort=env.get("PRODUCT_QUERY_SORT"),
+        fallback=fallback
+    )
+
+
+def search_cache_key(search_text: str):
+    return " ".join(search_text.lower().split())
+
+
+def cached_search(search, cache):
+    """
+    Puts a StaleWhileRevalidateCache in front of a search backend.
+
+    Args:
+        search: Coroutine function(search_text) returning products
+        cache (StaleWhileRevalidateCache): Search results keyed by the normalized search text
+
+    Returns:
+        A coroutine function(search_text) answering from the cache where it can
+    """
+    async def cached_product_search(search_text: str):
+        return await cache.get_or_fetch(search_cache_key(search_text), lambda: search(search_text))
+
+    return cached_product_search
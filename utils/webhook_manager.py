@@ -1,4 +1,6 @@
-import requests
+# Update types the bot handles: text messages, "more results" button presses and inline queries
+ALLOWED_UPDATES = ["message", "callback_query", "inline_query"]
+
 
 def delete_webhook(bot_token):
     """
@@ -10,9 +12,39 @@ def delete_webhook(bot_token):
     Returns:
         None
     """
+    import requests
+
     url = f"https://api.telegram.org/bot{bot_token}/deleteWebhook"
     try:
         response = requests.post(url)
         print(f"Webhook deleted: {response.status_code} - {response.text}")
     except Exception as e:
-        print(f"Failed to delete webhook: {e}")
\ No newline at end of file
+        print(f"Failed to delete webhook: {e}")
+
+async def register_webhook(bot, url, secret_token, drop_pending_updates=False):
+    """
+    Points Telegram at the bot's webhook endpoint.
+
+    Setting a webhook replaces any previous one, so no delete-and-wait step is needed first.
+
+    Args:
+        bot: The telegram.Bot instance
+        url (str): Public HTTPS URL of the webhook endpoint
+        secret_token (str): Token Telegram will send in the secret token header
+        drop_pending_updates (bool, optional): Discard updates queued at Telegram. Defaults to False.
+
+    Returns:
+        bool: True if Telegram accepted the webhook
+    """
+    try:
+        result = await bot.set_webhook(
+            url=url,
+            secret_token=secret_token,
+            drop_pending_updates=drop_pending_updates,
+            allowed_updates=ALLOWED_UPDATES
+        )
+        print(f"Webhook set: {url}")
+        return result
+    except Exception as e:
+        print(f"Failed to set webhook: {e}")
+        return False
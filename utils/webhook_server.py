@@ -0,0 +1,96 @@
+import asyncio
+import hmac
+
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Minimal aiohttp server that receives Telegram webhook updates.
+
+    Each POST must carry the secret token, is put on a bounded internal
+    queue and acknowledged right away; a pool of worker tasks takes updates off
+    the queue and feeds them to the application's handlers. When the queue is
+    full the server answers 503, which makes Telegram retry the delivery later.
+
+    Args:
+        application: The python-telegram-bot Application (must be initialized)
+        secret_token (str): Expected value of the secret token header; required
+        path (str, optional): URL path to serve. Defaults to "/telegram".
+        host (str, optional): Interface to bind. Defaults to "0.0.0.0".
+        port (int, optional): Port to bind. Defaults to 8080.
+        workers (int, optional): Number of concurrent update workers. Defaults to 8.
+        queue_size (int, optional): Maximum number of queued updates. Defaults to 1000.
+    """
+
+    def __init__(self, application, secret_token, path="/telegram", host="0.0.0.0", port=8080,
+                 workers=8, queue_size=1000):
+        if not secret_token:
+            raise ValueError("WebhookServer needs a secret token, or anyone could post updates to it")
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._runner = None
+        self._worker_tasks = []
+
+    async def _handle_update(self, request):
+        received = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+        return web.Response(status=200)
+
+    async def _worker(self):
+        from telegram import Update
+
+        while True:
+            data = await self.queue.get()
+            try:
+                update = Update.de_json(data, self.application.bot)
+                await self.application.process_update(update)
+            except Exception as e:
+                print(f"⚠️ Failed to process update: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self):
+        """
+        Starts the HTTP listener and the update workers.
+        """
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"🌐 Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self, drain_timeout=10):
+        """
+        Stops accepting updates, lets queued ones finish (up to `drain_timeout` seconds)
+        and shuts the workers down.
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Dropping {self.queue.qsize()} queued updates on shutdown")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []